@@ -7,12 +7,19 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.core.database import get_db
-from app.core.security import verify_password, get_password_hash, create_access_token
+from app.core.security import password_hasher, create_access_token
 from app.models.user import User, UserRole
 from app.models.employee import Employee
 from app.schemas.user import UserCreate, UserResponse, UserLogin
 from app.schemas.employee import EmployeeLogin
-from app.schemas.auth import Token, AuthResponse
+from app.schemas.auth import Token, AuthResponse, RefreshTokenRequest
+from app.services.principal_cache import principal_cache, USER
+from app.services.refresh_token_service import (
+    RefreshTokenError,
+    issue_refresh_token,
+    rotate_refresh_token,
+    revoke_refresh_token,
+)
 from app.core.logging import get_logger
 
 logger = get_logger()
@@ -20,6 +27,17 @@ logger = get_logger()
 router = APIRouter()
 
 
+def create_user_access_token(user: User) -> str:
+    """Access-токен пользователя"""
+    return create_access_token(
+        data={
+            "sub": user.username,
+            "user_id": user.id,
+            "role": user.role.value
+        }
+    )
+
+
 @router.post("/register", response_model=AuthResponse, status_code=status.HTTP_201_CREATED)
 async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """Регистрация нового пользователя"""
@@ -46,7 +64,7 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
             )
 
     # Создание пользователя
-    password_hash = get_password_hash(user_data.password)
+    password_hash = await password_hasher.hash(user_data.password)
 
     new_user = User(
         first_name=user_data.first_name,
@@ -58,19 +76,15 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     )
 
     db.add(new_user)
+    await db.flush()
+    refresh_token = await issue_refresh_token(db, new_user.id)
     await db.commit()
     await db.refresh(new_user)
 
     logger.info(f"Зарегистрирован новый пользователь: {new_user.username}")
 
     # Создаем токен
-    access_token = create_access_token(
-        data={
-            "sub": new_user.username,
-            "user_id": new_user.id,
-            "role": new_user.role.value
-        }
-    )
+    access_token = create_user_access_token(new_user)
 
     # Формируем user объект для ответа
     user_dict = UserResponse.model_validate(new_user).model_dump()
@@ -78,6 +92,7 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     return {
         "access_token": access_token,
         "token_type": "bearer",
+        "refresh_token": refresh_token,
         "user": user_dict
     }
 
@@ -93,15 +108,25 @@ async def login(
     result = await db.execute(select(User).where(User.username == login_data.username))
     user = result.scalar_one_or_none()
 
-    if user and verify_password(login_data.password, user.password_hash):
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await password_hasher.verify_and_update(login_data.password, user.password_hash)
+
+    if valid:
         # Пользователь найден и пароль верный
-        access_token = create_access_token(
-            data={
-                "sub": user.username,
-                "user_id": user.id,
-                "role": user.role.value
-            }
-        )
+        if new_hash:
+            # Хеш со старой стоимостью bcrypt - сохраняем пересчитанный
+            user.password_hash = new_hash
+
+        refresh_token = await issue_refresh_token(db, user.id)
+        await db.commit()
+
+        if new_hash:
+            await db.refresh(user)
+            principal_cache.invalidate(USER, user.id)
+            logger.info(f"Хеш пароля пользователя {user.username} пересчитан с новой стоимостью")
+
+        access_token = create_user_access_token(user)
 
         logger.info(f"Успешный вход пользователя: {user.username}")
 
@@ -111,6 +136,7 @@ async def login(
         return {
             "access_token": access_token,
             "token_type": "bearer",
+            "refresh_token": refresh_token,
             "user": user_dict
         }
 
@@ -123,3 +149,39 @@ async def login(
         detail="Неверный username или пароль",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh_tokens(
+    refresh_data: RefreshTokenRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Обмен refresh-токена на новую пару токенов (без пароля и bcrypt).
+    Предъявленный refresh-токен становится недействительным.
+    """
+    try:
+        user, refresh_token = await rotate_refresh_token(db, refresh_data.refresh_token)
+    except RefreshTokenError as e:
+        # Сохраняем отзыв цепочки при повторном использовании токена
+        await db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    await db.commit()
+
+    return Token(access_token=create_user_access_token(user), refresh_token=refresh_token)
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    refresh_data: RefreshTokenRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """Выход: отзыв refresh-токена (и всей его цепочки обновлений)"""
+    await revoke_refresh_token(db, refresh_data.refresh_token)
+    await db.commit()
+    return None
@@ -8,7 +8,8 @@ from typing import List
 
 from app.core.database import get_db
 from app.core.dependencies import require_role
-from app.models.user import User, UserRole
+from app.models.user import UserRole
+from app.services.principal_cache import Principal
 from app.models.category import Category
 from app.schemas.category import CategoryCreate, CategoryResponse, CategoryUpdate
 from app.core.logging import get_logger
@@ -31,7 +32,7 @@ async def get_categories(db: AsyncSession = Depends(get_db)):
 @router.post("", response_model=CategoryResponse, status_code=status.HTTP_201_CREATED)
 async def create_category(
     category_data: CategoryCreate,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Создание новой категории (для админов ЖКХ)"""
@@ -83,7 +84,7 @@ async def get_category(
 async def update_category(
     category_id: int,
     category_data: CategoryUpdate,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Обновление категории (для админов ЖКХ)"""
@@ -113,7 +114,7 @@ async def update_category(
 @router.delete("/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_category(
     category_id: int,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Удаление категории (для админов ЖКХ)"""
@@ -8,13 +8,18 @@ from typing import List
 
 from app.core.database import get_db
 from app.core.dependencies import require_role, get_current_employee
-from app.core.security import get_password_hash
-from app.models.user import User, UserRole
+from app.core.security import password_hasher
+from app.models.user import UserRole
 from app.models.employee import Employee
+from app.models.request import Request
 from app.models.specialty import Specialty
 from app.models.housing_organization import HousingOrganization
 from app.schemas.employee import EmployeeCreate, EmployeeResponse, EmployeeUpdate
 from app.services.file_service import save_upload_file
+from app.services.request_events import snapshot, commit_request_changes
+from app.services.workload_index import workload_index, reconcile
+from app.services.response_cache import invalidate_tags, GLOBAL_TAG, employee_tag
+from app.services.principal_cache import Principal, principal_cache, EMPLOYEE
 from app.core.logging import get_logger
 
 logger = get_logger()
@@ -25,7 +30,7 @@ router = APIRouter()
 @router.post("", response_model=EmployeeResponse, status_code=status.HTTP_201_CREATED)
 async def create_employee(
     employee_data: EmployeeCreate,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Создание нового сотрудника (для админов ЖКХ)"""
@@ -63,7 +68,7 @@ async def create_employee(
         )
 
     # Хеширование пароля
-    password_hash = get_password_hash(employee_data.password)
+    password_hash = await password_hasher.hash(employee_data.password)
 
     # Создание сотрудника
     new_employee = Employee(
@@ -81,6 +86,9 @@ async def create_employee(
     await db.commit()
     await db.refresh(new_employee)
 
+    workload_index.mark_stale()
+    await invalidate_tags(GLOBAL_TAG, employee_tag(new_employee.id))
+
     logger.info(f"Создан новый сотрудник: {new_employee.username}")
 
     return new_employee
@@ -90,7 +98,7 @@ async def create_employee(
 async def get_employees(
     organization_id: int = None,
     specialty_id: int = None,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Получение списка сотрудников (для админов ЖКХ)"""
@@ -110,6 +118,29 @@ async def get_employees(
     return employees
 
 
+@router.get("/workload/consistency")
+async def check_workload_consistency(
+    fix: bool = False,
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Проверка индекса загрузки сотрудников на расхождения с БД (для админов).
+    С fix=true индекс после проверки перестраивается.
+    """
+    ready = workload_index.ready
+    drift = await reconcile(db, fix=fix)
+
+    return {
+        "index_ready": ready,
+        "consistent": ready and not drift,
+        "drift": [
+            {"employee_id": employee_id, **values}
+            for employee_id, values in sorted(drift.items())
+        ]
+    }
+
+
 @router.get("/me", response_model=EmployeeResponse)
 async def get_current_employee_info(
     current_employee: Employee = Depends(get_current_employee),
@@ -122,7 +153,7 @@ async def get_current_employee_info(
 @router.get("/{employee_id}", response_model=EmployeeResponse)
 async def get_employee(
     employee_id: int,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Получение информации о конкретном сотруднике"""
@@ -143,7 +174,7 @@ async def get_employee(
 async def update_employee(
     employee_id: int,
     employee_data: EmployeeUpdate,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Обновление информации о сотруднике (для админов ЖКХ)"""
@@ -178,6 +209,11 @@ async def update_employee(
     await db.commit()
     await db.refresh(employee)
 
+    if employee_data.specialty_id is not None:
+        workload_index.mark_stale()
+    await invalidate_tags(GLOBAL_TAG, employee_tag(employee_id))
+    principal_cache.invalidate(EMPLOYEE, employee_id)
+
     logger.info(f"Обновлена информация о сотруднике {employee_id}")
 
     return employee
@@ -187,7 +223,7 @@ async def update_employee(
 async def upload_employee_photo(
     employee_id: int,
     photo: UploadFile = File(...),
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Загрузка фото сотрудника"""
@@ -207,6 +243,7 @@ async def upload_employee_photo(
 
     await db.commit()
     await db.refresh(employee)
+    principal_cache.invalidate(EMPLOYEE, employee_id)
 
     logger.info(f"Загружено фото для сотрудника {employee_id}")
 
@@ -216,7 +253,7 @@ async def upload_employee_photo(
 @router.delete("/{employee_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_employee(
     employee_id: int,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Удаление сотрудника (для админов ЖКХ)"""
@@ -230,8 +267,21 @@ async def delete_employee(
             detail="Сотрудник не найден"
         )
 
+    # Заявки сотрудника остаются без исполнителя - через события заявок,
+    # чтобы агрегаты статистики и индексы учли изменение
+    result = await db.execute(select(Request).where(Request.assignee_id == employee_id))
+    changes = []
+    for request_obj in result.scalars().all():
+        before = snapshot(request_obj)
+        request_obj.assignee_id = None
+        changes.append((before, request_obj))
+
     await db.delete(employee)
-    await db.commit()
+    await commit_request_changes(db, changes)
+
+    workload_index.mark_stale()
+    await invalidate_tags(GLOBAL_TAG, employee_tag(employee_id))
+    principal_cache.invalidate(EMPLOYEE, employee_id)
 
     logger.info(f"Удален сотрудник {employee_id}")
 
@@ -1,10 +1,14 @@
 """
 Health check эндпоинт
 """
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from datetime import datetime
-from app.schemas.base import HealthCheck
+from app.schemas.base import HealthCheck, MetricsResponse
 from app.core.config import settings
+from app.core.dependencies import require_role
+from app.core.metrics import metrics
+from app.models.user import UserRole
+from app.services.principal_cache import Principal
 
 router = APIRouter()
 
@@ -28,3 +32,25 @@ async def health_check() -> HealthCheck:
         version=settings.APP_VERSION,
         timestamp=datetime.utcnow()
     )
+
+
+@router.get(
+    "/metrics",
+    response_model=MetricsResponse,
+    tags=["Health"],
+    summary="Счетчики метрик процесса",
+    description="Возвращает счетчики процесса (попадания и промахи кэша и т.п.). Только для админов"
+)
+async def get_metrics(
+    current_user: Principal = Depends(require_role([UserRole.ADMIN]))
+) -> MetricsResponse:
+    """
+    Счетчики метрик текущего процесса
+
+    Returns:
+        MetricsResponse: Значения счетчиков
+    """
+    return MetricsResponse(
+        counters=metrics.snapshot(),
+        timestamp=datetime.utcnow()
+    )
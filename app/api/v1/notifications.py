@@ -1,16 +1,29 @@
 """
 API эндпоинты для работы с уведомлениями
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import select, false
+from typing import List, Optional
 
 from app.core.database import get_db
-from app.core.dependencies import get_current_active_user
-from app.models.user import User
+from app.core.dependencies import get_current_principal, get_stream_token, get_stream_user, require_role, get_page_params
+from app.models.user import User, UserRole
+from app.services.principal_cache import Principal
 from app.models.notification import Notification
-from app.schemas.notification import NotificationResponse
+from app.schemas.notification import (
+    NotificationResponse,
+    NotificationBulkCreate,
+    NotificationBulkResponse,
+    NotificationMarkRead,
+    NotificationReadResponse,
+    UnreadCountResponse
+)
+from app.schemas.auth import TokenData
+from app.services.notification_service import send_bulk_notification, mark_notifications_read, get_unread_count
+from app.services.pagination import PageParams, paginate_by_created, set_next_cursor
+from app.services.notification_push import notification_events
 from app.core.logging import get_logger
 
 logger = get_logger()
@@ -20,25 +33,110 @@ router = APIRouter()
 
 @router.get("", response_model=List[NotificationResponse])
 async def get_notifications(
-    current_user: User = Depends(get_current_active_user),
+    response: Response,
+    unread_only: bool = Query(False, description="Только непрочитанные"),
+    page_params: PageParams = Depends(get_page_params),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получение всех уведомлений текущего пользователя"""
+    """
+    Получение уведомлений текущего пользователя, новые первыми.
+    Постранично, курсор следующей страницы - в заголовке X-Next-Cursor.
+    """
 
-    result = await db.execute(
-        select(Notification)
-        .where(Notification.user_id == current_user.id)
-        .order_by(Notification.created_at.desc())
+    query = select(Notification).where(Notification.user_id == current_user.id)
+    if unread_only:
+        query = query.where(Notification.is_read == false())
+
+    page = await paginate_by_created(db, query, Notification, page_params)
+    set_next_cursor(response, page)
+
+    return page.items
+
+
+@router.get("/unread-count", response_model=UnreadCountResponse)
+async def get_notifications_unread_count(
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Количество непрочитанных уведомлений (значок колокольчика)"""
+
+    return UnreadCountResponse(unread=await get_unread_count(db, current_user.id))
+
+
+@router.put("/read", response_model=NotificationReadResponse)
+async def mark_notifications_read_bulk(
+    read_data: NotificationMarkRead,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Пометить прочитанными несколько или все уведомления одним запросом"""
+
+    if not read_data.all and not read_data.ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Укажите ids или all=true"
+        )
+
+    # Чужие ID не подходят под условие user_id и просто не изменяются
+    updated = await mark_notifications_read(
+        db, current_user.id, None if read_data.all else read_data.ids
     )
-    notifications = result.scalars().all()
+    await db.commit()
+    unread = await get_unread_count(db, current_user.id)
 
-    return notifications
+    logger.info(f"Пользователь {current_user.id} пометил прочитанными уведомлений: {updated}")
+
+    return NotificationReadResponse(updated=updated, unread=unread)
+
+
+@router.get("/stream")
+async def stream_notifications(
+    current_user: Principal = Depends(get_stream_user),
+    token_data: TokenData = Depends(get_stream_token),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Поток новых уведомлений (Server-Sent Events).
+    EventSource передает токен параметром access_token, после
+    переподключения поток продолжается с Last-Event-ID.
+    Поток закрывается, когда истекает срок действия токена.
+    """
+    after_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    return StreamingResponse(
+        notification_events(current_user.id, after_id, token_data.expires_at),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/bulk", response_model=NotificationBulkResponse, status_code=status.HTTP_201_CREATED)
+async def send_bulk_notifications(
+    bulk_data: NotificationBulkCreate,
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
+    db: AsyncSession = Depends(get_db)
+):
+    """Массовая рассылка уведомления (для админов)"""
+
+    # Несуществующие получатели отбрасываются, чтобы не сорвать INSERT внешним ключом
+    result = await db.execute(select(User.id).where(User.id.in_(set(bulk_data.user_ids))))
+    user_ids = result.scalars().all()
+
+    recipients = await send_bulk_notification(
+        db, user_ids, bulk_data.title, bulk_data.message, bulk_data.type
+    )
+    await db.commit()
+
+    logger.info(f"Массовая рассылка от админа {current_user.username}: {recipients} получателей")
+
+    return NotificationBulkResponse(recipients=recipients)
 
 
 @router.put("/{notification_id}/read")
 async def mark_notification_read(
     notification_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Пометить уведомление как прочитанное"""
@@ -61,10 +159,8 @@ async def mark_notification_read(
             detail="Вы не можете изменить это уведомление"
         )
 
-    notification.is_read = True
-
+    await mark_notifications_read(db, current_user.id, [notification_id])
     await db.commit()
-    await db.refresh(notification)
 
     logger.info(f"Уведомление {notification_id} помечено как прочитанное")
 
@@ -1,15 +1,16 @@
 """
 API эндпоинты для работы с заявками
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Header, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, and_, or_, text
 from typing import List, Optional
 from datetime import datetime
 
+from app.core.config import settings
 from app.core.database import get_db
-from app.core.dependencies import get_current_active_user, require_role, get_current_employee
-from app.models.user import User, UserRole
+from app.core.dependencies import get_current_principal, require_role, get_current_employee_principal, get_page_params
+from app.models.user import UserRole
 from app.models.employee import Employee
 from app.models.request import Request, RequestStatus, RequestPriority
 from app.models.category import Category
@@ -20,15 +21,23 @@ from app.schemas.request import (
     RequestUpdate,
     RequestAssign,
     RequestComplete,
-    RequestClose
+    RequestClose,
+    RequestMapMarker,
+    MapCluster
 )
 from app.schemas.rating import RatingCreate, RatingResponse
 from app.services.file_service import save_upload_file, get_file_url
-from app.services.openai_service import (
-    analyze_problem_description,
-    analyze_image_priority,
-    assign_employee_ai,
-    generate_user_recommendation
+from app.services.triage_service import enqueue_triage, wake_triage_worker
+from app.services.request_events import snapshot, commit_request_change
+from app.services import geo_service
+from app.services.map_clusters import MAP_STATUSES, MapClusterIndex, map_cluster_index, load_map_rows
+from app.services.map_cache import map_cache, etag_matches
+from app.services.statistics_rollup import record_rating, remove_rating
+from app.services.rating_service import add_employee_rating, remove_employee_rating
+from app.services.response_cache import invalidate_tags, GLOBAL_TAG, employee_tag, category_tag
+from app.services.principal_cache import Principal
+from app.services.pagination import (
+    PRIORITY_ORDER, PageParams, paginate_by_created, paginate_requests_by_priority, set_next_cursor
 )
 from app.services.notification_service import (
     notify_request_assigned,
@@ -39,8 +48,6 @@ from app.services.notification_service import (
     notify_employee_assigned_task
 )
 from app.core.logging import get_logger
-from app.core.config import settings
-import os
 
 logger = get_logger()
 
@@ -56,7 +63,7 @@ async def create_request(
     latitude: Optional[float] = Form(None),
     longitude: Optional[float] = Form(None),
     photo: Optional[UploadFile] = File(None),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Создание новой заявки (для пользователей)"""
@@ -83,6 +90,7 @@ async def create_request(
         problem_type=problem_type,
         latitude=latitude,
         longitude=longitude,
+        geohash=geo_service.geohash_for(latitude, longitude),
         category_id=category_obj.id,
         creator_id=current_user.id,
         photo_url=photo_path,
@@ -91,179 +99,201 @@ async def create_request(
     )
 
     db.add(new_request)
-    await db.commit()
-    await db.refresh(new_request)
+    await db.flush()
 
-    # Асинхронная обработка через OpenAI (только если есть фото)
+    # AI-обработка выполняется в фоне (только если есть фото),
+    # задача фиксируется в той же транзакции, что и заявка
     if photo_path:
-        try:
-            # 1. Анализируем описание проблемы (внутренний анализ)
-            structured_description = await analyze_problem_description(
-                description=description,
-                category_name=category_obj.name
-            )
-
-            # Сохраняем AI анализ (внутреннее поле, не показывается пользователю напрямую)
-            new_request.ai_analysis = structured_description
-            new_request.ai_category = category_obj.name
-
-            # 2. Анализируем фото и определяем приоритет
-            full_photo_path = os.path.join(settings.UPLOAD_DIR, photo_path)
-            priority_str = await analyze_image_priority(
-                image_path=full_photo_path,
-                structured_description=structured_description,
-                category_name=category_obj.name
-            )
+        await enqueue_triage(db, new_request.id)
 
-            # Обновляем приоритет заявки (преобразуем строку в enum)
-            priority_mapping = {
-                "low": RequestPriority.LOW,
-                "medium": RequestPriority.MEDIUM,
-                "high": RequestPriority.HIGH
-            }
-            new_request.priority = priority_mapping.get(priority_str.lower(), RequestPriority.MEDIUM)
-            
-            # 3. Генерируем рекомендацию для пользователя
-            user_recommendation = await generate_user_recommendation(
-                description=description,
-                category_name=category_obj.name,
-                priority=priority_str.lower()
-            )
-            new_request.ai_recommendation = user_recommendation
+    await commit_request_change(db, None, new_request)
+    await db.refresh(new_request)
 
-            # 3. Автоматическое назначение на сотрудника
-            # Получаем доступных сотрудников для этой категории
-            from app.models.specialty import Specialty
+    if photo_path:
+        wake_triage_worker()
 
-            result = await db.execute(
-                select(Employee)
-                .join(Specialty)
-                .where(Specialty.category_id == category_obj.id)
-            )
-            available_employees = result.scalars().all()
-
-            if available_employees:
-                # Подготавливаем данные о сотрудниках
-                employees_data = []
-                for emp in available_employees:
-                    # Считаем активные заявки сотрудника
-                    active_count = await db.execute(
-                        select(func.count(Request.id))
-                        .where(
-                            and_(
-                                Request.assignee_id == emp.id,
-                                Request.status.in_([RequestStatus.ASSIGNED, RequestStatus.IN_PROGRESS])
-                            )
-                        )
-                    )
-                    active_requests = active_count.scalar()
-
-                    employees_data.append({
-                        "id": emp.id,
-                        "name": f"{emp.first_name} {emp.last_name}",
-                        "specialty": emp.specialty.name,
-                        "rating": emp.average_rating,
-                        "active_requests": active_requests
-                    })
-
-                # Используем AI для выбора сотрудника
-                selected_employee_id = await assign_employee_ai(
-                    request_description=description,
-                    category_name=category_obj.name,
-                    priority=new_request.priority.value,
-                    available_employees=employees_data
-                )
+    logger.info(f"Создана заявка #{new_request.id} от пользователя {current_user.username}")
 
-                if selected_employee_id:
-                    new_request.assignee_id = selected_employee_id
-                    new_request.status = RequestStatus.ASSIGNED
-                    logger.info(f"Заявка {new_request.id} автоматически назначена на сотрудника {selected_employee_id}")
+    return new_request
 
-            await db.commit()
-            await db.refresh(new_request)
 
-        except Exception as e:
-            logger.error(f"Ошибка при обработке заявки через AI: {e}")
-            # Заявка уже создана, просто логируем ошибку
-            await db.commit()
-            await db.refresh(new_request)
+def _parse_bbox(bbox: str) -> geo_service.BoundingBox:
+    """Разбор параметра bbox (400 при ошибке)"""
+    try:
+        return geo_service.parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Некорректный bbox: {e}"
+        )
 
-    logger.info(f"Создана заявка #{new_request.id} от пользователя {current_user.username}")
 
-    return new_request
+def _map_response(cached, if_none_match: Optional[str]) -> Response:
+    """Ответ карты с ETag (304 если у клиента актуальная версия)"""
+    headers = {
+        "ETag": cached.etag,
+        "Cache-Control": f"public, max-age={int(settings.MAP_CACHE_TTL_SECONDS)}"
+    }
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
 
 
-@router.get("/map", response_model=List[RequestResponse])
+@router.get("/map", response_model=List[RequestMapMarker])
 async def get_requests_for_map(
+    bbox: Optional[str] = Query(
+        None,
+        description="Видимая область карты: min_lon,min_lat,max_lon,max_lat"
+    ),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Уровень масштаба карты"),
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Получение заявок для отображения на карте (публичный endpoint).
-    Возвращает только заявки с координатами и статусами: pending, assigned, in_progress
+    Получение маркеров заявок для отображения на карте (публичный endpoint).
+    Возвращает только заявки с координатами и статусами: pending, assigned, in_progress.
+
+    При передаче bbox возвращаются только заявки в видимой области
+    (выборка по геоиндексу: SPATIAL на MySQL, geohash на остальных БД).
+    Ответ кэшируется на несколько секунд и поддерживает ETag / If-None-Match.
     """
-    result = await db.execute(
-        select(Request)
-        .where(
-            and_(
+    area = _parse_bbox(bbox) if bbox is not None else None
+
+    async def build():
+        conditions = [Request.status.in_(MAP_STATUSES)]
+
+        if area is not None:
+            if geo_service.spatial_index_available:
+                conditions.append(
+                    text(f"MBRContains(ST_GeomFromText(:bbox_wkt, {geo_service.SPATIAL_SRID}), requests.location)")
+                    .bindparams(bbox_wkt=geo_service.bbox_wkt(area))
+                )
+            else:
+                # Ячейки geohash покрывают bbox с запасом, точная граница - по координатам
+                conditions.append(or_(*[
+                    geo_service.geohash_prefix_condition(prefix)
+                    for prefix in geo_service.bbox_cover(area, zoom)
+                ]))
+
+            conditions.extend([
+                Request.latitude.between(area.min_lat, area.max_lat),
+                Request.longitude.between(area.min_lon, area.max_lon)
+            ])
+        else:
+            conditions.extend([
                 Request.latitude.isnot(None),
-                Request.longitude.isnot(None),
-                Request.status.in_([
-                    RequestStatus.PENDING,
-                    RequestStatus.ASSIGNED,
-                    RequestStatus.IN_PROGRESS
-                ])
+                Request.longitude.isnot(None)
+            ])
+
+        result = await db.execute(
+            select(
+                Request.id,
+                Request.latitude,
+                Request.longitude,
+                Request.status,
+                Request.priority,
+                Request.category_id
             )
+            .where(and_(*conditions))
         )
-        .order_by(Request.created_at.desc())
-        .limit(100)
-    )
-    requests = result.scalars().all()
-    return requests
+        # Сортировка в памяти: ORDER BY created_at склоняет планировщик
+        # к обходу всей таблицы по индексу даты вместо геоиндекса
+        rows = sorted(result.all(), key=lambda row: row.id, reverse=True)
+        return [RequestMapMarker.model_validate(row) for row in rows]
+
+    cached = await map_cache.get_or_build(("markers", area, zoom), build)
+    return _map_response(cached, if_none_match)
+
+
+@router.get("/map/clusters", response_model=List[MapCluster])
+async def get_map_clusters(
+    zoom: int = Query(..., ge=0, le=22, description="Уровень масштаба карты"),
+    bbox: Optional[str] = Query(
+        None,
+        description="Видимая область карты: min_lon,min_lat,max_lon,max_lat"
+    ),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Кластеры заявок для отдаленного масштаба карты (публичный endpoint).
+    Каждый кластер - ячейка geohash с количеством заявок, центроидом,
+    разбивкой по статусам и преобладающей категорией.
+    """
+    area = _parse_bbox(bbox) if bbox is not None else None
+
+    async def build():
+        index = map_cluster_index
+        if not index.ready:
+            # Индекс процесса еще не построен - считаем по БД
+            index = MapClusterIndex()
+            index.load(await load_map_rows(db))
+        return index.clusters(zoom, area)
+
+    cached = await map_cache.get_or_build(("clusters", area, zoom), build)
+    return _map_response(cached, if_none_match)
 
 
 @router.get("/my", response_model=List[RequestResponse])
 async def get_my_requests(
-    current_user: User = Depends(get_current_active_user),
+    response: Response,
+    page_params: PageParams = Depends(get_page_params),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получение своих заявок (для пользователей)"""
+    """
+    Получение своих заявок (для пользователей).
+    Постранично, курсор следующей страницы - в заголовке X-Next-Cursor.
+    """
 
-    result = await db.execute(
-        select(Request)
-        .where(Request.creator_id == current_user.id)
-        .order_by(Request.created_at.desc())
+    page = await paginate_by_created(
+        db,
+        select(Request).where(Request.creator_id == current_user.id),
+        Request,
+        page_params
     )
-    requests = result.scalars().all()
+    set_next_cursor(response, page)
 
-    return requests
+    return page.items
 
 
 @router.get("/assigned", response_model=List[RequestResponse])
 async def get_assigned_requests(
-    current_employee: Employee = Depends(get_current_employee),
+    response: Response,
+    page_params: PageParams = Depends(get_page_params),
+    current_employee: Principal = Depends(get_current_employee_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получение назначенных заявок (для сотрудников)"""
+    """
+    Получение назначенных заявок (для сотрудников).
+    Сначала срочные, внутри приоритета - более старые.
+    """
 
-    result = await db.execute(
-        select(Request)
-        .where(Request.assignee_id == current_employee.id)
-        .order_by(Request.priority.desc(), Request.created_at.asc())
+    page = await paginate_requests_by_priority(
+        db,
+        select(Request).where(Request.assignee_id == current_employee.id),
+        page_params,
+        created_descending=False
     )
-    requests = result.scalars().all()
+    set_next_cursor(response, page)
 
-    return requests
+    return page.items
 
 
 @router.get("", response_model=List[RequestResponse])
 async def get_all_requests(
+    response: Response,
     status_filter: Optional[RequestStatus] = None,
     category_id: Optional[int] = None,
-    priority: Optional[int] = None,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    priority: Optional[RequestPriority] = None,
+    page_params: PageParams = Depends(get_page_params),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получение всех заявок с фильтрами (для админов ЖКХ)"""
+    """
+    Получение всех заявок с фильтрами (для админов ЖКХ).
+    Постранично, курсор следующей страницы - в заголовке X-Next-Cursor.
+    """
 
     query = select(Request)
 
@@ -272,21 +302,22 @@ async def get_all_requests(
         query = query.where(Request.status == status_filter)
     if category_id:
         query = query.where(Request.category_id == category_id)
-    if priority:
-        query = query.where(Request.priority == priority)
 
-    query = query.order_by(Request.priority.desc(), Request.created_at.desc())
-
-    result = await db.execute(query)
-    requests = result.scalars().all()
+    page = await paginate_requests_by_priority(
+        db,
+        query,
+        page_params,
+        priorities=(priority,) if priority else PRIORITY_ORDER
+    )
+    set_next_cursor(response, page)
 
-    return requests
+    return page.items
 
 
 @router.get("/{request_id}", response_model=RequestResponse)
 async def get_request(
     request_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Получение конкретной заявки"""
@@ -314,7 +345,7 @@ async def get_request(
 async def assign_request(
     request_id: int,
     assign_data: RequestAssign,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Назначение заявки на сотрудника (для админов ЖКХ)"""
@@ -338,6 +369,7 @@ async def assign_request(
             detail="Сотрудник не найден"
         )
 
+    before = snapshot(request_obj)
     request_obj.assignee_id = assign_data.assignee_id
     request_obj.status = RequestStatus.ASSIGNED
 
@@ -349,7 +381,7 @@ async def assign_request(
     if employee.user_id:
         await notify_employee_assigned_task(db, employee.user_id, request_id, request_obj.address)
 
-    await db.commit()
+    await commit_request_change(db, before, request_obj)
     await db.refresh(request_obj)
 
     logger.info(f"Заявка #{request_id} назначена на сотрудника {assign_data.assignee_id}")
@@ -362,7 +394,7 @@ async def complete_request(
     request_id: int,
     completion_photo: Optional[UploadFile] = File(None),
     completion_note: Optional[str] = Form(None),
-    current_employee: Employee = Depends(get_current_employee),
+    current_employee: Principal = Depends(get_current_employee_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Завершение заявки с фото решения (для сотрудников)"""
@@ -383,6 +415,8 @@ async def complete_request(
             detail="Эта заявка не назначена на вас"
         )
 
+    before = snapshot(request_obj)
+
     # Сохранение фото решения если есть
     if completion_photo:
         completion_photo_path = await save_upload_file(completion_photo, subfolder="solutions")
@@ -398,7 +432,7 @@ async def complete_request(
     # Отправляем уведомление создателю заявки
     await notify_request_completed(db, request_obj.creator_id, request_id)
 
-    await db.commit()
+    await commit_request_change(db, before, request_obj)
     await db.refresh(request_obj)
 
     logger.info(f"Заявка #{request_id} завершена сотрудником {current_employee.id}")
@@ -409,7 +443,7 @@ async def complete_request(
 @router.patch("/{request_id}/start", response_model=RequestResponse)
 async def start_request(
     request_id: int,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Начать работу над заявкой (для сотрудников и админов)"""
@@ -423,12 +457,13 @@ async def start_request(
             detail="Заявка не найдена"
         )
 
+    before = snapshot(request_obj)
     request_obj.status = RequestStatus.IN_PROGRESS
 
     # Отправляем уведомление создателю заявки
     await notify_request_in_progress(db, request_obj.creator_id, request_id)
 
-    await db.commit()
+    await commit_request_change(db, before, request_obj)
     await db.refresh(request_obj)
 
     logger.info(f"Заявка #{request_id} переведена в статус 'в работе'")
@@ -440,7 +475,7 @@ async def start_request(
 async def close_request(
     request_id: int,
     reason: Optional[str] = Form(None),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Закрытие заявки (для пользователей)"""
@@ -461,6 +496,8 @@ async def close_request(
             detail="Вы можете закрывать только свои заявки"
         )
 
+    before = snapshot(request_obj)
+
     # Закрываем заявку
     request_obj.status = RequestStatus.CLOSED
 
@@ -471,7 +508,7 @@ async def close_request(
     if not request_obj.completed_at:
         request_obj.completed_at = datetime.utcnow()
 
-    await db.commit()
+    await commit_request_change(db, before, request_obj)
     await db.refresh(request_obj)
 
     logger.info(f"Заявка #{request_id} закрыта пользователем")
@@ -484,7 +521,7 @@ async def update_request_status(
     request_id: int,
     new_status: RequestStatus,
     note: Optional[str] = None,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Изменение статуса заявки админом"""
@@ -498,6 +535,7 @@ async def update_request_status(
             detail="Заявка не найдена"
         )
 
+    before = snapshot(request_obj)
     old_status = request_obj.status
     request_obj.status = new_status
 
@@ -510,7 +548,7 @@ async def update_request_status(
     # Отправляем уведомление о смене статуса
     await notify_status_changed(db, request_obj.creator_id, request_id, new_status.value)
 
-    await db.commit()
+    await commit_request_change(db, before, request_obj)
     await db.refresh(request_obj)
 
     logger.info(f"Заявка #{request_id}: статус изменён {old_status.value} -> {new_status.value}")
@@ -521,7 +559,7 @@ async def update_request_status(
 @router.delete("/{request_id}")
 async def delete_request(
     request_id: int,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Удаление заявки (для админов)"""
@@ -535,6 +573,8 @@ async def delete_request(
             detail="Заявка не найдена"
         )
 
+    before = snapshot(request_obj)
+
     # Уведомляем создателя об удалении
     await notify_request_closed(
         db, 
@@ -543,8 +583,16 @@ async def delete_request(
         "Заявка была удалена администратором"
     )
 
+    # Оценка удаляется вместе с заявкой и вычитается из агрегатов и рейтинга сотрудника
+    result = await db.execute(select(Rating).where(Rating.request_id == request_id))
+    rating = result.scalar_one_or_none()
+    if rating is not None:
+        await remove_rating(db, rating, request_obj.category_id)
+        await remove_employee_rating(db, rating.employee_id, rating.rating)
+        await db.delete(rating)
+
     await db.delete(request_obj)
-    await db.commit()
+    await commit_request_change(db, before, None)
 
     logger.info(f"Заявка #{request_id} удалена админом {current_user.username}")
 
@@ -555,7 +603,7 @@ async def delete_request(
 async def rate_request(
     request_id: int,
     rating_data: RatingCreate,
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Оценка работы сотрудника по завершенной заявке"""
@@ -610,21 +658,15 @@ async def rate_request(
     )
 
     db.add(new_rating)
+    await record_rating(db, new_rating, request_obj.category_id)
 
-    # Пересчет средней оценки сотрудника
-    result = await db.execute(
-        select(func.avg(Rating.rating))
-        .where(Rating.employee_id == request_obj.assignee_id)
-    )
-    avg_rating = result.scalar()
-
-    employee_result = await db.execute(
-        select(Employee).where(Employee.id == request_obj.assignee_id)
-    )
-    employee = employee_result.scalar_one()
-    employee.average_rating = float(avg_rating) if avg_rating else 0.0
+    # Средняя оценка сотрудника (атомарное увеличение счетчиков)
+    await add_employee_rating(db, request_obj.assignee_id, rating_data.rating)
+    rated_employee_id = request_obj.assignee_id
+    changed_tags = (GLOBAL_TAG, employee_tag(rated_employee_id), category_tag(request_obj.category_id))
 
     await db.commit()
+    await invalidate_tags(*changed_tags)
     await db.refresh(new_rating)
 
     logger.info(f"Поставлена оценка {rating_data.rating} для заявки #{request_id}")
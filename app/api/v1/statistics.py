@@ -1,19 +1,25 @@
 """
 API эндпоинты для статистики
+
+Ответы кэшируются (app/services/response_cache.py) и сбрасываются по тегам
+при изменении заявок, оценок и сотрудников.
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
-from typing import Dict, Any
-from datetime import datetime, timedelta
+from sqlalchemy import select
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timezone
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.dependencies import require_role
-from app.models.user import User, UserRole
-from app.models.request import Request, RequestStatus
+from app.models.user import UserRole
+from app.services.principal_cache import Principal
+from app.models.request import RequestPriority
 from app.models.employee import Employee
-from app.models.rating import Rating
-from app.models.category import Category
+from app.schemas.statistics import TimeseriesGranularity, TimeseriesResponse, PriorityBreakdown
+from app.services import statistics_service
+from app.services.response_cache import cached_response, GLOBAL_TAG, employee_tag, category_tag
 from app.core.logging import get_logger
 
 logger = get_logger()
@@ -22,99 +28,63 @@ router = APIRouter()
 
 
 @router.get("/overview")
+@cached_response("overview", tags=lambda **_: [GLOBAL_TAG])
 async def get_statistics_overview(
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """Общая статистика (для админов ЖКХ)"""
-
-    # Общее количество заявок
-    total_requests = await db.execute(select(func.count(Request.id)))
-    total_requests_count = total_requests.scalar()
-
-    # Количество заявок по статусам
-    status_counts = {}
-    for status in RequestStatus:
-        count = await db.execute(
-            select(func.count(Request.id)).where(Request.status == status)
+    return await statistics_service.get_overview(db)
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Дата из параметра запроса в наивном UTC (как хранится в БД)"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@router.get("/timeseries", response_model=TimeseriesResponse)
+@cached_response(
+    "timeseries",
+    tags=lambda category_id, **_: [category_tag(category_id)] if category_id is not None else [GLOBAL_TAG]
+)
+async def get_statistics_timeseries(
+    granularity: TimeseriesGranularity = Query(TimeseriesGranularity.DAY, description="Интервал: hour, day, week"),
+    date_from: Optional[datetime] = Query(None, description="Начало периода (UTC)"),
+    date_to: Optional[datetime] = Query(None, description="Конец периода (UTC), по умолчанию - сейчас"),
+    category_id: Optional[int] = Query(None, description="Фильтр по категории"),
+    priority: Optional[RequestPriority] = Query(None, description="Фильтр по приоритету"),
+    organization_id: Optional[int] = Query(None, description="Фильтр по организации исполнителя"),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Временной ряд: поступление и выполнение заявок, медиана и p90 времени
+    выполнения по интервалам (для графиков админов ЖКХ)
+    """
+    try:
+        return await statistics_service.compute_timeseries(
+            db,
+            granularity,
+            date_from=_as_utc(date_from),
+            date_to=_as_utc(date_to),
+            category_id=category_id,
+            priority=priority,
+            organization_id=organization_id
         )
-        status_counts[status.value] = count.scalar()
-
-    # Количество заявок за последние 30 дней
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_requests = await db.execute(
-        select(func.count(Request.id)).where(Request.created_at >= thirty_days_ago)
-    )
-    recent_requests_count = recent_requests.scalar()
-
-    # Средний рейтинг всех сотрудников
-    avg_employee_rating = await db.execute(
-        select(func.avg(Employee.average_rating))
-    )
-    avg_rating = avg_employee_rating.scalar() or 0.0
-
-    # Количество сотрудников
-    total_employees = await db.execute(select(func.count(Employee.id)))
-    total_employees_count = total_employees.scalar()
-
-    # Среднее время выполнения заявки (в часах)
-    completed_requests = await db.execute(
-        select(Request).where(
-            and_(
-                Request.status == RequestStatus.COMPLETED,
-                Request.completed_at.isnot(None)
-            )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
-    )
-    completed_list = completed_requests.scalars().all()
-
-    avg_completion_time = 0.0
-    if completed_list:
-        total_time = sum([
-            (req.completed_at - req.created_at).total_seconds() / 3600
-            for req in completed_list
-        ])
-        avg_completion_time = total_time / len(completed_list)
-
-    # Распределение заявок по категориям
-    categories_result = await db.execute(
-        select(Category.name, func.count(Request.id))
-        .join(Request, Request.category_id == Category.id)
-        .group_by(Category.name)
-    )
-    categories_stats = {name: count for name, count in categories_result.all()}
-
-    # Топ-5 лучших сотрудников по рейтингу
-    top_employees = await db.execute(
-        select(Employee)
-        .order_by(Employee.average_rating.desc())
-        .limit(5)
-    )
-    top_employees_list = [
-        {
-            "id": emp.id,
-            "name": f"{emp.first_name} {emp.last_name}",
-            "rating": emp.average_rating
-        }
-        for emp in top_employees.scalars().all()
-    ]
-
-    return {
-        "total_requests": total_requests_count,
-        "recent_requests_30_days": recent_requests_count,
-        "status_distribution": status_counts,
-        "total_employees": total_employees_count,
-        "average_employee_rating": round(float(avg_rating), 2),
-        "average_completion_time_hours": round(avg_completion_time, 2),
-        "requests_by_category": categories_stats,
-        "top_employees": top_employees_list
-    }
 
 
 @router.get("/employee/{employee_id}")
+@cached_response("employee", tags=lambda employee_id, **_: [employee_tag(employee_id)])
 async def get_employee_statistics(
     employee_id: int,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """Статистика по конкретному сотруднику"""
@@ -126,70 +96,53 @@ async def get_employee_statistics(
     if not employee:
         return {"error": "Сотрудник не найден"}
 
-    # Общее количество заявок
-    total_requests = await db.execute(
-        select(func.count(Request.id)).where(Request.assignee_id == employee_id)
+    statistics = await statistics_service.get_employees_statistics(db, [employee])
+    return statistics[0]
+
+
+@router.get("/employees")
+@cached_response(
+    "employees",
+    tags=lambda employee_ids, organization_id, **_: (
+        [GLOBAL_TAG] if organization_id is not None else [employee_tag(employee_id) for employee_id in employee_ids or []]
     )
-    total_count = total_requests.scalar()
-
-    # Завершенные заявки
-    completed_requests = await db.execute(
-        select(func.count(Request.id)).where(
-            and_(
-                Request.assignee_id == employee_id,
-                Request.status == RequestStatus.COMPLETED
-            )
+)
+async def get_employees_statistics(
+    employee_ids: Optional[List[int]] = Query(None, description="ID сотрудников (параметр повторяется)"),
+    organization_id: Optional[int] = Query(None, description="Все сотрудники организации"),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
+    db: AsyncSession = Depends(get_db)
+) -> List[Dict[str, Any]]:
+    """Статистика по нескольким сотрудникам или по всей организации (3 запроса к БД)"""
+
+    if not employee_ids and organization_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Укажите employee_ids или organization_id"
         )
-    )
-    completed_count = completed_requests.scalar()
-
-    # Текущие активные заявки
-    active_requests = await db.execute(
-        select(func.count(Request.id)).where(
-            and_(
-                Request.assignee_id == employee_id,
-                Request.status.in_([RequestStatus.ASSIGNED, RequestStatus.IN_PROGRESS])
-            )
+
+    if employee_ids and len(employee_ids) > settings.PAGE_SIZE_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не более {settings.PAGE_SIZE_MAX} сотрудников за запрос"
         )
-    )
-    active_count = active_requests.scalar()
 
-    # Все оценки сотрудника
-    ratings_result = await db.execute(
-        select(Rating).where(Rating.employee_id == employee_id)
-    )
-    ratings_list = ratings_result.scalars().all()
-
-    # Распределение оценок
-    rating_distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-    for rating in ratings_list:
-        rating_distribution[rating.rating] += 1
-
-    return {
-        "employee_id": employee_id,
-        "name": f"{employee.first_name} {employee.last_name}",
-        "average_rating": employee.average_rating,
-        "total_requests": total_count,
-        "completed_requests": completed_count,
-        "active_requests": active_count,
-        "completion_rate": round((completed_count / total_count * 100) if total_count > 0 else 0, 2),
-        "rating_distribution": rating_distribution,
-        "total_ratings": len(ratings_list)
-    }
+    query = select(Employee).order_by(Employee.id)
+    if employee_ids:
+        query = query.where(Employee.id.in_(employee_ids))
+    if organization_id is not None:
+        query = query.where(Employee.organization_id == organization_id)
+
+    result = await db.execute(query)
+    return await statistics_service.get_employees_statistics(db, result.scalars().all())
 
 
 @router.get("/requests/priority")
+@cached_response("priority", tags=lambda **_: [GLOBAL_TAG])
 async def get_requests_by_priority(
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    breakdown: Optional[PriorityBreakdown] = Query(None, description="Дополнительный разрез: status или category"),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """Распределение заявок по приоритетам"""
-
-    priority_stats = {}
-    for priority in range(1, 6):
-        count = await db.execute(
-            select(func.count(Request.id)).where(Request.priority == priority)
-        )
-        priority_stats[f"priority_{priority}"] = count.scalar()
-
-    return priority_stats
+    return await statistics_service.get_priority_distribution(db, breakdown)
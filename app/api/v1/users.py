@@ -1,17 +1,20 @@
 """
 API эндпоинты для работы с пользователями
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.core.database import get_db
-from app.core.dependencies import get_current_active_user, require_role
-from app.core.security import get_password_hash, verify_password
+from app.core.dependencies import get_current_active_user, require_role, get_page_params
+from app.core.security import password_hasher
 from app.models.user import User, UserRole
 from app.schemas.user import UserResponse, UserUpdate
 from app.schemas.password import PasswordChange
 from app.schemas.base import MessageResponse
+from app.services.pagination import PageParams, paginate_by_created, set_next_cursor
+from app.services.principal_cache import Principal, principal_cache, USER
+from app.services.refresh_token_service import revoke_user_refresh_tokens
 from app.core.logging import get_logger
 
 logger = get_logger()
@@ -55,6 +58,7 @@ async def update_my_profile(
         current_user.email = user_data.email
 
     await db.commit()
+    principal_cache.invalidate(USER, current_user.id)
     await db.refresh(current_user)
 
     logger.info(f"Пользователь {current_user.username} обновил свой профиль")
@@ -65,7 +69,7 @@ async def update_my_profile(
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Получение профиля пользователя по ID (для админов)"""
@@ -91,16 +95,19 @@ async def change_password(
     """Изменение пароля"""
 
     # Проверка текущего пароля
-    if not verify_password(password_data.old_password, current_user.password_hash):
+    if not await password_hasher.verify(password_data.old_password, current_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Неверный текущий пароль"
         )
 
     # Установка нового пароля
-    current_user.password_hash = get_password_hash(password_data.new_password)
+    current_user.password_hash = await password_hasher.hash(password_data.new_password)
+    # Сессии на других устройствах не продлятся без нового входа
+    await revoke_user_refresh_tokens(db, current_user.id)
 
     await db.commit()
+    principal_cache.invalidate(USER, current_user.id)
 
     logger.info(f"Пользователь {current_user.username} сменил пароль")
 
@@ -116,6 +123,7 @@ async def delete_my_account(
 
     await db.delete(current_user)
     await db.commit()
+    principal_cache.invalidate(USER, current_user.id)
 
     logger.info(f"Пользователь {current_user.username} удалил свой аккаунт")
 
@@ -124,15 +132,20 @@ async def delete_my_account(
 
 @router.get("", response_model=list[UserResponse])
 async def get_all_users(
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    response: Response,
+    page_params: PageParams = Depends(get_page_params),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получение списка всех пользователей (для админов)"""
+    """
+    Получение списка всех пользователей (для админов).
+    Постранично, курсор следующей страницы - в заголовке X-Next-Cursor.
+    """
     
-    result = await db.execute(select(User).order_by(User.created_at.desc()))
-    users = result.scalars().all()
+    page = await paginate_by_created(db, select(User), User, page_params)
+    set_next_cursor(response, page)
     
-    return users
+    return page.items
 
 
 @router.post("/setup-test-accounts", response_model=MessageResponse)
@@ -152,7 +165,8 @@ async def setup_test_accounts(
     ]
     
     created = []
-    password_hash = get_password_hash("123456")
+    updated_ids = []
+    password_hash = await password_hasher.hash("123456")
     
     for account in test_accounts:
         # Проверяем существует ли
@@ -162,6 +176,7 @@ async def setup_test_accounts(
         if existing:
             # Обновляем пароль
             existing.password_hash = password_hash
+            updated_ids.append(existing.id)
             created.append(f"{account['username']} (обновлен)")
         else:
             # Создаём нового
@@ -177,6 +192,8 @@ async def setup_test_accounts(
             created.append(account["username"])
     
     await db.commit()
+    for user_id in updated_ids:
+        principal_cache.invalidate(USER, user_id)
     
     logger.info(f"Созданы/обновлены тестовые аккаунты: {created}")
     
@@ -189,7 +206,7 @@ async def setup_test_accounts(
 async def change_user_role(
     user_id: int,
     new_role: UserRole,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
+    current_user: Principal = Depends(require_role([UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
     """Изменение роли пользователя (для админов)"""
@@ -207,6 +224,7 @@ async def change_user_role(
     user.role = new_role
     
     await db.commit()
+    principal_cache.invalidate(USER, user_id)
     await db.refresh(user)
     
     logger.info(f"Админ {current_user.username} изменил роль пользователя {user.username}: {old_role} -> {new_role}")
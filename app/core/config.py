@@ -1,7 +1,7 @@
 """
 Конфигурация приложения
 """
-from typing import List
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -35,6 +35,26 @@ class Settings(BaseSettings):
         default=30,
         description="Время жизни access token в минутах"
     )
+    REFRESH_TOKEN_EXPIRE_DAYS: int = Field(
+        default=30,
+        description="Время жизни refresh token в днях (продлевается при каждом обновлении)"
+    )
+    JWT_BACKEND: str = Field(
+        default="jose",
+        description="Проверка JWT: jose (python-jose), pyjwt или hmac (стандартная библиотека, только HS*)"
+    )
+    JWT_CACHE_MAX_ENTRIES: int = Field(
+        default=10000,
+        description="Максимум проверенных токенов в кэше процесса (0 - без кэша)"
+    )
+    BCRYPT_ROUNDS: int = Field(
+        default=12,
+        description="Стоимость bcrypt (хеши с другой стоимостью пересчитываются при входе)"
+    )
+    PASSWORD_HASH_WORKERS: int = Field(
+        default=4,
+        description="Потоков для хеширования и проверки паролей (bcrypt не выполняется в event loop)"
+    )
 
     # Database
     DATABASE_URL: str = Field(
@@ -48,9 +68,147 @@ class Settings(BaseSettings):
         description="API ключ OpenAI"
     )
 
+    # AI Triage (фоновая обработка заявок)
+    TRIAGE_WORKER_ENABLED: bool = Field(
+        default=True,
+        description="Запускать воркер AI-обработки заявок в этом процессе"
+    )
+    TRIAGE_POLL_INTERVAL_SECONDS: float = Field(
+        default=2.0,
+        description="Интервал опроса очереди AI-обработки (секунды)"
+    )
+    TRIAGE_BATCH_SIZE: int = Field(default=5, description="Сколько задач воркер берет за проход и обрабатывает одновременно")
+    TRIAGE_MAX_ATTEMPTS: int = Field(
+        default=5,
+        description="Максимум попыток обработки одной заявки (запасные значения этапов - только на последней)"
+    )
+    TRIAGE_RETRY_BASE_SECONDS: float = Field(
+        default=10.0,
+        description="Базовая задержка повтора (удваивается с каждой попыткой)"
+    )
+    TRIAGE_STAGE_TIMEOUT_SECONDS: float = Field(
+        default=20.0,
+        description="Таймаут одного текстового этапа AI-обработки (секунды)"
+    )
+    TRIAGE_VISION_TIMEOUT_SECONDS: float = Field(
+        default=40.0,
+        description="Таймаут анализа фото (секунды)"
+    )
+    TRIAGE_LOCK_TIMEOUT_SECONDS: int = Field(
+        default=300,
+        description="Через сколько секунд зависшая задача считается брошенной и берется повторно"
+    )
+
+    # Workload index (индекс загрузки сотрудников)
+    WORKLOAD_RECONCILE_SECONDS: float = Field(
+        default=60.0,
+        description="Интервал сверки индекса загрузки сотрудников с БД (секунды)"
+    )
+
+    # Pagination (курсорная пагинация списков)
+    PAGE_SIZE_DEFAULT: int = Field(default=50, description="Размер страницы списков по умолчанию")
+    PAGE_SIZE_MAX: int = Field(default=200, description="Максимальный размер страницы списков")
+
+    # Map clusters (кластеры заявок на карте)
+    MAP_CLUSTER_REBUILD_SECONDS: float = Field(
+        default=60.0,
+        description="Интервал перестройки кластеров карты по БД (секунды)"
+    )
+    MAP_CACHE_TTL_SECONDS: float = Field(
+        default=5.0,
+        description="Время жизни кэша ответов карты и max-age для клиентов (секунды)"
+    )
+
+    # Statistics cache (кэш ответов эндпоинтов статистики)
+    STATISTICS_CACHE_TTL_SECONDS: float = Field(
+        default=60.0,
+        description="Время жизни закэшированного ответа статистики (секунды); без CACHE_REDIS_URL - максимальное отставание от БД в других воркерах"
+    )
+    STATISTICS_CACHE_MAX_ENTRIES: int = Field(
+        default=512,
+        description="Максимум ответов в кэше процесса (вытесняются давно не использованные)"
+    )
+    CACHE_REDIS_URL: Optional[str] = Field(
+        default=None,
+        description="Redis для общего кэша всех процессов (redis://host:6379/0); без него кэш в памяти процесса. Обязателен при нескольких воркерах"
+    )
+
+    # Principal cache (кэш пользователя/сотрудника по токену)
+    PRINCIPAL_CACHE_TTL_SECONDS: float = Field(
+        default=30.0,
+        description="Время жизни закэшированного принципала токена (секунды, 0 - без кэша); в других процессах понижение роли и удаление вступают в силу не позже чем через это время"
+    )
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = Field(
+        default=10000,
+        description="Максимум принципалов в кэше процесса (вытесняются давно не использованные)"
+    )
+
+    # Notifications (пакетная запись уведомлений и outbox доставки)
+    NOTIFICATION_INSERT_CHUNK_SIZE: int = Field(
+        default=500,
+        description="Максимум строк в одном INSERT уведомлений при массовой рассылке"
+    )
+    NOTIFICATION_OUTBOX_RELAY_ENABLED: bool = Field(
+        default=True,
+        description="Запускать доставку уведомлений из outbox в этом процессе"
+    )
+    NOTIFICATION_OUTBOX_POLL_SECONDS: float = Field(
+        default=5.0,
+        description="Интервал опроса outbox уведомлений (секунды)"
+    )
+    NOTIFICATION_OUTBOX_BATCH_SIZE: int = Field(default=100, description="Сколько записей outbox доставляется за один проход")
+    NOTIFICATION_OUTBOX_MAX_ATTEMPTS: int = Field(default=5, description="Максимум попыток доставки записи outbox")
+    NOTIFICATION_OUTBOX_RETRY_BASE_SECONDS: float = Field(
+        default=5.0,
+        description="Базовая задержка повтора доставки (удваивается с каждой попыткой)"
+    )
+    NOTIFICATION_OUTBOX_LOCK_TIMEOUT_SECONDS: int = Field(
+        default=60,
+        description="Через сколько секунд захваченная запись outbox считается брошенной и берется повторно"
+    )
+    NOTIFICATION_BROKER_URL: Optional[str] = Field(
+        default=None,
+        description="Redis для push-уведомлений между процессами (redis://host:6379/0); без него - в памяти процесса"
+    )
+    NOTIFICATION_STREAM_KEEPALIVE_SECONDS: float = Field(
+        default=15.0,
+        description="Интервал keepalive-комментариев в потоке /notifications/stream (секунды)"
+    )
+
+    # Assignment (автоматическое назначение сотрудников)
+    ASSIGNMENT_ENGINE: str = Field(
+        default="hybrid",
+        description="Движок назначения: local (только локальная оценка) или hybrid (LLM для близких оценок)"
+    )
+    ASSIGNMENT_LLM_ENABLED: bool = Field(
+        default=True,
+        description="Использовать LLM как арбитра при близких оценках кандидатов"
+    )
+    ASSIGNMENT_LLM_MARGIN: float = Field(
+        default=0.01,
+        description="Разница оценок, при которой кандидаты считаются равными и решает LLM"
+    )
+    ASSIGNMENT_WEIGHT_LOAD: float = Field(default=1.0, description="Вес загрузки сотрудника")
+    ASSIGNMENT_LOAD_CAP: int = Field(
+        default=10,
+        description="Количество активных заявок, при котором оценка загрузки становится нулевой"
+    )
+    ASSIGNMENT_WEIGHT_RATING: float = Field(default=0.4, description="Вес рейтинга сотрудника")
+    ASSIGNMENT_WEIGHT_SPECIALTY: float = Field(default=0.3, description="Вес совпадения специальности")
+    ASSIGNMENT_WEIGHT_DISTANCE: float = Field(default=0.3, description="Вес близости к заявке")
+    ASSIGNMENT_DISTANCE_SCALE_KM: float = Field(
+        default=3.0,
+        description="Расстояние (км), на котором оценка близости падает вдвое"
+    )
+
     # File Storage
     UPLOAD_DIR: str = Field(default="uploads", description="Директория для загрузки файлов")
     MAX_FILE_SIZE: int = Field(default=10485760, description="Максимальный размер файла (10MB)")
+    UPLOAD_CHUNK_SIZE: int = Field(default=1048576, description="Размер части при записи загрузки на диск (байт)")
+    IMAGE_PROCESS_WORKERS: int = Field(
+        default=2,
+        description="Процессов для обработки изображений (одновременно обрабатываемых фото)"
+    )
 
     # Yandex Maps API
     YANDEX_MAPS_API_KEY: str = Field(
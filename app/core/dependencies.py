@@ -1,25 +1,33 @@
 """
 Dependencies для FastAPI
 """
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, AsyncSessionLocal
 from app.core.security import decode_access_token
 from app.models.user import User, UserRole
 from app.models.employee import Employee
 from app.schemas.auth import TokenData
+from app.services.pagination import PageParams
+from app.services.principal_cache import USER, EMPLOYEE, Principal, load_principal
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login", auto_error=False)
 
 
-async def get_current_user(
+async def get_current_principal(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db)
-) -> User:
-    """Получение текущего пользователя из токена"""
+) -> Principal:
+    """
+    Пользователь токена для авторизации: id, username и роль
+    (из кэша принципалов - без запроса к БД при попадании)
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось проверить учетные данные",
@@ -31,13 +39,31 @@ async def get_current_user(
     if token_data is None or token_data.user_id is None:
         raise credentials_exception
 
-    # Получаем пользователя из БД
-    result = await db.execute(select(User).where(User.id == token_data.user_id))
-    user = result.scalar_one_or_none()
+    principal = await load_principal(db, User, USER, token_data.user_id, token_data.issued_at)
 
-    if user is None:
+    if principal is None:
         raise credentials_exception
 
+    return principal
+
+
+async def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """
+    Текущий пользователь целиком (ORM-объект из БД).
+    Для эндпоинтов, которые возвращают или меняют профиль.
+    """
+    user = await db.get(User, principal.id)
+
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Не удалось проверить учетные данные",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
     return user
 
 
@@ -48,9 +74,48 @@ async def get_current_active_user(
     return current_user
 
 
+async def get_stream_token(
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+    access_token: Optional[str] = Query(None, description="JWT для клиентов без заголовков (EventSource)")
+) -> TokenData:
+    """
+    Данные токена долгоживущего потока (поток закрывается по их expires_at).
+    Токен берется из заголовка Authorization или параметра access_token.
+    """
+    token = header_token or access_token
+    token_data: Optional[TokenData] = decode_access_token(token) if token else None
+
+    if token_data is None or token_data.user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Не удалось проверить учетные данные",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return token_data
+
+
+async def get_stream_user(token_data: TokenData = Depends(get_stream_token)) -> Principal:
+    """
+    Пользователь долгоживущего потока.
+    Сессия БД закрывается сразу после проверки и не держится весь поток.
+    """
+    async with AsyncSessionLocal() as session:
+        principal = await load_principal(session, User, USER, token_data.user_id, token_data.issued_at)
+
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Не удалось проверить учетные данные",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return principal
+
+
 def require_role(required_roles: list[UserRole]):
-    """Проверка роли пользователя"""
-    async def role_checker(current_user: User = Depends(get_current_active_user)) -> User:
+    """Проверка роли пользователя (по закэшированному принципалу токена - без запроса к БД)"""
+    async def role_checker(current_user: Principal = Depends(get_current_principal)) -> Principal:
         if current_user.role not in required_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -60,11 +125,11 @@ def require_role(required_roles: list[UserRole]):
     return role_checker
 
 
-async def get_current_employee(
+async def get_current_employee_principal(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db)
-) -> Employee:
-    """Получение текущего сотрудника из токена"""
+) -> Principal:
+    """Сотрудник токена для авторизации (из кэша принципалов)"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось проверить учетные данные",
@@ -76,11 +141,35 @@ async def get_current_employee(
     if token_data is None or token_data.employee_id is None:
         raise credentials_exception
 
-    # Получаем сотрудника из БД
-    result = await db.execute(select(Employee).where(Employee.id == token_data.employee_id))
-    employee = result.scalar_one_or_none()
+    principal = await load_principal(db, Employee, EMPLOYEE, token_data.employee_id, token_data.issued_at)
 
-    if employee is None:
+    if principal is None:
         raise credentials_exception
 
+    return principal
+
+
+async def get_current_employee(
+    principal: Principal = Depends(get_current_employee_principal),
+    db: AsyncSession = Depends(get_db)
+) -> Employee:
+    """Текущий сотрудник целиком (ORM-объект из БД)"""
+    employee = await db.get(Employee, principal.id)
+
+    if employee is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Не удалось проверить учетные данные",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
     return employee
+
+
+def get_page_params(
+    cursor: Optional[str] = Query(None, description="Курсор страницы (из заголовка X-Next-Cursor)"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX, description="Размер страницы"),
+    unbounded: bool = Query(False, alias="all", description="Вернуть весь список без пагинации")
+) -> PageParams:
+    """Параметры курсорной пагинации"""
+    return PageParams(cursor=cursor, limit=limit, unbounded=unbounded)
@@ -1,10 +1,27 @@
 """
 Настройка логирования приложения
 """
+import logging
+import re
 import sys
 from loguru import logger
 from app.core.config import settings
 
+# Токен в query string (поток /notifications/stream) не должен попадать в журнал доступа
+ACCESS_TOKEN_PATTERN = re.compile(r"(access_token=)[^&\s]+")
+
+
+class AccessTokenFilter(logging.Filter):
+    """Маскирует параметр access_token в строках журнала доступа uvicorn"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.args, tuple):
+            record.args = tuple(
+                ACCESS_TOKEN_PATTERN.sub(r"\1***", arg) if isinstance(arg, str) else arg
+                for arg in record.args
+            )
+        return True
+
 
 def setup_logging() -> None:
     """
@@ -34,6 +51,9 @@ def setup_logging() -> None:
         level=settings.LOG_LEVEL,
     )
 
+    # uvicorn настраивает свои логгеры до импорта приложения - фильтр добавляется поверх
+    logging.getLogger("uvicorn.access").addFilter(AccessTokenFilter())
+
     logger.info("Логирование настроено")
 
 
@@ -0,0 +1,37 @@
+"""
+Счетчики метрик процесса
+
+Простые монотонные счетчики (попадания в кэш, инвалидации и т.п.) и
+текущие значения (глубина очереди и т.п.), которые отдаются эндпоинтом
+GET /api/v1/metrics (только для админов). Значения живут в памяти
+процесса и сбрасываются при перезапуске.
+"""
+from collections import defaultdict
+from typing import Dict
+
+
+class Counters:
+    """Именованные счетчики"""
+
+    def __init__(self):
+        self._values: Dict[str, int] = defaultdict(int)
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """Увеличить счетчик"""
+        self._values[name] += value
+
+    def set(self, name: str, value: int) -> None:
+        """Записать текущее значение (для показателей, которые не только растут)"""
+        self._values[name] = value
+
+    def get(self, name: str) -> int:
+        """Текущее значение счетчика"""
+        return self._values.get(name, 0)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Копия всех счетчиков, отсортированная по имени"""
+        return dict(sorted(self._values.items()))
+
+
+# Глобальные счетчики процесса
+metrics = Counters()
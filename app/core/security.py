@@ -1,61 +1,117 @@
 """
 Утилиты для безопасности (JWT, пароли)
 """
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
+from typing import Callable, Optional, TypeVar
+from jose import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.token_verifier import token_verifier
 from app.schemas.auth import TokenData
-from app.models.user import UserRole
 
-# Контекст для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+T = TypeVar("T")
+
+# Контекст для хеширования паролей. Хеш с другой стоимостью
+# считается устаревшим (needs_update) и пересчитывается при входе
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Проверка пароля"""
+    """Проверка пароля (синхронно - для скриптов; в эндпоинтах - password_hasher)"""
     return pwd_context.verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    """Хеширование пароля"""
+    """Хеширование пароля (синхронно - для скриптов; в эндпоинтах - password_hasher)"""
     return pwd_context.hash(password)
 
 
+class PasswordHasher:
+    """
+    bcrypt в отдельном пуле потоков ограниченного размера.
+
+    Хеширование занимает сотни миллисекунд CPU; в event loop оно
+    останавливало бы все остальные запросы процесса. Пул отдельный, чтобы
+    всплеск входов не занимал потоки run_in_executor по умолчанию.
+
+    Метрики (GET /metrics): password_hasher.in_flight - операции в пуле
+    и в очереди к нему, password_hasher.queue_wait_ms - суммарное ожидание
+    свободного потока, password_hasher.calls.<операция> - число вызовов.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hasher")
+        return self._executor
+
+    async def _run(self, operation: str, func: Callable[..., T], *args) -> T:
+        submitted = time.perf_counter()
+
+        def timed() -> T:
+            metrics.increment("password_hasher.queue_wait_ms", int((time.perf_counter() - submitted) * 1000))
+            return func(*args)
+
+        self._in_flight += 1
+        metrics.set("password_hasher.in_flight", self._in_flight)
+        metrics.increment(f"password_hasher.calls.{operation}")
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), timed)
+        finally:
+            self._in_flight -= 1
+            metrics.set("password_hasher.in_flight", self._in_flight)
+
+    async def hash(self, password: str) -> str:
+        """Хеш пароля с текущей стоимостью"""
+        return await self._run("hash", pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Проверка пароля"""
+        return await self._run("verify", pwd_context.verify, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        """
+        Проверка пароля и пересчет устаревшего хеша в одном вызове пула.
+
+        Returns:
+            (пароль верный, новый хеш или None, если хеш актуален)
+        """
+        return await self._run("verify", pwd_context.verify_and_update, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Создание JWT токена"""
     to_encode = data.copy()
+    now = datetime.utcnow()
 
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = now + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": now})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
     return encoded_jwt
 
 
 def decode_access_token(token: str) -> Optional[TokenData]:
-    """Декодирование JWT токена"""
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: int = payload.get("user_id")
-        username: str = payload.get("sub")
-        role: str = payload.get("role")
-        employee_id: Optional[int] = payload.get("employee_id")
-
-        if username is None or user_id is None:
-            return None
-
-        return TokenData(
-            user_id=user_id,
-            username=username,
-            role=UserRole(role) if role else None,
-            employee_id=employee_id
-        )
-    except JWTError:
-        return None
+    """Декодирование JWT токена (см. token_verifier)"""
+    return token_verifier.decode(token)
@@ -0,0 +1,113 @@
+"""
+Переносимые SQL-конструкции для агрегатов
+"""
+from typing import Any, Dict
+
+from sqlalchemy import DateTime, Float, Table
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class seconds_between(FunctionElement):
+    """
+    Разница между двумя датами в секундах (end - start).
+
+    MySQL: TIMESTAMPDIFF(SECOND, start, end), SQLite: через julianday,
+    остальные БД: EXTRACT(EPOCH FROM end - start).
+    """
+    type = Float()
+    name = "seconds_between"
+    inherit_cache = True
+
+
+@compiles(seconds_between)
+def _seconds_between_default(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return f"EXTRACT(EPOCH FROM {compiler.process(end, **kw)} - {compiler.process(start, **kw)})"
+
+
+@compiles(seconds_between, "mysql")
+def _seconds_between_mysql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return f"TIMESTAMPDIFF(SECOND, {compiler.process(start, **kw)}, {compiler.process(end, **kw)})"
+
+
+@compiles(seconds_between, "sqlite")
+def _seconds_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return f"((julianday({compiler.process(end, **kw)}) - julianday({compiler.process(start, **kw)})) * 86400.0)"
+
+
+class hour_bucket(FunctionElement):
+    """Начало часа для даты (усечение до часа)"""
+    type = DateTime()
+    name = "hour_bucket"
+    inherit_cache = True
+
+
+class day_bucket(FunctionElement):
+    """Начало дня для даты (усечение до суток)"""
+    type = DateTime()
+    name = "day_bucket"
+    inherit_cache = True
+
+
+@compiles(hour_bucket)
+def _hour_bucket_default(element, compiler, **kw):
+    return f"date_trunc('hour', {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(day_bucket)
+def _day_bucket_default(element, compiler, **kw):
+    return f"date_trunc('day', {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(hour_bucket, "mysql")
+def _hour_bucket_mysql(element, compiler, **kw):
+    value = compiler.process(element.clauses, **kw)
+    return f"DATE_ADD(DATE({value}), INTERVAL HOUR({value}) HOUR)"
+
+
+@compiles(day_bucket, "mysql")
+def _day_bucket_mysql(element, compiler, **kw):
+    return f"CAST(DATE({compiler.process(element.clauses, **kw)}) AS DATETIME)"
+
+
+@compiles(hour_bucket, "sqlite")
+def _hour_bucket_sqlite(element, compiler, **kw):
+    return f"strftime('%Y-%m-%d %H:00:00', {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(day_bucket, "sqlite")
+def _day_bucket_sqlite(element, compiler, **kw):
+    return f"strftime('%Y-%m-%d 00:00:00', {compiler.process(element.clauses, **kw)})"
+
+
+def increment_statement(dialect_name: str, table: Table, key: Dict[str, Any], deltas: Dict[str, Any]):
+    """
+    INSERT строки счетчиков или прибавление к существующей по уникальному ключу.
+
+    MySQL: ON DUPLICATE KEY UPDATE col = col + VALUES(col),
+    SQLite/PostgreSQL: ON CONFLICT (key) DO UPDATE SET col = col + excluded.col.
+
+    Args:
+        dialect_name: Имя диалекта БД (db.bind.dialect.name)
+        table: Таблица счетчиков с уникальным ограничением на key
+        key: Значения колонок ключа
+        deltas: Приращения счетчиков (могут быть отрицательными)
+    """
+    if dialect_name == "mysql":
+        stmt = mysql_insert(table).values(**key, **deltas)
+        return stmt.on_duplicate_key_update({
+            column: table.c[column] + stmt.inserted[column] for column in deltas
+        })
+
+    insert = sqlite_insert if dialect_name == "sqlite" else postgresql_insert
+    stmt = insert(table).values(**key, **deltas)
+    return stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={column: table.c[column] + stmt.excluded[column] for column in deltas}
+    )
@@ -0,0 +1,278 @@
+"""
+Проверка JWT токенов
+
+Токен проверяется на каждом запросе с авторизацией. Проверка вынесена
+за интерфейс TokenBackend с несколькими реализациями (JWT_BACKEND):
+
+- jose  - python-jose, как раньше (по умолчанию);
+- pyjwt - PyJWT, если пакет установлен;
+- hmac  - HS256/HS384/HS512 на стандартной библиотеке (hmac, base64, json)
+          без промежуточных слоев python-jose, только по явному выбору.
+
+Проверенные токены хранятся в ограниченном LRU-кэше под ключом SHA-256
+от строки токена (сами токены в памяти не остаются) до момента их exp.
+Повторный запрос с тем же токеном не разбирает и не проверяет его
+заново. Токены без exp и неверные токены не кэшируются.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Protocol
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.models.user import UserRole
+from app.schemas.auth import TokenData
+
+logger = get_logger()
+
+HMAC_DIGESTS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+
+
+class InvalidTokenError(Exception):
+    """Токен поврежден, подписан другим ключом или истек"""
+
+
+class TokenBackend(Protocol):
+    """Проверка подписи и срока действия токена"""
+
+    name: str
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """Payload проверенного токена, иначе InvalidTokenError"""
+        ...
+
+
+def _b64decode(segment: bytes) -> bytes:
+    # Как base64url_decode в python-jose: символы вне алфавита отбрасываются
+    return base64.urlsafe_b64decode(segment + b"=" * (-len(segment) % 4))
+
+
+def _validate_time_claims(payload: Dict[str, Any], now: float) -> None:
+    """Проверка exp и nbf (как в python-jose, без допуска по времени)"""
+    for claim in ("exp", "nbf"):
+        value = payload.get(claim)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise InvalidTokenError(f"Поле {claim} должно быть числом")
+
+    exp = payload.get("exp")
+    if exp is not None and exp < now:
+        raise InvalidTokenError("Срок действия токена истек")
+
+    nbf = payload.get("nbf")
+    if nbf is not None and nbf > now:
+        raise InvalidTokenError("Токен еще не действует")
+
+
+class HmacTokenBackend:
+    """HMAC-подпись на стандартной библиотеке"""
+
+    name = "hmac"
+
+    def __init__(self, secret_key: str, algorithm: str):
+        if algorithm not in HMAC_DIGESTS:
+            raise ValueError(f"Алгоритм {algorithm} не поддерживается бэкендом hmac")
+        self.algorithm = algorithm
+        self._key = secret_key.encode("utf-8")
+        self._digest = HMAC_DIGESTS[algorithm]
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        try:
+            token_bytes = token.encode("utf-8")
+            signing_input, _, signature_segment = token_bytes.rpartition(b".")
+            header_segment, _, payload_segment = signing_input.partition(b".")
+            if not header_segment or not payload_segment or b"." in payload_segment:
+                raise InvalidTokenError("Неверный формат токена")
+
+            header = json.loads(_b64decode(header_segment))
+            if not isinstance(header, dict) or header.get("alg") != self.algorithm:
+                raise InvalidTokenError("Неверный алгоритм подписи")
+
+            expected = hmac.new(self._key, signing_input, self._digest).digest()
+            if not hmac.compare_digest(expected, _b64decode(signature_segment)):
+                raise InvalidTokenError("Неверная подпись")
+
+            payload = json.loads(_b64decode(payload_segment))
+        except (ValueError, binascii.Error) as e:
+            # В том числе ошибки JSON и не-ASCII символы в токене
+            raise InvalidTokenError(str(e)) from e
+
+        if not isinstance(payload, dict):
+            raise InvalidTokenError("Payload токена должен быть объектом")
+
+        _validate_time_claims(payload, time.time())
+        return payload
+
+
+class JoseTokenBackend:
+    """python-jose"""
+
+    name = "jose"
+
+    def __init__(self, secret_key: str, algorithm: str):
+        from jose import jwt
+
+        self._jwt = jwt
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        from jose import JWTError
+
+        try:
+            return self._jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        except JWTError as e:
+            raise InvalidTokenError(str(e)) from e
+
+
+class PyJWTTokenBackend:
+    """PyJWT (необязательная зависимость)"""
+
+    name = "pyjwt"
+
+    def __init__(self, secret_key: str, algorithm: str):
+        import jwt
+
+        self._jwt = jwt
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        try:
+            return self._jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        except self._jwt.PyJWTError as e:
+            raise InvalidTokenError(str(e)) from e
+
+
+def create_token_backend(name: str, secret_key: str, algorithm: str) -> TokenBackend:
+    """
+    Бэкенд проверки по имени (jose, pyjwt или hmac).
+
+    hmac включается только явно: его совпадение с python-jose на
+    поврежденных, истекших и чужих токенах проверяет tests/test_token_verifier.py.
+    Если PyJWT не установлен, используется python-jose.
+    """
+    if name == "hmac":
+        return HmacTokenBackend(secret_key, algorithm)
+    if name == "pyjwt":
+        try:
+            return PyJWTTokenBackend(secret_key, algorithm)
+        except ImportError:
+            logger.warning("JWT_BACKEND=pyjwt, но пакет PyJWT не установлен - используется python-jose")
+    elif name != "jose":
+        raise ValueError(f"Неизвестный JWT_BACKEND: {name}")
+    return JoseTokenBackend(secret_key, algorithm)
+
+
+class VerifiedTokenCache:
+    """LRU-кэш проверенных токенов до их exp"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, tuple[float, TokenData]]" = OrderedDict()
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8", "surrogatepass")).digest()
+
+    def get(self, key: bytes) -> Optional[TokenData]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: bytes, expires_at: float, token_data: TokenData) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (expires_at, token_data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def token_data_from_payload(payload: Dict[str, Any]) -> Optional[TokenData]:
+    """
+    Данные токена из payload.
+
+    None, если нет sub или user_id, либо claims не подходят под TokenData
+    (неизвестная роль, user_id не число): подписанный, но чужой по формату
+    токен - это 401, а не 500.
+    """
+    user_id: int = payload.get("user_id")
+    username: str = payload.get("sub")
+    role: str = payload.get("role")
+
+    if username is None or user_id is None:
+        return None
+
+    try:
+        return TokenData(
+            user_id=user_id,
+            username=username,
+            role=UserRole(role) if role else None,
+            employee_id=payload.get("employee_id"),
+            issued_at=payload.get("iat"),
+            expires_at=payload.get("exp")
+        )
+    except (ValueError, TypeError) as e:
+        # pydantic.ValidationError - подкласс ValueError
+        logger.warning(f"Токен с неожиданными claims отклонен: {str(e)[:100]}")
+        return None
+
+
+class TokenVerifier:
+    """Проверка токена через бэкенд с кэшем проверенных токенов"""
+
+    def __init__(self, backend: TokenBackend, cache: VerifiedTokenCache):
+        self.backend = backend
+        self.cache = cache
+
+    def decode(self, token: str) -> Optional[TokenData]:
+        """
+        Данные проверенного токена.
+
+        Returns:
+            TokenData или None, если токен неверный или истек
+        """
+        key = self.cache.key(token)
+        token_data = self.cache.get(key)
+        if token_data is not None:
+            metrics.increment("token_cache.hits")
+            return token_data
+        metrics.increment("token_cache.misses")
+
+        try:
+            payload = self.backend.decode(token)
+        except InvalidTokenError:
+            return None
+
+        token_data = token_data_from_payload(payload)
+        exp = payload.get("exp")
+        if token_data is not None and exp is not None:
+            self.cache.put(key, exp, token_data)
+        return token_data
+
+
+token_verifier = TokenVerifier(
+    create_token_backend(settings.JWT_BACKEND, settings.SECRET_KEY, settings.ALGORITHM),
+    VerifiedTokenCache(settings.JWT_CACHE_MAX_ENTRIES)
+)
@@ -1,6 +1,7 @@
 """
 Главный модуль FastAPI приложения
 """
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -48,12 +49,50 @@ async def lifespan(app: FastAPI):
                 logger.warning(f"Миграция ENUM пропущена: {e}")
         
         # Автоматическая миграция: добавление новых колонок
-        from app.services.column_migration import migrate_add_columns
+        from app.services.column_migration import migrate_add_columns, check_indexes
         async with AsyncSessionLocal() as session:
             try:
                 await migrate_add_columns(session)
             except Exception as e:
                 logger.warning(f"Миграция колонок пропущена: {e}")
+        # Индексы создает и удаляет migrate_indexes.py, при старте - только проверка
+        async with AsyncSessionLocal() as session:
+            try:
+                await check_indexes(session)
+            except Exception as e:
+                logger.warning(f"Проверка индексов пропущена: {e}")
+
+        # Геоиндекс карты заявок (SPATIAL индекс на MySQL, создается migrate_spatial_index.py)
+        from app.services.geo_service import check_spatial_index
+        async with AsyncSessionLocal() as session:
+            try:
+                await check_spatial_index(session)
+            except Exception as e:
+                logger.warning(f"Проверка геоиндекса пропущена: {e}")
+
+        # Счетчики рейтинга сотрудников после добавления колонок
+        from app.services.rating_service import ensure_rating_counters
+        async with AsyncSessionLocal() as session:
+            try:
+                await ensure_rating_counters(session)
+            except Exception as e:
+                logger.warning(f"Пересчет рейтинга сотрудников пропущен: {e}")
+
+        # Счетчики непрочитанных уведомлений после добавления колонки
+        from app.services.notification_service import ensure_unread_counters
+        async with AsyncSessionLocal() as session:
+            try:
+                await ensure_unread_counters(session)
+            except Exception as e:
+                logger.warning(f"Пересчет счетчиков уведомлений пропущен: {e}")
+
+        # Агрегаты статистики строятся скриптом rebuild_statistics.py, здесь только проверка
+        from app.services.statistics_rollup import check_rollups_built
+        async with AsyncSessionLocal() as session:
+            try:
+                await check_rollups_built(session)
+            except Exception as e:
+                logger.warning(f"Проверка агрегатов статистики пропущена: {e}")
 
         # Добавление начальных данных
         from app.services.init_data import init_categories_and_specialties, create_demo_data
@@ -68,11 +107,63 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Ошибка инициализации базы данных: {e}")
 
+    # Фоновый воркер AI-обработки заявок
+    from app.services.triage_service import run_triage_worker, wake_triage_worker
+    triage_stop = asyncio.Event()
+    triage_task = None
+    if settings.TRIAGE_WORKER_ENABLED:
+        triage_task = asyncio.create_task(run_triage_worker(triage_stop))
+
+    # Периодическая сверка индекса загрузки сотрудников с БД
+    from app.services.workload_index import run_workload_reconciler
+    background_stop = asyncio.Event()
+    reconciler_task = asyncio.create_task(run_workload_reconciler(background_stop))
+
+    # Кластеры заявок на карте (первая перестройка выполняется сразу)
+    from app.services.map_clusters import run_map_cluster_rebuilder
+    map_clusters_task = asyncio.create_task(run_map_cluster_rebuilder(background_stop))
+
+    # Доставка уведомлений из outbox
+    from app.services.notification_outbox import run_notification_outbox_relay, wake_outbox_relay
+    outbox_task = None
+    if settings.NOTIFICATION_OUTBOX_RELAY_ENABLED:
+        outbox_task = asyncio.create_task(run_notification_outbox_relay(background_stop))
+
+    # Брокер push-уведомлений (подписка на Redis, если настроен)
+    from app.services.notification_push import get_notification_broker
+    notification_broker = get_notification_broker()
+    try:
+        await notification_broker.start()
+    except Exception as e:
+        logger.warning(f"Брокер push-уведомлений не запущен: {e}")
+
     yield
 
     # Shutdown
     logger.info("Завершение работы приложения")
 
+    background_stop.set()
+    wake_outbox_relay()
+    await reconciler_task
+    await map_clusters_task
+    if outbox_task:
+        await outbox_task
+    await notification_broker.stop()
+
+    from app.core.security import password_hasher
+    password_hasher.shutdown()
+    from app.services.file_service import image_processor
+    image_processor.shutdown()
+
+    if triage_task:
+        triage_stop.set()
+        wake_triage_worker()
+        try:
+            await asyncio.wait_for(triage_task, timeout=10)
+        except asyncio.TimeoutError:
+            # Незавершенная задача будет подхвачена после рестарта
+            triage_task.cancel()
+
 
 # Создание приложения FastAPI
 app = FastAPI(
@@ -93,6 +184,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 
@@ -8,6 +8,16 @@ from app.models.category import Category
 from app.models.specialty import Specialty
 from app.models.request import Request
 from app.models.rating import Rating
+from app.models.triage_job import TriageJob
+from app.models.notification import Notification, NotificationOutbox
+from app.models.refresh_token import RefreshToken
+from app.models.statistics_rollup import (
+    RequestStatsHourly,
+    RequestStatsDaily,
+    RatingStatsDaily,
+    ResolutionStatsHourly,
+    ResolutionStatsDaily,
+)
 
 __all__ = [
     "User",
@@ -17,4 +27,13 @@ __all__ = [
     "Specialty",
     "Request",
     "Rating",
+    "TriageJob",
+    "Notification",
+    "NotificationOutbox",
+    "RefreshToken",
+    "RequestStatsHourly",
+    "RequestStatsDaily",
+    "RatingStatsDaily",
+    "ResolutionStatsHourly",
+    "ResolutionStatsDaily",
 ]
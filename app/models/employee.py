@@ -1,7 +1,7 @@
 """
 Модель сотрудника ЖКХ
 """
-from sqlalchemy import Column, String, Integer, ForeignKey, Float
+from sqlalchemy import Column, String, Integer, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 
 from app.models.base import BaseModel
@@ -10,13 +10,21 @@ from app.models.base import BaseModel
 class Employee(BaseModel):
     """Модель сотрудника ЖКХ"""
     __tablename__ = "employees"
+    __table_args__ = (
+        Index("ix_employees_specialty_id", "specialty_id"),
+        Index("ix_employees_organization_id", "organization_id"),
+        # Сортировка по рейтингу (список сотрудников, топ в статистике)
+        Index("ix_employees_average_rating", "average_rating"),
+    )
 
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100), nullable=False)
     username = Column(String(50), unique=True, nullable=False, index=True)
     password_hash = Column(String(255), nullable=False)
     photo_url = Column(String(500), nullable=True)
-    average_rating = Column(Float, default=0.0)
+    average_rating = Column(Float, default=0.0)  # rating_sum / rating_count
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")  # Сумма всех оценок
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")  # Количество оценок
 
     # Foreign Keys
     specialty_id = Column(Integer, ForeignKey("specialties.id"), nullable=False)
@@ -1,8 +1,9 @@
 """
-Модель уведомления
+Модели уведомления и outbox их доставки
 """
-from sqlalchemy import Column, String, Text, Integer, Boolean, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, String, Text, Integer, Boolean, ForeignKey, DateTime, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 import enum
 
 from app.models.base import BaseModel
@@ -19,8 +20,14 @@ class NotificationType(str, enum.Enum):
 class Notification(BaseModel):
     """Модель уведомления пользователя"""
     __tablename__ = "notifications"
+    __table_args__ = (
+        # Список уведомлений пользователя, новые первыми
+        Index("ix_notifications_user_created_id", "user_id", "created_at", "id"),
+        # Непрочитанные уведомления пользователя и их пометка прочитанными
+        Index("ix_notifications_user_read_created_id", "user_id", "is_read", "created_at", "id"),
+    )
 
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # Индексы - составные (user_id, ...)
     title = Column(String(255), nullable=False)
     message = Column(Text, nullable=False)
     type = Column(SQLEnum(NotificationType, values_callable=lambda x: [e.value for e in x]), default=NotificationType.INFO, nullable=False)
@@ -28,3 +35,34 @@ class Notification(BaseModel):
 
     # Relationships
     user = relationship("User", backref="notifications")
+
+
+class NotificationOutboxStatus(str, enum.Enum):
+    """Статусы записи outbox уведомлений"""
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+
+
+class NotificationOutbox(BaseModel):
+    """
+    Запись outbox для доставки уведомлений за пределы БД (push и т.п.).
+    Пишется в той же транзакции, что и уведомления, поэтому доставляются
+    только зафиксированные уведомления. Доставленные записи удаляются.
+    """
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index("ix_notification_outbox_status_next_run_at", "status", "next_run_at"),
+        Index("ix_notification_outbox_locked_by", "locked_by"),
+    )
+
+    user_ids = Column(Text, nullable=False)  # JSON-список получателей
+    title = Column(String(255), nullable=False)
+    message = Column(Text, nullable=False)
+    type = Column(SQLEnum(NotificationType, values_callable=lambda x: [e.value for e in x]), default=NotificationType.INFO, nullable=False)
+    status = Column(SQLEnum(NotificationOutboxStatus, values_callable=lambda x: [e.value for e in x]), default=NotificationOutboxStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_run_at = Column(DateTime, server_default=func.now(), nullable=False)  # Когда запись можно доставлять
+    locked_by = Column(String(36), nullable=True)  # Метка прохода relay, захватившего запись
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
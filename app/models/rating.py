@@ -1,7 +1,7 @@
 """
 Модель оценки работы сотрудника
 """
-from sqlalchemy import Column, Integer, ForeignKey, Text
+from sqlalchemy import Column, Integer, ForeignKey, Index, Text
 from sqlalchemy.orm import relationship
 
 from app.models.base import BaseModel
@@ -10,6 +10,10 @@ from app.models.base import BaseModel
 class Rating(BaseModel):
     """Модель оценки работы сотрудника"""
     __tablename__ = "ratings"
+    __table_args__ = (
+        # Оценки сотрудника (покрывает AVG/распределение по rating)
+        Index("ix_ratings_employee_rating", "employee_id", "rating"),
+    )
 
     rating = Column(Integer, nullable=False)  # Оценка от 1 до 5
     comment = Column(Text, nullable=True)
@@ -0,0 +1,21 @@
+"""
+Модель refresh-токена
+"""
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+
+from app.models.base import BaseModel
+
+
+class RefreshToken(BaseModel):
+    """
+    Выданный refresh-токен.
+    Хранится только SHA-256 токена; токены одной цепочки обновлений
+    (от одного входа) объединены family_id и отзываются вместе.
+    """
+    __tablename__ = "refresh_tokens"
+
+    token_hash = Column(String(64), unique=True, nullable=False, index=True)  # Поиск токена при обновлении
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    family_id = Column(String(32), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)  # Использован (заменен следующим) или отозван
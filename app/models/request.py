@@ -1,7 +1,7 @@
 """
 Модель заявки
 """
-from sqlalchemy import Column, String, Text, Integer, Float, ForeignKey, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, String, Text, Integer, Float, ForeignKey, DateTime, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 import enum
 
@@ -27,6 +27,22 @@ class RequestPriority(str, enum.Enum):
 class Request(BaseModel):
     """Модель заявки на решение проблемы"""
     __tablename__ = "requests"
+    __table_args__ = (
+        # Выборка заявок карты по видимой области (диапазоны префиксов geohash)
+        Index("ix_requests_status_geohash", "status", "geohash"),
+        # Курсорная пагинация списков заявок (app/services/pagination.py)
+        Index("ix_requests_priority_created_id", "priority", "created_at", "id"),
+        Index("ix_requests_status_priority_created_id", "status", "priority", "created_at", "id"),
+        Index("ix_requests_creator_created_id", "creator_id", "created_at", "id"),
+        Index("ix_requests_assignee_priority_created_id", "assignee_id", "priority", "created_at", "id"),
+        # Активные заявки сотрудника (assignee_id = ? AND status IN (...)) - загрузка при назначении
+        Index("ix_requests_assignee_status", "assignee_id", "status"),
+        # Однопроходный агрегат по статусам и датам (сверка общей статистики)
+        Index("ix_requests_status_created_completed", "status", "created_at", "completed_at"),
+        # Фильтр списка по категории, недавние заявки в общей статистике
+        Index("ix_requests_category_status", "category_id", "status"),
+        Index("ix_requests_created_at", "created_at"),
+    )
 
     # Основная информация
     title = Column(String(255), nullable=True)
@@ -35,6 +51,7 @@ class Request(BaseModel):
     address = Column(String(500), nullable=False)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    geohash = Column(String(12), nullable=True)  # Geohash координат для геоиндекса карты
     photo_url = Column(String(500), nullable=True)  # Фото проблемы
     completion_photo_url = Column(String(500), nullable=True)  # Фото решения (renamed from solution_photo_url)
     completion_note = Column(Text, nullable=True)  # Заметка при завершении
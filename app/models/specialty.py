@@ -1,7 +1,7 @@
 """
 Модель специальности сотрудника
 """
-from sqlalchemy import Column, String, Integer, ForeignKey
+from sqlalchemy import Column, String, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 from app.models.base import BaseModel
@@ -10,6 +10,9 @@ from app.models.base import BaseModel
 class Specialty(BaseModel):
     """Модель специальности (род деятельности)"""
     __tablename__ = "specialties"
+    __table_args__ = (
+        Index("ix_specialties_category_id", "category_id"),
+    )
 
     name = Column(String(100), nullable=False, unique=True)
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
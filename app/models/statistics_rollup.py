@@ -0,0 +1,113 @@
+"""
+Модели агрегатов статистики (rollup-таблицы)
+
+Строки обновляются инкрементально в той же транзакции, что и изменение
+заявки или оценки (app/services/statistics_rollup.py), и полностью
+перестраиваются скриптом rebuild_statistics.py.
+"""
+from sqlalchemy import Column, Integer, Float, DateTime, Index, UniqueConstraint, Enum as SQLEnum
+
+from app.models.base import BaseModel
+from app.models.request import RequestStatus, RequestPriority
+
+
+class RequestStatsColumns:
+    """
+    Общие колонки агрегатов заявок.
+
+    Ключ: начало периода создания заявки + категория, текущий статус,
+    приоритет и исполнитель (0 - не назначена).
+    """
+    bucket = Column(DateTime, nullable=False)
+    category_id = Column(Integer, nullable=False)
+    status = Column(SQLEnum(RequestStatus, values_callable=lambda x: [e.value for e in x]), nullable=False)
+    priority = Column(SQLEnum(RequestPriority, values_callable=lambda x: [e.value for e in x]), nullable=False)
+    employee_id = Column(Integer, nullable=False, default=0)
+
+    request_count = Column(Integer, nullable=False, default=0)
+    resolved_count = Column(Integer, nullable=False, default=0)  # Завершенные с заполненным completed_at
+    resolution_seconds = Column(Float, nullable=False, default=0.0)  # Сумма времени выполнения
+
+
+class RequestStatsHourly(RequestStatsColumns, BaseModel):
+    """Почасовые агрегаты заявок"""
+    __tablename__ = "request_stats_hourly"
+    __table_args__ = (
+        UniqueConstraint(
+            "bucket", "category_id", "status", "priority", "employee_id",
+            name="uq_request_stats_hourly_key"
+        ),
+    )
+
+
+class RequestStatsDaily(RequestStatsColumns, BaseModel):
+    """Дневные агрегаты заявок"""
+    __tablename__ = "request_stats_daily"
+    __table_args__ = (
+        UniqueConstraint(
+            "bucket", "category_id", "status", "priority", "employee_id",
+            name="uq_request_stats_daily_key"
+        ),
+        Index("ix_request_stats_daily_employee_status", "employee_id", "status"),
+    )
+
+
+class RatingStatsDaily(BaseModel):
+    """Дневные агрегаты оценок сотрудников"""
+    __tablename__ = "rating_stats_daily"
+    __table_args__ = (
+        UniqueConstraint("bucket", "employee_id", "category_id", name="uq_rating_stats_daily_key"),
+        Index("ix_rating_stats_daily_employee", "employee_id"),
+    )
+
+    bucket = Column(DateTime, nullable=False)  # Начало дня, когда поставлена оценка
+    employee_id = Column(Integer, nullable=False)
+    category_id = Column(Integer, nullable=False)
+
+    rating_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    stars_1 = Column(Integer, nullable=False, default=0)
+    stars_2 = Column(Integer, nullable=False, default=0)
+    stars_3 = Column(Integer, nullable=False, default=0)
+    stars_4 = Column(Integer, nullable=False, default=0)
+    stars_5 = Column(Integer, nullable=False, default=0)
+
+
+class ResolutionStatsColumns:
+    """
+    Общие колонки агрегатов выполнения заявок.
+
+    Ключ: начало периода завершения + категория, приоритет, исполнитель
+    и номер интервала гистограммы времени выполнения (RESOLUTION_BIN_BOUNDS
+    в app/services/statistics_rollup.py).
+    """
+    bucket = Column(DateTime, nullable=False)
+    category_id = Column(Integer, nullable=False)
+    priority = Column(SQLEnum(RequestPriority, values_callable=lambda x: [e.value for e in x]), nullable=False)
+    employee_id = Column(Integer, nullable=False, default=0)
+    duration_bin = Column(Integer, nullable=False)
+
+    completed_count = Column(Integer, nullable=False, default=0)
+    resolution_seconds = Column(Float, nullable=False, default=0.0)  # Сумма времени выполнения
+
+
+class ResolutionStatsHourly(ResolutionStatsColumns, BaseModel):
+    """Почасовые агрегаты выполнения заявок"""
+    __tablename__ = "resolution_stats_hourly"
+    __table_args__ = (
+        UniqueConstraint(
+            "bucket", "category_id", "priority", "employee_id", "duration_bin",
+            name="uq_resolution_stats_hourly_key"
+        ),
+    )
+
+
+class ResolutionStatsDaily(ResolutionStatsColumns, BaseModel):
+    """Дневные агрегаты выполнения заявок"""
+    __tablename__ = "resolution_stats_daily"
+    __table_args__ = (
+        UniqueConstraint(
+            "bucket", "category_id", "priority", "employee_id", "duration_bin",
+            name="uq_resolution_stats_daily_key"
+        ),
+    )
@@ -0,0 +1,32 @@
+"""
+Модель задачи фоновой AI-обработки заявки
+"""
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index, Enum as SQLEnum
+from sqlalchemy.sql import func
+import enum
+
+from app.models.base import BaseModel
+
+
+class TriageJobStatus(str, enum.Enum):
+    """Статусы задачи AI-обработки"""
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class TriageJob(BaseModel):
+    """Задача AI-обработки заявки (анализ, приоритет, рекомендация, назначение)"""
+    __tablename__ = "triage_jobs"
+    __table_args__ = (
+        Index("ix_triage_jobs_status_next_run_at", "status", "next_run_at"),
+    )
+
+    request_id = Column(Integer, ForeignKey("requests.id", ondelete="CASCADE"), nullable=False, unique=True)
+    status = Column(SQLEnum(TriageJobStatus, values_callable=lambda x: [e.value for e in x]), default=TriageJobStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_run_at = Column(DateTime, server_default=func.now(), nullable=False)  # Когда задачу можно взять в работу
+    locked_at = Column(DateTime, nullable=True)  # Когда воркер взял задачу (для восстановления после падения)
+    last_error = Column(Text, nullable=True)
+    degraded_stages = Column(String(255), nullable=True)  # Этапы, завершенные fallback (через запятую)
@@ -1,7 +1,7 @@
 """
 Модель пользователя
 """
-from sqlalchemy import Column, String, Enum as SQLEnum
+from sqlalchemy import Column, String, Integer, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 import enum
 
@@ -18,6 +18,10 @@ class UserRole(str, enum.Enum):
 class User(BaseModel):
     """Модель пользователя"""
     __tablename__ = "users"
+    __table_args__ = (
+        # Курсорная пагинация списка пользователей
+        Index("ix_users_created_id", "created_at", "id"),
+    )
 
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100), nullable=False)
@@ -25,6 +29,7 @@ class User(BaseModel):
     email = Column(String(255), unique=True, nullable=True, index=True)
     password_hash = Column(String(255), nullable=False)
     role = Column(SQLEnum(UserRole, values_callable=lambda x: [e.value for e in x]), default=UserRole.CITIZEN, nullable=False)
+    unread_notifications = Column(Integer, nullable=False, default=0, server_default="0")  # Счетчик непрочитанных уведомлений
 
     # Relationships
     requests = relationship("Request", back_populates="creator", foreign_keys="Request.creator_id")
@@ -11,12 +11,19 @@ class Token(BaseModel):
     """Схема токена"""
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
+
+
+class RefreshTokenRequest(BaseModel):
+    """Запрос обновления токенов и выхода"""
+    refresh_token: str = Field(..., min_length=1, max_length=255)
 
 
 class AuthResponse(BaseModel):
     """Схема ответа при аутентификации"""
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
     user: dict  # User object будет добавлен динамически
 
 
@@ -26,3 +33,5 @@ class TokenData(BaseModel):
     username: Optional[str] = None
     role: Optional[UserRole] = None
     employee_id: Optional[int] = None  # Если это сотрудник
+    issued_at: Optional[int] = None  # iat токена (unix time), у старых токенов отсутствует
+    expires_at: Optional[int] = None  # exp токена (unix time)
@@ -2,7 +2,7 @@
 Базовые схемы для API
 """
 from pydantic import BaseModel, Field
-from typing import Optional, Any
+from typing import Optional, Any, Dict
 from datetime import datetime
 
 
@@ -13,6 +13,12 @@ class HealthCheck(BaseModel):
     timestamp: datetime = Field(..., description="Временная метка")
 
 
+class MetricsResponse(BaseModel):
+    """Схема для счетчиков метрик процесса"""
+    counters: Dict[str, int] = Field(..., description="Значения счетчиков")
+    timestamp: datetime = Field(..., description="Временная метка")
+
+
 class MessageResponse(BaseModel):
     """Схема для простого ответа с сообщением"""
     message: str = Field(..., description="Сообщение")
@@ -2,7 +2,7 @@
 Pydantic схемы для уведомлений
 """
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 from app.models.notification import NotificationType
@@ -20,6 +20,33 @@ class NotificationCreate(NotificationBase):
     user_id: int
 
 
+class NotificationBulkCreate(NotificationBase):
+    """Схема массовой рассылки (например, отключение воды в доме)"""
+    user_ids: List[int] = Field(..., min_length=1, max_length=10000, description="Получатели")
+
+
+class NotificationBulkResponse(BaseModel):
+    """Результат массовой рассылки"""
+    recipients: int = Field(..., description="Количество получателей")
+
+
+class NotificationMarkRead(BaseModel):
+    """Схема пометки уведомлений прочитанными"""
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=1000, description="ID уведомлений")
+    all: bool = Field(default=False, description="Пометить все непрочитанные")
+
+
+class NotificationReadResponse(BaseModel):
+    """Результат пометки уведомлений прочитанными"""
+    updated: int = Field(..., description="Сколько уведомлений было непрочитанными")
+    unread: int = Field(..., description="Осталось непрочитанных")
+
+
+class UnreadCountResponse(BaseModel):
+    """Количество непрочитанных уведомлений"""
+    unread: int
+
+
 class NotificationResponse(NotificationBase):
     """Схема ответа с уведомлением"""
     id: int
@@ -2,7 +2,7 @@
 Pydantic схемы для заявки
 """
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, Optional
 from datetime import datetime
 
 from app.models.request import RequestStatus, RequestPriority
@@ -74,3 +74,26 @@ class RequestComplete(BaseModel):
 class RequestClose(BaseModel):
     """Схема для закрытия заявки пользователем"""
     status: RequestStatus = Field(..., description="Статус: completed или spam")
+
+
+class RequestMapMarker(BaseModel):
+    """Маркер заявки на публичной карте (без текстов и AI-полей)"""
+    id: int
+    latitude: float
+    longitude: float
+    status: RequestStatus
+    priority: RequestPriority
+    category_id: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+
+class MapCluster(BaseModel):
+    """Кластер заявок на карте (ячейка geohash)"""
+    geohash: str
+    count: int
+    latitude: float  # Центроид заявок ячейки
+    longitude: float
+    statuses: Dict[str, int]  # Количество заявок по статусам
+    dominant_category_id: Optional[int] = None
@@ -0,0 +1,38 @@
+"""
+Pydantic схемы для статистики
+"""
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class TimeseriesGranularity(str, Enum):
+    """Размер интервала временного ряда"""
+    HOUR = "hour"
+    DAY = "day"
+    WEEK = "week"
+
+
+class PriorityBreakdown(str, Enum):
+    """Разрез распределения заявок по приоритетам"""
+    STATUS = "status"
+    CATEGORY = "category"
+
+
+class TimeseriesPoint(BaseModel):
+    """Показатели заявок за один интервал"""
+    bucket: datetime  # Начало интервала (UTC)
+    inflow: int  # Создано заявок
+    completed: int  # Выполнено заявок
+    median_resolution_hours: Optional[float] = None  # Оценка по гистограмме времени выполнения
+    p90_resolution_hours: Optional[float] = None
+
+
+class TimeseriesResponse(BaseModel):
+    """Временной ряд статистики заявок"""
+    granularity: TimeseriesGranularity
+    date_from: datetime
+    date_to: datetime
+    points: List[TimeseriesPoint]
@@ -0,0 +1,196 @@
+"""
+Движок автоматического назначения заявок на сотрудников
+
+Кандидаты оцениваются локально по загрузке, рейтингу, совпадению
+специальности, приоритету и расстоянию до заявки - это микросекунды
+вместо запроса к LLM. LLM (assign_employee_ai) используется только
+как арбитр, когда лучшие оценки отличаются меньше чем на
+ASSIGNMENT_LLM_MARGIN, и может быть полностью отключен.
+"""
+import math
+from typing import NamedTuple, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.openai_service import assign_employee_ai
+
+logger = get_logger()
+
+EARTH_RADIUS_KM = 6371.0
+
+
+class AssignmentContext(NamedTuple):
+    """Данные заявки, влияющие на выбор сотрудника"""
+    description: str
+    category_name: str
+    priority: str  # low / medium / high
+    problem_type: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между точками по формуле гаверсинусов (км)"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class AssignmentEngine:
+    """Базовый движок назначения"""
+
+    name = "base"
+
+    async def select(self, context: AssignmentContext, candidates: list[dict]) -> Optional[int]:
+        """
+        Выбрать сотрудника для заявки.
+
+        Args:
+            context: Данные заявки
+            candidates: Кандидаты в формате get_workload_snapshot()
+
+        Returns:
+            ID выбранного сотрудника или None
+        """
+        raise NotImplementedError
+
+
+class LocalScoringEngine(AssignmentEngine):
+    """Детерминированная локальная оценка кандидатов"""
+
+    name = "local"
+
+    # Множители весов в зависимости от приоритета заявки:
+    # срочные заявки - к сильным сотрудникам, несрочные - равномерно по загрузке
+    PRIORITY_MULTIPLIERS = {
+        "high": {"load": 1.0, "rating": 2.0, "distance": 1.5},
+        "medium": {"load": 1.0, "rating": 1.0, "distance": 1.0},
+        "low": {"load": 1.5, "rating": 0.5, "distance": 1.0},
+    }
+
+    def __init__(
+        self,
+        load_weight: Optional[float] = None,
+        rating_weight: Optional[float] = None,
+        specialty_weight: Optional[float] = None,
+        distance_weight: Optional[float] = None,
+        distance_scale_km: Optional[float] = None,
+        load_cap: Optional[int] = None
+    ):
+        self.load_weight = settings.ASSIGNMENT_WEIGHT_LOAD if load_weight is None else load_weight
+        self.rating_weight = settings.ASSIGNMENT_WEIGHT_RATING if rating_weight is None else rating_weight
+        self.specialty_weight = settings.ASSIGNMENT_WEIGHT_SPECIALTY if specialty_weight is None else specialty_weight
+        self.distance_weight = settings.ASSIGNMENT_WEIGHT_DISTANCE if distance_weight is None else distance_weight
+        self.distance_scale_km = (
+            settings.ASSIGNMENT_DISTANCE_SCALE_KM if distance_scale_km is None else distance_scale_km
+        )
+        self.load_cap = max(settings.ASSIGNMENT_LOAD_CAP if load_cap is None else load_cap, 1)
+
+    def score(self, context: AssignmentContext, candidate: dict) -> float:
+        """Оценка кандидата (больше - лучше)"""
+        multipliers = self.PRIORITY_MULTIPLIERS.get(context.priority, self.PRIORITY_MULTIPLIERS["medium"])
+
+        # Загрузка: 1.0 для свободного сотрудника, линейно до 0 при ASSIGNMENT_LOAD_CAP активных заявок
+        load_score = 1.0 - min(candidate["active_requests"], self.load_cap) / self.load_cap
+
+        # Рейтинг: 0..1 (сотрудник без оценок считается средним)
+        rating = candidate["rating"] or 0.0
+        rating_score = rating / 5.0 if rating > 0 else 0.5
+
+        # Специальность: кандидаты уже отобраны по категории,
+        # точное упоминание специальности в типе проблемы дает бонус
+        specialty_score = 0.5
+        if context.problem_type and candidate.get("specialty"):
+            problem_type = context.problem_type.lower()
+            specialty = candidate["specialty"].lower()
+            if specialty in problem_type or problem_type in specialty:
+                specialty_score = 1.0
+
+        # Расстояние от текущих работ сотрудника до заявки
+        distance_score = 0.5
+        if (
+            context.latitude is not None and context.longitude is not None
+            and candidate.get("latitude") is not None and candidate.get("longitude") is not None
+        ):
+            km = distance_km(
+                context.latitude, context.longitude,
+                float(candidate["latitude"]), float(candidate["longitude"])
+            )
+            distance_score = 1.0 / (1.0 + km / self.distance_scale_km)
+
+        return (
+            self.load_weight * multipliers["load"] * load_score
+            + self.rating_weight * multipliers["rating"] * rating_score
+            + self.specialty_weight * specialty_score
+            + self.distance_weight * multipliers["distance"] * distance_score
+        )
+
+    def rank(self, context: AssignmentContext, candidates: list[dict]) -> list[tuple[float, dict]]:
+        """Кандидаты по убыванию оценки (при равенстве - меньший ID)"""
+        scored = [(self.score(context, candidate), candidate) for candidate in candidates]
+        scored.sort(key=lambda item: (-item[0], item[1]["id"]))
+        return scored
+
+    async def select(self, context: AssignmentContext, candidates: list[dict]) -> Optional[int]:
+        if not candidates:
+            return None
+        return self.rank(context, candidates)[0][1]["id"]
+
+
+class HybridAssignmentEngine(LocalScoringEngine):
+    """
+    Локальная оценка + LLM как арбитр для близких по оценке кандидатов.
+    """
+
+    name = "hybrid"
+
+    def __init__(self, llm_enabled: Optional[bool] = None, llm_margin: Optional[float] = None, **weights):
+        super().__init__(**weights)
+        self.llm_enabled = settings.ASSIGNMENT_LLM_ENABLED if llm_enabled is None else llm_enabled
+        self.llm_margin = settings.ASSIGNMENT_LLM_MARGIN if llm_margin is None else llm_margin
+
+    async def select(self, context: AssignmentContext, candidates: list[dict]) -> Optional[int]:
+        if not candidates:
+            return None
+
+        ranked = self.rank(context, candidates)
+        best_score, best = ranked[0]
+
+        if not self.llm_enabled:
+            return best["id"]
+
+        # Кандидаты, чья оценка в пределах margin от лучшей
+        tied = [candidate for score, candidate in ranked if best_score - score <= self.llm_margin]
+        if len(tied) < 2:
+            return best["id"]
+
+        selected_id = await assign_employee_ai(
+            request_description=context.description,
+            category_name=context.category_name,
+            priority=context.priority,
+            available_employees=tied
+        )
+
+        if selected_id in {candidate["id"] for candidate in tied}:
+            logger.info(f"LLM выбрал сотрудника {selected_id} из {len(tied)} равных кандидатов")
+            return selected_id
+
+        return best["id"]
+
+
+# Доступные движки (ASSIGNMENT_ENGINE)
+ENGINES = {
+    LocalScoringEngine.name: LocalScoringEngine,
+    HybridAssignmentEngine.name: HybridAssignmentEngine,
+}
+
+
+def get_assignment_engine() -> AssignmentEngine:
+    """Движок назначения согласно настройкам"""
+    engine_class = ENGINES.get(settings.ASSIGNMENT_ENGINE)
+    if engine_class is None:
+        logger.warning(f"Неизвестный движок назначения '{settings.ASSIGNMENT_ENGINE}', используем local")
+        engine_class = LocalScoringEngine
+    return engine_class()
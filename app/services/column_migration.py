@@ -1,7 +1,9 @@
 """
-Автоматическая миграция: добавление новых колонок в существующие таблицы
+Автоматическая миграция: добавление новых колонок в существующие таблицы.
+Индексы создаются и удаляются скриптом migrate_indexes.py, при старте
+приложения они только сверяются с моделями (check_indexes).
 """
-from sqlalchemy import text
+from sqlalchemy import text, inspect
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.logging import get_logger
 
@@ -29,6 +31,36 @@ async def migrate_add_columns(session: AsyncSession) -> None:
             "column": "ai_recommendation",
             "definition": "TEXT NULL",
             "after": "ai_analysis"
+        },
+        {
+            "table": "requests",
+            "column": "geohash",
+            "definition": "VARCHAR(12) NULL",
+            "after": "longitude"
+        },
+        {
+            "table": "employees",
+            "column": "rating_sum",
+            "definition": "INT NOT NULL DEFAULT 0",
+            "after": "average_rating"
+        },
+        {
+            "table": "employees",
+            "column": "rating_count",
+            "definition": "INT NOT NULL DEFAULT 0",
+            "after": "rating_sum"
+        },
+        {
+            "table": "users",
+            "column": "unread_notifications",
+            "definition": "INT NOT NULL DEFAULT 0",
+            "after": "role"
+        },
+        {
+            "table": "triage_jobs",
+            "column": "degraded_stages",
+            "definition": "VARCHAR(255) NULL",
+            "after": "last_error"
         }
     ]
     
@@ -65,3 +97,126 @@ async def migrate_add_columns(session: AsyncSession) -> None:
     
     logger.info("✅ Миграция колонок завершена")
 
+
+# Индексы, удаленные из моделей как избыточные: составные индексы
+# с тем же префиксом колонок или первичный ключ уже обслуживают эти запросы
+OBSOLETE_INDEXES = {
+    "notifications": ["ix_notifications_user_id"],
+}
+
+
+def _missing_indexes(sync_conn) -> list:
+    """Индексы моделей, которых нет в существующих таблицах"""
+    from app.core.database import Base
+
+    inspector = inspect(sync_conn)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def _obsolete_indexes(sync_conn) -> list[tuple[str, str]]:
+    """
+    Избыточные индексы существующих таблиц, которых больше нет в моделях:
+    OBSOLETE_INDEXES и ix_<таблица>_id, дублировавшие первичный ключ.
+
+    Returns:
+        Пары (таблица, индекс)
+    """
+    from app.core.database import Base
+
+    inspector = inspect(sync_conn)
+    obsolete = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        declared = {index.name for index in table.indexes}
+        names = set(OBSOLETE_INDEXES.get(table.name, [])) | {f"ix_{table.name}_id"}
+        obsolete.extend(
+            (table.name, index["name"])
+            for index in inspector.get_indexes(table.name)
+            if index["name"] in names and index["name"] not in declared
+        )
+    return obsolete
+
+
+async def migrate_add_indexes(session: AsyncSession) -> list[str]:
+    """
+    Создает индексы, объявленные в моделях, которых еще нет в существующих таблицах
+    (create_all добавляет индексы только при создании таблицы).
+    Вызывается скриптом migrate_indexes.py. Безопасна для многократного запуска.
+
+    Returns:
+        Имена созданных индексов
+    """
+    def create_missing_indexes(sync_conn) -> list[str]:
+        created = []
+        for index in _missing_indexes(sync_conn):
+            logger.info(f"Создание индекса {index.name}...")
+            index.create(sync_conn)
+            created.append(index.name)
+        return created
+
+    connection = await session.connection()
+    created = await connection.run_sync(create_missing_indexes)
+    await session.commit()
+    for index_name in created:
+        logger.info(f"✓ Добавлен индекс {index_name}")
+    return created
+
+
+async def migrate_drop_indexes(session: AsyncSession) -> list[str]:
+    """
+    Удаляет из существующих таблиц избыточные индексы (_obsolete_indexes).
+    Вызывается скриптом migrate_indexes.py после migrate_add_indexes, чтобы
+    внешним ключам MySQL оставался индекс. Безопасна для многократного запуска.
+
+    Returns:
+        Имена удаленных индексов
+    """
+    def drop_obsolete_indexes(sync_conn) -> list[str]:
+        dropped = []
+        for table_name, index_name in _obsolete_indexes(sync_conn):
+            logger.info(f"Удаление индекса {index_name}...")
+            if sync_conn.dialect.name == "sqlite":
+                sync_conn.execute(text(f"DROP INDEX {index_name}"))
+            else:
+                sync_conn.execute(text(f"DROP INDEX {index_name} ON {table_name}"))
+            dropped.append(index_name)
+        return dropped
+
+    connection = await session.connection()
+    dropped = await connection.run_sync(drop_obsolete_indexes)
+    await session.commit()
+    for index_name in dropped:
+        logger.info(f"✓ Удален индекс {index_name}")
+    return dropped
+
+
+async def check_indexes(session: AsyncSession) -> bool:
+    """
+    Проверка при старте: индексы таблиц совпадают с моделями.
+    Схему не меняет - при расхождении только предупреждает
+    (DDL на рабочих таблицах выполняет migrate_indexes.py).
+
+    Returns:
+        True, если индексы совпадают с моделями
+    """
+    def index_changes(sync_conn) -> tuple[list[str], list[str]]:
+        missing = [index.name for index in _missing_indexes(sync_conn)]
+        obsolete = [index_name for _, index_name in _obsolete_indexes(sync_conn)]
+        return missing, obsolete
+
+    connection = await session.connection()
+    missing, obsolete = await connection.run_sync(index_changes)
+    await session.rollback()
+
+    if missing:
+        logger.warning(f"Нет индексов: {', '.join(missing)} (создать: python migrate_indexes.py)")
+    if obsolete:
+        logger.warning(f"Избыточные индексы: {', '.join(obsolete)} (удалить: python migrate_indexes.py)")
+    return not missing and not obsolete
@@ -1,20 +1,28 @@
 """
 Сервис для работы с файлами
 """
+import asyncio
+import multiprocessing
 import os
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, TypeVar
+
 import aiofiles
 from fastapi import UploadFile, HTTPException
-from PIL import Image
-from io import BytesIO
 
 from app.core.config import settings
 from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.services.image_processing import optimize_image, timed_call
 
 logger = get_logger()
 
+T = TypeVar("T")
+
 ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp"}
-MAX_IMAGE_SIZE = (2048, 2048)  # Максимальный размер изображения
 
 
 def allowed_file(filename: str) -> bool:
@@ -22,10 +30,105 @@ def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+class ImageProcessor:
+    """
+    Pillow (декодирование, уменьшение, сжатие) в пуле процессов.
+
+    Обработка фото с телефона занимает сотни миллисекунд CPU и держит
+    GIL, поэтому выполняется не в потоках, а в отдельных процессах.
+    Одновременно обрабатывается не больше IMAGE_PROCESS_WORKERS
+    изображений, остальные ждут в очереди пула. Процессы запускаются
+    через spawn: fork процесса с потоками (aiosqlite, bcrypt) небезопасен.
+
+    Метрики (GET /metrics): image_processor.in_flight - изображения в пуле
+    и в очереди к нему, image_processor.queue_wait_ms - суммарное ожидание
+    свободного процесса, image_processor.process_ms - суммарное время
+    обработки, image_processor.calls - число вызовов.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        self._in_flight += 1
+        metrics.set("image_processor.in_flight", self._in_flight)
+        metrics.increment("image_processor.calls")
+        submitted_at = time.time()
+        try:
+            started_at, duration, result = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), timed_call, func, *args
+            )
+            metrics.increment("image_processor.queue_wait_ms", int(max(started_at - submitted_at, 0) * 1000))
+            metrics.increment("image_processor.process_ms", int(duration * 1000))
+            return result
+        except BrokenProcessPool:
+            # Процесс пула упал (например, нехватка памяти) - следующий вызов создаст новый пул
+            self.shutdown()
+            raise
+        finally:
+            self._in_flight -= 1
+            metrics.set("image_processor.in_flight", self._in_flight)
+
+    async def optimize(self, source_path: str, target_path: str) -> Optional[tuple[int, int]]:
+        """Уменьшение и пересжатие изображения (см. image_processing.optimize_image)"""
+        return await self._run(optimize_image, source_path, target_path)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+image_processor = ImageProcessor(settings.IMAGE_PROCESS_WORKERS)
+
+
+async def _stream_to_file(upload_file: UploadFile, path: str) -> int:
+    """
+    Запись загруженного файла на диск частями.
+
+    Returns:
+        Количество записанных байт
+
+    Raises:
+        HTTPException: 413, как только файл превысил MAX_FILE_SIZE
+    """
+    size = 0
+    async with aiofiles.open(path, "wb") as f:
+        while True:
+            chunk = await upload_file.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > settings.MAX_FILE_SIZE:
+                raise _too_large()
+            await f.write(chunk)
+    return size
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Размер файла превышает максимально допустимый ({settings.MAX_FILE_SIZE} байт)"
+    )
+
+
 async def save_upload_file(upload_file: UploadFile, subfolder: str = "general") -> str:
     """
     Сохранение загруженного файла
 
+    Файл пишется на диск частями (в памяти не больше UPLOAD_CHUNK_SIZE),
+    изображение обрабатывается в пуле процессов (image_processor).
+
     Args:
         upload_file: Загруженный файл
         subfolder: Подпапка для сохранения (requests, employees, solutions)
@@ -33,14 +136,11 @@ async def save_upload_file(upload_file: UploadFile, subfolder: str = "general")
     Returns:
         Относительный путь к сохраненному файлу
     """
+    upload_path = None
     try:
-        # Проверка размера файла
-        content = await upload_file.read()
-        if len(content) > settings.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"Размер файла превышает максимально допустимый ({settings.MAX_FILE_SIZE} байт)"
-            )
+        # Размер известен заранее, если multipart-парсер уже его посчитал
+        if upload_file.size is not None and upload_file.size > settings.MAX_FILE_SIZE:
+            raise _too_large()
 
         # Проверка расширения
         if not allowed_file(upload_file.filename):
@@ -59,27 +159,19 @@ async def save_upload_file(upload_file: UploadFile, subfolder: str = "general")
 
         file_path = os.path.join(upload_dir, unique_filename)
 
+        # Проверка размера при записи: чтение прекращается на превышении лимита
+        upload_path = f"{file_path}.upload"
+        await _stream_to_file(upload_file, upload_path)
+
         # Оптимизация изображения
         try:
-            image = Image.open(BytesIO(content))
-
-            # Изменение размера если изображение слишком большое
-            if image.size[0] > MAX_IMAGE_SIZE[0] or image.size[1] > MAX_IMAGE_SIZE[1]:
-                image.thumbnail(MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
-                logger.info(f"Изображение изменено до {image.size}")
-
-            # Конвертация в RGB если необходимо
-            if image.mode in ("RGBA", "P"):
-                image = image.convert("RGB")
-
-            # Сохранение оптимизированного изображения
-            image.save(file_path, quality=85, optimize=True)
-
+            resized = await image_processor.optimize(upload_path, file_path)
+            if resized:
+                logger.info(f"Изображение изменено до {resized}")
         except Exception as e:
             logger.warning(f"Не удалось оптимизировать изображение: {e}, сохраняем как есть")
             # Сохранение оригинального файла
-            async with aiofiles.open(file_path, "wb") as f:
-                await f.write(content)
+            os.replace(upload_path, file_path)
 
         # Возвращаем относительный путь
         relative_path = os.path.join(subfolder, unique_filename)
@@ -93,6 +185,8 @@ async def save_upload_file(upload_file: UploadFile, subfolder: str = "general")
         logger.error(f"Ошибка при сохранении файла: {e}")
         raise HTTPException(status_code=500, detail="Ошибка при сохранении файла")
     finally:
+        if upload_path and os.path.exists(upload_path):
+            os.remove(upload_path)
         await upload_file.seek(0)  # Сбрасываем позицию чтения файла
 
 
@@ -0,0 +1,331 @@
+"""
+Геопространственные утилиты для карты заявок
+
+Каждая заявка с координатами хранит geohash (индексируемая строка),
+поэтому выборка по прямоугольнику видимой области сводится к нескольким
+диапазонам индекса по префиксам geohash. Этот путь работает на
+любой БД (в том числе SQLite в тестах).
+
+На MySQL дополнительно используется SPATIAL индекс по вычисляемой колонке
+location POINT SRID 0 (выборка через MBRContains). Колонку и индекс, а
+также geohash заявок, созданных до появления колонки, создает скрипт
+migrate_spatial_index.py: добавление STORED колонки перестраивает всю
+таблицу requests и не выполняется при старте приложения. При старте
+проверяется только, что оптимизатор может использовать индекс.
+"""
+import math
+from typing import NamedTuple, Optional
+
+from sqlalchemy import and_, text, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logging import get_logger
+from app.models.request import Request
+
+logger = get_logger()
+
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9  # ~5 м, точность хранимого geohash
+MAX_COVER_CELLS = 32  # Максимум ячеек (диапазонов индекса) на один запрос
+
+SPATIAL_INDEX_NAME = "ix_requests_location"
+# Координаты хранятся в декартовой SRID 0 (x - долгота, y - широта).
+# Без атрибута SRID у колонки оптимизатор MySQL не использует SPATIAL индекс
+SPATIAL_SRID = 0
+
+# Флаг выставляется при старте, если на MySQL SPATIAL индекс пригоден для выборки
+spatial_index_available = False
+
+
+class BoundingBox(NamedTuple):
+    """Прямоугольник видимой области карты"""
+    min_lon: float
+    min_lat: float
+    max_lon: float
+    max_lat: float
+
+
+def parse_bbox(value: str) -> BoundingBox:
+    """
+    Разбор bbox из строки "min_lon,min_lat,max_lon,max_lat" (порядок GeoJSON).
+
+    Raises:
+        ValueError: если строка некорректна
+    """
+    parts = [float(part) for part in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox должен содержать 4 числа: min_lon,min_lat,max_lon,max_lat")
+
+    bbox = BoundingBox(*parts)
+    if not (-180 <= bbox.min_lon <= bbox.max_lon <= 180 and -90 <= bbox.min_lat <= bbox.max_lat <= 90):
+        raise ValueError("bbox вне допустимых границ или min > max")
+    return bbox
+
+
+def _bits(precision: int) -> tuple[int, int]:
+    """Количество бит долготы и широты для geohash заданной длины"""
+    total = precision * 5
+    return (total + 1) // 2, total // 2
+
+
+def _cell_index(lat: float, lon: float, precision: int) -> tuple[int, int]:
+    """Целочисленные координаты ячейки geohash"""
+    lon_bits, lat_bits = _bits(precision)
+    x = int((lon + 180.0) / 360.0 * (1 << lon_bits))
+    y = int((lat + 90.0) / 180.0 * (1 << lat_bits))
+    return min(x, (1 << lon_bits) - 1), min(y, (1 << lat_bits) - 1)
+
+
+def _encode_cell(x: int, y: int, precision: int) -> str:
+    """Geohash по целочисленным координатам ячейки (биты долготы и широты чередуются)"""
+    lon_bits, lat_bits = _bits(precision)
+    value = 0
+    for i in range(precision * 5):
+        if i % 2 == 0:
+            lon_bits -= 1
+            bit = (x >> lon_bits) & 1
+        else:
+            lat_bits -= 1
+            bit = (y >> lat_bits) & 1
+        value = (value << 1) | bit
+
+    chars = []
+    for _ in range(precision):
+        chars.append(GEOHASH_BASE32[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Geohash точки"""
+    x, y = _cell_index(latitude, longitude, precision)
+    return _encode_cell(x, y, precision)
+
+
+def geohash_for(latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+    """Geohash для сохранения в заявке (None если координат нет)"""
+    if latitude is None or longitude is None:
+        return None
+    return encode_geohash(latitude, longitude)
+
+
+def zoom_to_precision(zoom: int) -> int:
+    """
+    Длина geohash, ячейка которого сопоставима с тайлом карты на данном zoom
+    (zoom 0 - весь мир, ~zoom 17 - здание).
+    """
+    # Ширина тайла ~ 360 / 2^zoom градусов, ячейки geohash делаем в ~4 раза мельче
+    return max(1, min(GEOHASH_PRECISION, math.ceil((2 * zoom + 4) / 5)))
+
+
+def _cover_size(bbox: BoundingBox, precision: int) -> int:
+    x1, y1 = _cell_index(bbox.min_lat, bbox.min_lon, precision)
+    x2, y2 = _cell_index(bbox.max_lat, bbox.max_lon, precision)
+    return (x2 - x1 + 1) * (y2 - y1 + 1)
+
+
+def bbox_cover(bbox: BoundingBox, zoom: Optional[int] = None, max_cells: int = MAX_COVER_CELLS) -> list[str]:
+    """
+    Набор префиксов geohash, покрывающих bbox.
+
+    Берется самая точная длина (не точнее чем позволяет zoom), при которой
+    покрытие укладывается в max_cells ячеек.
+    """
+    precision = zoom_to_precision(zoom) if zoom is not None else GEOHASH_PRECISION
+    while precision > 1 and _cover_size(bbox, precision) > max_cells:
+        precision -= 1
+
+    x1, y1 = _cell_index(bbox.min_lat, bbox.min_lon, precision)
+    x2, y2 = _cell_index(bbox.max_lat, bbox.max_lon, precision)
+    return [
+        _encode_cell(x, y, precision)
+        for x in range(x1, x2 + 1)
+        for y in range(y1, y2 + 1)
+    ]
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """
+    Верхняя (исключающая) граница строк geohash с данным префиксом
+    (None - префикс из одних "z", границы нет).
+
+    Последний символ заменяется следующим символом алфавита geohash
+    (с переносом через "z"). Граница состоит только из цифр и букв, поэтому
+    диапазон верен при любой сортировке БД, в том числе utf8mb4_unicode_ci,
+    где знаки препинания идут раньше цифр.
+    """
+    prefix = prefix.rstrip(GEOHASH_BASE32[-1])
+    if not prefix:
+        return None
+    return prefix[:-1] + GEOHASH_BASE32[GEOHASH_BASE32.index(prefix[-1]) + 1]
+
+
+def geohash_prefix_condition(prefix: str):
+    """Условие "geohash начинается с prefix" диапазоном индекса (не LIKE - индекс используется на любой БД)"""
+    upper_bound = prefix_upper_bound(prefix)
+    if upper_bound is None:
+        return Request.geohash >= prefix
+    return and_(Request.geohash >= prefix, Request.geohash < upper_bound)
+
+
+def bbox_wkt(bbox: BoundingBox) -> str:
+    """Прямоугольник в формате WKT (порядок координат: долгота, широта)"""
+    return (
+        f"POLYGON(({bbox.min_lon} {bbox.min_lat}, {bbox.max_lon} {bbox.min_lat}, "
+        f"{bbox.max_lon} {bbox.max_lat}, {bbox.min_lon} {bbox.max_lat}, "
+        f"{bbox.min_lon} {bbox.min_lat}))"
+    )
+
+
+async def _location_column_srid(session: AsyncSession) -> tuple[bool, Optional[int]]:
+    """(есть ли колонка requests.location, ее SRID)"""
+    result = await session.execute(text("""
+        SELECT srs_id FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+        AND table_name = 'requests'
+        AND column_name = 'location'
+    """))
+    row = result.first()
+    return (row is not None, row[0] if row is not None else None)
+
+
+async def _spatial_index_exists(session: AsyncSession) -> bool:
+    result = await session.execute(text("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE()
+        AND table_name = 'requests'
+        AND index_name = :index_name
+    """), {"index_name": SPATIAL_INDEX_NAME})
+    return result.scalar() > 0
+
+
+async def spatial_index_usable(session: AsyncSession) -> bool:
+    """
+    Может ли оптимизатор MySQL использовать SPATIAL индекс для выборки карты.
+
+    Проверяется по EXPLAIN запроса той же формы, что в /requests/map:
+    индекс должен попасть в possible_keys (на колонке без SRID MySQL
+    его не рассматривает, warning 3674).
+    """
+    if session.bind.dialect.name != "mysql":
+        return False
+
+    exists, _ = await _location_column_srid(session)
+    if not exists or not await _spatial_index_exists(session):
+        return False
+
+    result = await session.execute(
+        text(f"""
+            EXPLAIN SELECT id FROM requests
+            WHERE MBRContains(ST_GeomFromText(:bbox_wkt, {SPATIAL_SRID}), location)
+        """),
+        {"bbox_wkt": bbox_wkt(BoundingBox(0.0, 0.0, 1.0, 1.0))}
+    )
+    for row in result.mappings():
+        possible_keys = row.get("possible_keys") or ""
+        if SPATIAL_INDEX_NAME in possible_keys.split(","):
+            return True
+    return False
+
+
+async def create_spatial_index(session: AsyncSession) -> bool:
+    """
+    Колонка location POINT SRID 0 и SPATIAL индекс на MySQL (скрипт migrate_spatial_index.py).
+
+    Добавление STORED колонки копирует таблицу requests и держит
+    metadata lock, поэтому выполняется отдельно от старта приложения.
+    Колонка без SRID (созданная прежней версией) пересоздается.
+
+    Returns:
+        True, если индекс после миграции используется оптимизатором
+    """
+    if session.bind.dialect.name != "mysql":
+        return False
+
+    exists, srid = await _location_column_srid(session)
+    if exists and srid != SPATIAL_SRID:
+        if await _spatial_index_exists(session):
+            await session.execute(text(f"DROP INDEX {SPATIAL_INDEX_NAME} ON requests"))
+        await session.execute(text("ALTER TABLE requests DROP COLUMN location"))
+        logger.info("Удалена колонка requests.location без SRID")
+        exists = False
+
+    if not exists:
+        # Пространственный индекс требует NOT NULL, поэтому заявки без координат получают (0, 0)
+        await session.execute(text(f"""
+            ALTER TABLE requests ADD COLUMN location POINT SRID {SPATIAL_SRID}
+            AS (ST_SRID(POINT(COALESCE(longitude, 0), COALESCE(latitude, 0)), {SPATIAL_SRID})) STORED NOT NULL
+        """))
+        logger.info("✓ Добавлена колонка requests.location")
+
+    if not await _spatial_index_exists(session):
+        await session.execute(text(f"CREATE SPATIAL INDEX {SPATIAL_INDEX_NAME} ON requests (location)"))
+        logger.info("✓ Добавлен SPATIAL индекс requests.location")
+
+    await session.commit()
+    return await spatial_index_usable(session)
+
+
+async def backfill_geohash(session: AsyncSession, batch_size: int = 1000) -> int:
+    """
+    Заполнение geohash у заявок, созданных до появления колонки (скрипт migrate_spatial_index.py).
+
+    Заявки читаются пачками по id, каждая пачка обновляется одним
+    executemany UPDATE по первичному ключу и фиксируется отдельно,
+    чтобы не держать долгую транзакцию.
+
+    Returns:
+        Количество обновленных заявок
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        result = await session.execute(
+            select(Request.id, Request.latitude, Request.longitude)
+            .where(
+                Request.id > last_id,
+                Request.geohash.is_(None),
+                Request.latitude.isnot(None),
+                Request.longitude.isnot(None)
+            )
+            .order_by(Request.id)
+            .limit(batch_size)
+        )
+        rows = result.all()
+        if not rows:
+            return updated
+
+        await session.execute(update(Request), [
+            {"id": request_id, "geohash": encode_geohash(latitude, longitude)}
+            for request_id, latitude, longitude in rows
+        ])
+        await session.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+        logger.info(f"Заполнен geohash: {updated} заявок")
+
+
+async def check_spatial_index(session: AsyncSession) -> None:
+    """
+    Проверка при старте: на MySQL SPATIAL индекс (migrate_spatial_index.py)
+    используется оптимизатором, иначе карта работает через geohash.
+    Схему и данные не меняет.
+    """
+    global spatial_index_available
+
+    if session.bind.dialect.name != "mysql":
+        return
+
+    try:
+        spatial_index_available = await spatial_index_usable(session)
+    except Exception as e:
+        await session.rollback()
+        spatial_index_available = False
+        logger.warning(f"Проверка SPATIAL индекса не удалась: {str(e)[:100]}")
+        return
+
+    if not spatial_index_available:
+        logger.warning(
+            "SPATIAL индекс requests.location отсутствует или не используется оптимизатором - "
+            "карта работает через geohash (создать индекс: python migrate_spatial_index.py)"
+        )
@@ -0,0 +1,64 @@
+"""
+Обработка изображений в дочерних процессах
+
+Модуль импортирует только Pillow: он загружается в каждый процесс пула
+(см. file_service.ImageProcessor), и лишние импорты замедлили бы их старт.
+"""
+import os
+import time
+from typing import Any, Callable, Optional
+
+from PIL import Image
+
+MAX_IMAGE_SIZE = (2048, 2048)  # Максимальный размер изображения
+
+
+def timed_call(func: Callable[..., Any], *args) -> tuple[float, float, Any]:
+    """
+    Вызов в процессе пула с замером.
+
+    Returns:
+        (время начала по часам системы, длительность в секундах, результат)
+    """
+    started_at = time.time()
+    started = time.perf_counter()
+    result = func(*args)
+    return started_at, time.perf_counter() - started, result
+
+
+def optimize_image(source_path: str, target_path: str) -> Optional[tuple[int, int]]:
+    """
+    Уменьшение и пересжатие изображения.
+
+    Args:
+        source_path: Загруженный файл
+        target_path: Куда сохранить результат (формат - по расширению)
+
+    Returns:
+        Новый размер, если изображение уменьшалось, иначе None
+
+    Raises:
+        Exception: файл не является изображением или не сохраняется
+            в формате расширения
+    """
+    with Image.open(source_path) as image:
+        resized = None
+
+        # Изменение размера если изображение слишком большое
+        if image.size[0] > MAX_IMAGE_SIZE[0] or image.size[1] > MAX_IMAGE_SIZE[1]:
+            image.thumbnail(MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
+            resized = image.size
+
+        # Конвертация в RGB если необходимо
+        if image.mode in ("RGBA", "P"):
+            image = image.convert("RGB")
+
+        # Сохранение оптимизированного изображения
+        try:
+            image.save(target_path, quality=85, optimize=True)
+        except Exception:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            raise
+
+    return resized
@@ -0,0 +1,91 @@
+"""
+Кэш ответов публичных эндпоинтов карты
+
+Ответ (сериализованный JSON и его ETag) хранится в памяти процесса
+MAP_CACHE_TTL_SECONDS секунд. Ключ включает "версию карты" - счетчик,
+который увеличивается при каждом изменении заявки, влияющем на карту
+(создание, удаление, смена статуса, приоритета, категории, координат),
+поэтому после изменения в этом процессе устаревший ответ не отдается.
+Изменения из других процессов видны не позже чем через TTL.
+
+ETag - хэш тела ответа, поэтому одинаков во всех процессах и клиенты
+с актуальными данными получают 304.
+"""
+import hashlib
+import json
+import time
+from typing import Awaitable, Callable, Hashable, NamedTuple, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+from app.services.request_events import RequestState, subscribe
+
+
+class CachedBody(NamedTuple):
+    """Сериализованный ответ"""
+    body: bytes
+    etag: str
+
+
+def _map_fields(state: Optional[RequestState]) -> Optional[tuple]:
+    """Поля заявки, отображаемые на карте"""
+    if state is None:
+        return None
+    return state.status, state.priority, state.category_id, state.latitude, state.longitude
+
+
+class MapCache:
+    """TTL-кэш ответов карты, сбрасываемый по версии карты"""
+
+    def __init__(self, max_entries: int = 256):
+        self.version = 0
+        self.max_entries = max_entries
+        self._entries: dict[tuple, tuple[float, CachedBody]] = {}
+
+    def apply_change(self, before: Optional[RequestState], after: Optional[RequestState]) -> None:
+        """Обработчик события изменения заявки"""
+        if _map_fields(before) != _map_fields(after):
+            self.version += 1
+            self._entries.clear()
+
+    async def get_or_build(self, key: Hashable, build: Callable[[], Awaitable[object]]) -> CachedBody:
+        """
+        Ответ из кэша или построенный заново.
+
+        Args:
+            key: Ключ запроса (параметры эндпоинта)
+            build: Корутина, возвращающая данные ответа
+        """
+        cache_key = (self.version, key)
+        now = time.monotonic()
+
+        entry = self._entries.get(cache_key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        version = self.version
+        data = await build()
+        body = json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")).encode()
+        cached = CachedBody(body=body, etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+        # Пока строился ответ, карта могла измениться - такой ответ не кэшируем
+        if version == self.version:
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[cache_key] = (now + settings.MAP_CACHE_TTL_SECONDS, cached)
+
+        return cached
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка заголовка If-None-Match (слабое сравнение, список и *)"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in {value.removeprefix("W/") for value in candidates}
+
+
+# Глобальный экземпляр кэша процесса
+map_cache = MapCache()
+subscribe(map_cache.apply_change)
@@ -0,0 +1,184 @@
+"""
+Кластеры заявок для карты
+
+Для каждой длины geohash (1..GEOHASH_PRECISION) процесс хранит агрегаты
+по ячейкам: количество активных заявок, сумму координат (для центроида),
+разбивку по статусам и по категориям. Уровень масштаба карты отображается
+на длину geohash (zoom_to_precision), поэтому ответ на запрос отдаленной
+карты - это чтение готовых ячеек, без выборки и сериализации строк.
+
+Агрегаты обновляются из событий изменения заявок (request_events) и
+периодически перестраиваются из БД, чтобы учесть изменения, сделанные
+другими процессами.
+"""
+import asyncio
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import select, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logging import get_logger
+from app.models.request import Request, RequestStatus
+from app.services.geo_service import (
+    GEOHASH_PRECISION, BoundingBox, encode_geohash, zoom_to_precision
+)
+from app.services.request_events import RequestState, subscribe
+
+logger = get_logger()
+
+# Статусы заявок, отображаемых на карте
+MAP_STATUSES = (RequestStatus.PENDING, RequestStatus.ASSIGNED, RequestStatus.IN_PROGRESS)
+
+
+class ClusterCell:
+    """Агрегат заявок одной ячейки geohash"""
+
+    __slots__ = ("count", "lat_sum", "lon_sum", "statuses", "categories")
+
+    def __init__(self):
+        self.count = 0
+        self.lat_sum = 0.0
+        self.lon_sum = 0.0
+        self.statuses: Counter = Counter()
+        self.categories: Counter = Counter()
+
+    def add(self, member: tuple, sign: int) -> None:
+        latitude, longitude, status, category_id = member
+        self.count += sign
+        self.lat_sum += sign * latitude
+        self.lon_sum += sign * longitude
+        self.statuses[status.value] += sign
+        self.categories[category_id] += sign
+        if self.statuses[status.value] <= 0:
+            del self.statuses[status.value]
+        if self.categories[category_id] <= 0:
+            del self.categories[category_id]
+
+    def to_dict(self, geohash: str) -> dict:
+        return {
+            "geohash": geohash,
+            "count": self.count,
+            "latitude": self.lat_sum / self.count,
+            "longitude": self.lon_sum / self.count,
+            "statuses": dict(self.statuses),
+            "dominant_category_id": self.categories.most_common(1)[0][0] if self.categories else None,
+        }
+
+
+class MapClusterIndex:
+    """Агрегаты активных заявок по ячейкам geohash всех длин"""
+
+    def __init__(self):
+        # request_id -> (latitude, longitude, status, category_id)
+        self._members: dict[int, tuple] = {}
+        # geohash -> ячейка; ключи разной длины не пересекаются
+        self._cells: dict[str, ClusterCell] = {}
+        self.ready = False
+
+    def load(self, rows: list[tuple]) -> None:
+        """Перестроить индекс по строкам (id, latitude, longitude, status, category_id)"""
+        self._members = {}
+        self._cells = {}
+        for request_id, latitude, longitude, status, category_id in rows:
+            self._add(request_id, (latitude, longitude, status, category_id))
+        self.ready = True
+
+    def _apply(self, member: tuple, sign: int) -> None:
+        geohash = encode_geohash(member[0], member[1])
+        for precision in range(1, GEOHASH_PRECISION + 1):
+            key = geohash[:precision]
+            cell = self._cells.get(key)
+            if cell is None:
+                cell = self._cells[key] = ClusterCell()
+            cell.add(member, sign)
+            if cell.count <= 0:
+                del self._cells[key]
+
+    def _add(self, request_id: int, member: tuple) -> None:
+        self._members[request_id] = member
+        self._apply(member, +1)
+
+    def _remove(self, request_id: int) -> None:
+        member = self._members.pop(request_id, None)
+        if member is not None:
+            self._apply(member, -1)
+
+    def apply_change(self, before: Optional[RequestState], after: Optional[RequestState]) -> None:
+        """Обработчик события изменения заявки"""
+        if before is not None:
+            self._remove(before.id)
+        if (
+            after is not None
+            and after.status in MAP_STATUSES
+            and after.latitude is not None
+            and after.longitude is not None
+        ):
+            self._add(after.id, (after.latitude, after.longitude, after.status, after.category_id))
+
+    def clusters(self, zoom: int, bbox: Optional[BoundingBox] = None) -> list[dict]:
+        """
+        Кластеры для уровня масштаба.
+
+        Args:
+            zoom: Уровень масштаба карты
+            bbox: Видимая область (кластеры с центроидом вне области отбрасываются)
+        """
+        precision = zoom_to_precision(zoom)
+        result = []
+        for geohash, cell in self._cells.items():
+            if len(geohash) != precision:
+                continue
+            cluster = cell.to_dict(geohash)
+            if bbox is not None and not (
+                bbox.min_lat <= cluster["latitude"] <= bbox.max_lat
+                and bbox.min_lon <= cluster["longitude"] <= bbox.max_lon
+            ):
+                continue
+            result.append(cluster)
+        result.sort(key=lambda cluster: -cluster["count"])
+        return result
+
+
+# Глобальный экземпляр индекса процесса
+map_cluster_index = MapClusterIndex()
+subscribe(map_cluster_index.apply_change)
+
+
+async def load_map_rows(db: AsyncSession) -> list[tuple]:
+    """Активные заявки с координатами: (id, latitude, longitude, status, category_id)"""
+    result = await db.execute(
+        select(Request.id, Request.latitude, Request.longitude, Request.status, Request.category_id)
+        .where(
+            and_(
+                Request.status.in_(MAP_STATUSES),
+                Request.latitude.isnot(None),
+                Request.longitude.isnot(None)
+            )
+        )
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def rebuild(db: AsyncSession) -> None:
+    """Перестроить индекс кластеров по БД"""
+    map_cluster_index.load(await load_map_rows(db))
+
+
+async def run_map_cluster_rebuilder(stop_event: Optional[asyncio.Event] = None) -> None:
+    """Периодическая перестройка индекса кластеров по БД"""
+    stop_event = stop_event or asyncio.Event()
+
+    while not stop_event.is_set():
+        try:
+            async with AsyncSessionLocal() as session:
+                await rebuild(session)
+        except Exception as e:
+            logger.error(f"Ошибка перестройки кластеров карты: {e}")
+
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=settings.MAP_CLUSTER_REBUILD_SECONDS)
+        except asyncio.TimeoutError:
+            pass
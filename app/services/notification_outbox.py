@@ -0,0 +1,219 @@
+"""
+Доставка уведомлений из outbox
+
+Записи notification_outbox пишутся в одной транзакции с уведомлениями
+(см. notification_service). Relay забирает готовые записи и передает их
+подписчикам subscribe_outbox() - каналам доставки за пределы БД.
+Доставленные записи удаляются. При ошибке доставка повторяется с
+экспоненциальной задержкой, после NOTIFICATION_OUTBOX_MAX_ATTEMPTS
+запись остается в статусе failed.
+
+Записи захватываются условным UPDATE с меткой прохода, поэтому несколько
+процессов (gunicorn workers) не доставят одну запись дважды.
+"""
+import asyncio
+import json
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+from sqlalchemy import select, update, delete, and_, or_
+from sqlalchemy.sql import ColumnElement
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logging import get_logger
+from app.models.notification import NotificationOutbox, NotificationOutboxStatus, NotificationType
+
+logger = get_logger()
+
+
+class OutboxMessage(NamedTuple):
+    """Уведомление для доставки (одно сообщение нескольким получателям)"""
+    id: int
+    user_ids: list[int]
+    title: str
+    message: str
+    type: NotificationType
+    created_at: datetime
+
+
+OutboxHandler = Callable[[list[OutboxMessage]], Awaitable[None]]
+
+_handlers: list[OutboxHandler] = []
+
+# Событие для пробуждения relay сразу после commit уведомлений
+_wakeup = asyncio.Event()
+
+
+def subscribe_outbox(handler: OutboxHandler) -> OutboxHandler:
+    """
+    Подписаться на доставку уведомлений (можно использовать как декоратор).
+    Ошибка подписчика откладывает всю пачку на повтор, поэтому
+    обработчик должен допускать повторную доставку.
+    """
+    _handlers.append(handler)
+    return handler
+
+
+def wake_outbox_relay() -> None:
+    """Разбудить relay (вызывается после commit уведомлений)"""
+    _wakeup.set()
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    """Экспоненциальная задержка перед повтором"""
+    return timedelta(seconds=settings.NOTIFICATION_OUTBOX_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)))
+
+
+def _due_condition(now: datetime) -> ColumnElement:
+    """Записи, готовые к доставке, и брошенные упавшим процессом"""
+    stale_before = now - timedelta(seconds=settings.NOTIFICATION_OUTBOX_LOCK_TIMEOUT_SECONDS)
+    return or_(
+        and_(NotificationOutbox.status == NotificationOutboxStatus.PENDING, NotificationOutbox.next_run_at <= now),
+        and_(NotificationOutbox.status == NotificationOutboxStatus.RUNNING, NotificationOutbox.locked_at < stale_before)
+    )
+
+
+async def _claim_due_entries(token: str, limit: int) -> list[tuple[OutboxMessage, int]]:
+    """
+    Забрать готовые записи под меткой token.
+
+    Returns:
+        Пары (сообщение, номер попытки)
+    """
+    now = datetime.utcnow()
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(NotificationOutbox.id)
+            .where(_due_condition(now))
+            .order_by(NotificationOutbox.next_run_at)
+            .limit(limit)
+        )
+        entry_ids = result.scalars().all()
+        if not entry_ids:
+            return []
+
+        # Условие повторяется в UPDATE: запись, которую успел захватить
+        # другой процесс, уже не подходит под него
+        await session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(entry_ids), _due_condition(now))
+            .values(
+                status=NotificationOutboxStatus.RUNNING,
+                locked_by=token,
+                locked_at=now,
+                attempts=NotificationOutbox.attempts + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        result = await session.execute(
+            select(NotificationOutbox)
+            .where(NotificationOutbox.locked_by == token)
+            .order_by(NotificationOutbox.id)
+        )
+        claimed = [
+            (
+                OutboxMessage(
+                    id=entry.id,
+                    user_ids=json.loads(entry.user_ids),
+                    title=entry.title,
+                    message=entry.message,
+                    type=entry.type,
+                    created_at=entry.created_at
+                ),
+                entry.attempts
+            )
+            for entry in result.scalars().all()
+        ]
+        await session.commit()
+
+    return claimed
+
+
+async def _record_failure(token: str, claimed: list[tuple[OutboxMessage, int]], error: Exception) -> None:
+    """Вернуть записи пачки в очередь с задержкой или пометить failed"""
+    by_attempts: dict[int, list[int]] = defaultdict(list)
+    for message, attempts in claimed:
+        by_attempts[attempts].append(message.id)
+
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as session:
+        for attempts, entry_ids in by_attempts.items():
+            if attempts >= settings.NOTIFICATION_OUTBOX_MAX_ATTEMPTS:
+                values = {"status": NotificationOutboxStatus.FAILED}
+                logger.error(f"Доставка уведомлений outbox {entry_ids} окончательно не удалась: {error}")
+            else:
+                values = {"status": NotificationOutboxStatus.PENDING, "next_run_at": now + _retry_delay(attempts)}
+
+            await session.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(entry_ids), NotificationOutbox.locked_by == token)
+                .values(locked_by=None, locked_at=None, last_error=str(error)[:2000], **values)
+                .execution_options(synchronize_session=False)
+            )
+        await session.commit()
+
+
+async def deliver_outbox_batch(limit: Optional[int] = None) -> int:
+    """
+    Доставить одну пачку записей outbox.
+
+    Returns:
+        Количество захваченных записей
+    """
+    token = uuid.uuid4().hex
+    claimed = await _claim_due_entries(token, limit or settings.NOTIFICATION_OUTBOX_BATCH_SIZE)
+    if not claimed:
+        return 0
+
+    messages = [message for message, _ in claimed]
+    try:
+        for handler in _handlers:
+            await handler(messages)
+    except Exception as e:
+        logger.warning(f"Ошибка доставки уведомлений outbox ({len(messages)} записей): {e}")
+        await _record_failure(token, claimed, e)
+        return len(claimed)
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            delete(NotificationOutbox)
+            .where(NotificationOutbox.locked_by == token)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+    return len(claimed)
+
+
+async def run_notification_outbox_relay(stop_event: Optional[asyncio.Event] = None) -> None:
+    """
+    Цикл доставки outbox.
+    Опрашивает таблицу с интервалом NOTIFICATION_OUTBOX_POLL_SECONDS
+    либо сразу после wake_outbox_relay().
+    """
+    stop_event = stop_event or asyncio.Event()
+    logger.info("Доставка уведомлений из outbox запущена")
+
+    while not stop_event.is_set():
+        _wakeup.clear()
+        try:
+            delivered = await deliver_outbox_batch()
+        except Exception as e:
+            logger.error(f"Ошибка доставки уведомлений из outbox: {e}")
+            delivered = 0
+
+        # Если записей больше пачки - сразу берем следующую
+        if delivered >= settings.NOTIFICATION_OUTBOX_BATCH_SIZE:
+            continue
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=settings.NOTIFICATION_OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    logger.info("Доставка уведомлений из outbox остановлена")
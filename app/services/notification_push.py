@@ -0,0 +1,244 @@
+"""
+Push-доставка уведомлений (поток /notifications/stream)
+
+Relay outbox (см. notification_outbox) передает брокеру получателей
+зафиксированных уведомлений. Брокер будит открытые потоки этих
+пользователей, а поток сам читает из БД уведомления новее последнего
+отправленного. Поэтому клиент получает настоящие строки Notification
+с id и после переподключения (Last-Event-ID) ничего не теряет.
+
+Брокер по умолчанию - в памяти процесса (один процесс, тесты). При
+заданном NOTIFICATION_BROKER_URL (и установленном пакете redis)
+сигналы идут через Redis pub/sub и доходят до потоков во всех
+процессах (gunicorn workers). Брокер можно заменить через
+set_notification_broker().
+"""
+import asyncio
+import json
+import time
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Iterable, Optional, Protocol, Set
+
+from sqlalchemy import select, func
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logging import get_logger
+from app.models.notification import Notification
+from app.schemas.notification import NotificationResponse
+from app.services.notification_outbox import OutboxMessage, subscribe_outbox
+
+logger = get_logger()
+
+# Сколько уведомлений читается из БД за одно пробуждение потока
+STREAM_FETCH_LIMIT = 100
+
+
+class NotificationBroker(Protocol):
+    """Рассылка сигналов "есть новые уведомления" открытым потокам"""
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        ...
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        ...
+
+    async def publish(self, user_ids: Iterable[int]) -> None:
+        ...
+
+    async def start(self) -> None:
+        ...
+
+    async def stop(self) -> None:
+        ...
+
+
+class MemoryNotificationBroker:
+    """Брокер в памяти процесса"""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        # Очередь - только флаг пробуждения: один ожидающий сигнал
+        # покрывает любое число новых уведомлений
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def wake(self, user_ids: Iterable[int]) -> None:
+        """Разбудить потоки пользователей в этом процессе"""
+        for user_id in user_ids:
+            for queue in self._subscribers.get(user_id, ()):
+                if queue.empty():
+                    queue.put_nowait(True)
+
+    async def publish(self, user_ids: Iterable[int]) -> None:
+        self.wake(user_ids)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class RedisNotificationBroker(MemoryNotificationBroker):
+    """Брокер через Redis pub/sub: сигнал доходит до потоков всех процессов"""
+
+    def __init__(self, url: str, channel: str = "ertis:notifications"):
+        import redis.asyncio as redis
+
+        super().__init__()
+        self.channel = channel
+        self._client = redis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+
+    async def publish(self, user_ids: Iterable[int]) -> None:
+        await self._client.publish(self.channel, json.dumps(sorted(set(user_ids))))
+
+    async def start(self) -> None:
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        await self._client.aclose()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self._client.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.wake(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка подписки на push-уведомления в Redis: {e}")
+                await asyncio.sleep(1)
+
+
+def _create_broker() -> NotificationBroker:
+    if settings.NOTIFICATION_BROKER_URL:
+        try:
+            return RedisNotificationBroker(settings.NOTIFICATION_BROKER_URL)
+        except ImportError:
+            logger.warning("NOTIFICATION_BROKER_URL задан, но пакет redis не установлен - используется брокер в памяти")
+    return MemoryNotificationBroker()
+
+
+_broker: NotificationBroker = _create_broker()
+
+
+def get_notification_broker() -> NotificationBroker:
+    return _broker
+
+
+def set_notification_broker(broker: NotificationBroker) -> None:
+    """Заменить брокер (например, на брокер в памяти в тестах)"""
+    global _broker
+    _broker = broker
+
+
+@subscribe_outbox
+async def push_outbox_messages(messages: list[OutboxMessage]) -> None:
+    """Разбудить потоки получателей доставленных уведомлений"""
+    user_ids = {user_id for message in messages for user_id in message.user_ids}
+    if user_ids:
+        await _broker.publish(user_ids)
+
+
+async def _last_notification_id(user_id: int) -> int:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(func.max(Notification.id)).where(Notification.user_id == user_id)
+        )
+        return result.scalar() or 0
+
+
+async def _fetch_new_notifications(user_id: int, after_id: int) -> list[Notification]:
+    # Индекс по user_id во вторичном ключе содержит id - диапазон без сортировки
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Notification)
+            .where(Notification.user_id == user_id, Notification.id > after_id)
+            .order_by(Notification.id)
+            .limit(STREAM_FETCH_LIMIT)
+        )
+        return list(result.scalars().all())
+
+
+def format_event(notification: Notification) -> str:
+    """Событие SSE с уведомлением"""
+    data = NotificationResponse.model_validate(notification).model_dump_json()
+    return f"id: {notification.id}\nevent: notification\ndata: {data}\n\n"
+
+
+# Событие перед закрытием потока с истекшим токеном
+TOKEN_EXPIRED_EVENT = "event: token_expired\ndata: {}\n\n"
+
+
+async def notification_events(
+    user_id: int,
+    last_event_id: Optional[int] = None,
+    expires_at: Optional[float] = None
+) -> AsyncIterator[str]:
+    """
+    Поток SSE новых уведомлений пользователя.
+
+    Соединение с БД берется только на время чтения, между сигналами
+    поток его не держит. Токен проверяется только при подключении,
+    поэтому поток закрывается в момент его истечения (expires_at):
+    клиент переподключается с новым токеном и Last-Event-ID.
+
+    Args:
+        user_id: ID пользователя
+        last_event_id: Последнее полученное клиентом уведомление
+            (по умолчанию - отправлять только уведомления новее подключения)
+        expires_at: exp токена (unix time), None - без ограничения
+    """
+    # Подписка до чтения курсора: сигнал о коммите между ними не теряется
+    queue = _broker.subscribe(user_id)
+    try:
+        after_id = last_event_id if last_event_id is not None else await _last_notification_id(user_id)
+        yield f"retry: {int(settings.NOTIFICATION_STREAM_KEEPALIVE_SECONDS * 1000)}\n\n"
+
+        while True:
+            if expires_at is not None and time.time() >= expires_at:
+                yield TOKEN_EXPIRED_EVENT
+                return
+
+            notifications = await _fetch_new_notifications(user_id, after_id)
+            for notification in notifications:
+                yield format_event(notification)
+                after_id = notification.id
+
+            # Полная пачка - за ней могут быть еще уведомления
+            if len(notifications) >= STREAM_FETCH_LIMIT:
+                continue
+
+            timeout = settings.NOTIFICATION_STREAM_KEEPALIVE_SECONDS
+            if expires_at is not None:
+                timeout = max(0.0, min(timeout, expires_at - time.time()))
+
+            try:
+                await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                if expires_at is None or time.time() < expires_at:
+                    yield ": keepalive\n\n"
+    finally:
+        _broker.unsubscribe(user_id, queue)
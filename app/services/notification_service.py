@@ -1,12 +1,158 @@
 """
 Сервис для отправки уведомлений пользователям
+
+Уведомления не пишутся в БД по одному: send_notification() и
+send_bulk_notification() складывают их в диспетчер сессии, а при commit
+все накопленные уведомления записываются одним многострочным INSERT
+(массовая рассылка - пачками по NOTIFICATION_INSERT_CHUNK_SIZE).
+В той же транзакции пишется запись outbox для доставки за пределы БД,
+поэтому доставляются только зафиксированные уведомления. При rollback
+накопленные уведомления отбрасываются.
+
+Счетчик непрочитанных users.unread_notifications увеличивается при
+записи уведомлений и уменьшается на число строк, фактически помеченных
+прочитанными, - значок колокольчика не пересчитывает историю.
 """
+import json
+from collections import Counter, defaultdict
+from typing import Iterable, NamedTuple, Optional, Sequence
+
+from sqlalchemy import event, insert, select, update, func, case, false
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.notification import Notification, NotificationType
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
 from app.core.logging import get_logger
+from app.models.notification import Notification, NotificationOutbox, NotificationOutboxStatus, NotificationType
+from app.models.user import User
+from app.services.notification_outbox import wake_outbox_relay
 
 logger = get_logger()
 
+# Ключ диспетчера в Session.info
+DISPATCHER_KEY = "notification_dispatcher"
+# Флаг "в транзакции записан outbox" - relay будится после commit
+OUTBOX_WRITTEN_KEY = "notification_outbox_written"
+
+
+class PendingNotification(NamedTuple):
+    """Уведомление, ожидающее commit"""
+    user_ids: tuple[int, ...]
+    title: str
+    message: str
+    type: NotificationType
+
+
+class NotificationDispatcher:
+    """Уведомления, накопленные в одной единице работы (сессии)"""
+
+    def __init__(self):
+        self.pending: list[PendingNotification] = []
+
+    def add(
+        self,
+        user_ids: Iterable[int],
+        title: str,
+        message: str,
+        notification_type: NotificationType = NotificationType.INFO
+    ) -> int:
+        # Повторы получателей убираются с сохранением порядка
+        recipients = tuple(dict.fromkeys(user_ids))
+        if recipients:
+            self.pending.append(PendingNotification(recipients, title, message, notification_type))
+        return len(recipients)
+
+    def write(self, session: Session) -> int:
+        """
+        Записать накопленные уведомления и outbox (синхронная сессия,
+        вызывается из before_commit).
+
+        Returns:
+            Количество записанных уведомлений
+        """
+        pending, self.pending = self.pending, []
+        if not pending:
+            return 0
+
+        rows = [
+            {"user_id": user_id, "title": item.title, "message": item.message, "type": item.type, "is_read": False}
+            for item in pending
+            for user_id in item.user_ids
+        ]
+        chunk_size = max(1, settings.NOTIFICATION_INSERT_CHUNK_SIZE)
+        for offset in range(0, len(rows), chunk_size):
+            session.execute(insert(Notification).values(rows[offset:offset + chunk_size]))
+
+        # Один UPDATE счетчиков на каждое различное число новых уведомлений
+        # (обычно одно); строки users блокируются в порядке id
+        by_increment: dict[int, list[int]] = defaultdict(list)
+        for user_id, increment in sorted(Counter(row["user_id"] for row in rows).items()):
+            by_increment[increment].append(user_id)
+        for increment, user_ids in by_increment.items():
+            for offset in range(0, len(user_ids), chunk_size):
+                session.execute(
+                    update(User)
+                    .where(User.id.in_(user_ids[offset:offset + chunk_size]))
+                    .values(unread_notifications=User.unread_notifications + increment)
+                    .execution_options(synchronize_session=False)
+                )
+
+        session.execute(insert(NotificationOutbox).values([
+            {
+                "user_ids": json.dumps(list(item.user_ids)),
+                "title": item.title,
+                "message": item.message,
+                "type": item.type,
+                "status": NotificationOutboxStatus.PENDING,
+                "attempts": 0,
+            }
+            for item in pending
+        ]))
+        return len(rows)
+
+
+def get_dispatcher(db: AsyncSession) -> NotificationDispatcher:
+    """Диспетчер уведомлений текущей сессии"""
+    # Уведомления привязываются к транзакции: без нее rollback() ничего
+    # не откатывает и накопленное ушло бы со следующим commit
+    if not db.in_transaction():
+        db.sync_session.begin()
+
+    dispatcher = db.info.get(DISPATCHER_KEY)
+    if dispatcher is None:
+        dispatcher = db.info[DISPATCHER_KEY] = NotificationDispatcher()
+    return dispatcher
+
+
+@event.listens_for(Session, "before_commit")
+def _write_pending_notifications(session: Session) -> None:
+    dispatcher = session.info.get(DISPATCHER_KEY)
+    if dispatcher is None or not dispatcher.pending:
+        return
+
+    # Сначала flush ORM-объектов: уведомление может ссылаться на нового пользователя
+    session.flush()
+    count = dispatcher.write(session)
+    session.info[OUTBOX_WRITTEN_KEY] = True
+    logger.info(f"Записано уведомлений: {count}")
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_outbox_relay(session: Session) -> None:
+    if session.info.pop(OUTBOX_WRITTEN_KEY, False):
+        wake_outbox_relay()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending_notifications(session: Session, transaction) -> None:
+    # После commit диспетчер уже пуст, после rollback накопленное отбрасывается
+    if transaction.parent is not None:
+        return
+    dispatcher = session.info.pop(DISPATCHER_KEY, None)
+    session.info.pop(OUTBOX_WRITTEN_KEY, None)
+    if dispatcher is not None and dispatcher.pending:
+        logger.info(f"Уведомления отброшены при откате транзакции: {len(dispatcher.pending)}")
+
 
 async def send_notification(
     db: AsyncSession,
@@ -14,23 +160,118 @@ async def send_notification(
     title: str,
     message: str,
     notification_type: NotificationType = NotificationType.INFO
-) -> Notification:
+) -> None:
     """
-    Отправить уведомление пользователю
+    Отправить уведомление пользователю (запишется при commit сессии)
     """
-    notification = Notification(
-        user_id=user_id,
-        title=title,
-        message=message,
-        type=notification_type
+    get_dispatcher(db).add([user_id], title, message, notification_type)
+    logger.info(f"Уведомление для пользователя {user_id} поставлено в очередь: {title}")
+
+
+async def send_bulk_notification(
+    db: AsyncSession,
+    user_ids: Iterable[int],
+    title: str,
+    message: str,
+    notification_type: NotificationType = NotificationType.INFO
+) -> int:
+    """
+    Отправить одно уведомление многим пользователям (запишется при commit сессии).
+
+    Returns:
+        Количество получателей без повторов
+    """
+    count = get_dispatcher(db).add(user_ids, title, message, notification_type)
+    logger.info(f"Массовое уведомление поставлено в очередь для {count} пользователей: {title}")
+    return count
+
+
+async def mark_notifications_read(
+    db: AsyncSession,
+    user_id: int,
+    notification_ids: Optional[Sequence[int]] = None
+) -> int:
+    """
+    Пометить уведомления пользователя прочитанными одним UPDATE (до commit).
+
+    Args:
+        db: Сессия БД
+        user_id: ID пользователя
+        notification_ids: Какие уведомления (по умолчанию все непрочитанные)
+
+    Returns:
+        Количество уведомлений, которые были непрочитанными
+    """
+    query = update(Notification).where(Notification.user_id == user_id, Notification.is_read == false())
+    if notification_ids is not None:
+        if not notification_ids:
+            return 0
+        query = query.where(Notification.id.in_(notification_ids))
+
+    result = await db.execute(query.values(is_read=True).execution_options(synchronize_session=False))
+    updated = result.rowcount
+    if updated:
+        # Счетчик уменьшается ровно на число измененных строк; параллельная
+        # пометка тех же уведомлений изменит 0 строк и счетчик не тронет
+        await db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(unread_notifications=case(
+                (User.unread_notifications > updated, User.unread_notifications - updated),
+                else_=0
+            ))
+            .execution_options(synchronize_session=False)
+        )
+    return updated
+
+
+async def get_unread_count(db: AsyncSession, user_id: int) -> int:
+    """Количество непрочитанных уведомлений (из счетчика пользователя)"""
+    result = await db.execute(select(User.unread_notifications).where(User.id == user_id))
+    return result.scalar() or 0
+
+
+async def backfill_unread_counters(db: AsyncSession, user_id: Optional[int] = None) -> int:
+    """
+    Пересчитать users.unread_notifications по таблице notifications.
+
+    Args:
+        db: Сессия БД
+        user_id: Только один пользователь (по умолчанию все)
+
+    Returns:
+        Количество обновленных пользователей
+    """
+    unread = select(func.count(Notification.id)).where(
+        Notification.user_id == User.id,
+        Notification.is_read == false()
+    ).scalar_subquery()
+
+    query = update(User).values(unread_notifications=unread)
+    if user_id is not None:
+        query = query.where(User.id == user_id)
+
+    result = await db.execute(query.execution_options(synchronize_session=False))
+    await db.commit()
+
+    logger.info(f"Пересчитаны счетчики непрочитанных уведомлений: {result.rowcount}")
+    return result.rowcount
+
+
+async def ensure_unread_counters(db: AsyncSession) -> None:
+    """
+    Заполнить счетчики после добавления колонки: есть непрочитанные
+    уведомления, а счетчик пользователя нулевой.
+    """
+    result = await db.execute(
+        select(Notification.id)
+        .join(User, User.id == Notification.user_id)
+        .where(Notification.is_read == false(), User.unread_notifications == 0)
+        .limit(1)
     )
-    
-    db.add(notification)
-    await db.flush()
-    
-    logger.info(f"Уведомление отправлено пользователю {user_id}: {title}")
-    
-    return notification
+    if result.first() is not None:
+        logger.info("Счетчики непрочитанных уведомлений не заполнены - выполняется пересчет")
+        await backfill_unread_counters(db)
 
 
 async def notify_request_assigned(db: AsyncSession, user_id: int, request_id: int, employee_name: str):
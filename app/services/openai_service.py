@@ -13,10 +13,12 @@ logger = get_logger()
 client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
 
-async def analyze_problem_description(description: str, category_name: str) -> str:
+async def analyze_problem_description(description: str, category_name: str, strict: bool = False) -> str:
     """
     Обработка описания проблемы с помощью gpt-4o-mini
     Формирует структурированное описание для анализа фото
+
+    strict=True - ошибка OpenAI пробрасывается вместо возврата исходного описания
     """
     try:
         prompt = f"""
@@ -50,17 +52,22 @@ async def analyze_problem_description(description: str, category_name: str) -> s
 
     except Exception as e:
         logger.error(f"Ошибка при обработке описания: {e}")
+        if strict:
+            raise
         return description  # Возвращаем оригинальное описание в случае ошибки
 
 
 async def analyze_image_priority(
     image_path: str,
     structured_description: str,
-    category_name: str
+    category_name: str,
+    strict: bool = False
 ) -> str:
     """
     Анализ изображения и определение приоритета проблемы (low/medium/high)
     Использует gpt-4o для анализа изображения
+
+    strict=True - ошибка OpenAI пробрасывается вместо возврата "medium"
     """
     try:
         # Читаем изображение и конвертируем в base64
@@ -121,17 +128,22 @@ high - Высокий (серьезная проблема, угроза без
 
     except Exception as e:
         logger.error(f"Ошибка при анализе изображения: {e}")
+        if strict:
+            raise
         return "medium"  # В случае ошибки возвращаем средний приоритет
 
 
 async def generate_user_recommendation(
     description: str,
     category_name: str,
-    priority: str
+    priority: str,
+    strict: bool = False
 ) -> str:
     """
     Генерация краткой рекомендации для пользователя по его заявке.
     Возвращает понятное сообщение о статусе обработки.
+
+    strict=True - ошибка OpenAI пробрасывается вместо возврата стандартной рекомендации
     """
     try:
         prompt = f"""
@@ -166,13 +178,19 @@ async def generate_user_recommendation(
 
     except Exception as e:
         logger.error(f"Ошибка при генерации рекомендации: {e}")
-        # Дефолтное сообщение
-        priority_text = {
-            "high": "Ваша заявка имеет высокий приоритет и будет обработана в ближайшее время.",
-            "medium": "Ваша заявка принята и будет обработана в течение 1-3 рабочих дней.",
-            "low": "Ваша заявка принята и будет обработана в течение недели."
-        }
-        return priority_text.get(priority, "Ваша заявка принята и находится в обработке.")
+        if strict:
+            raise
+        return default_user_recommendation(priority)
+
+
+def default_user_recommendation(priority: str) -> str:
+    """Дефолтная рекомендация для пользователя, если AI недоступен"""
+    priority_text = {
+        "high": "Ваша заявка имеет высокий приоритет и будет обработана в ближайшее время.",
+        "medium": "Ваша заявка принята и будет обработана в течение 1-3 рабочих дней.",
+        "low": "Ваша заявка принята и будет обработана в течение недели."
+    }
+    return priority_text.get(priority, "Ваша заявка принята и находится в обработке.")
 
 
 async def assign_employee_ai(
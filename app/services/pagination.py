@@ -0,0 +1,205 @@
+"""
+Keyset (курсорная) пагинация списков
+
+Вместо OFFSET следующая страница выбирается условием "после последней
+записи" по упорядоченному ключу, поэтому стоимость запроса не зависит
+от номера страницы и опирается на составные индексы:
+
+- (created_at, id) - списки по дате создания;
+- (priority, created_at, id) - списки заявок по приоритету. Приоритет
+  хранится строкой, поэтому порядок high -> medium -> low задается явно:
+  каждая "корзина" приоритета читается отдельным запросом по индексу
+  (на страницу - не более трех запросов).
+
+Курсор - непрозрачная base64-строка с ключом последней записи.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import and_, or_, func, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.request import Request, RequestPriority
+
+# Порядок корзин при сортировке по убыванию приоритета
+PRIORITY_ORDER = (RequestPriority.HIGH, RequestPriority.MEDIUM, RequestPriority.LOW)
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams(NamedTuple):
+    """Параметры страницы"""
+    cursor: Optional[str]
+    limit: int
+    unbounded: bool = False  # Явный запрос всего списка без пагинации
+
+
+class Page(NamedTuple):
+    """Страница результатов"""
+    items: list
+    next_cursor: Optional[str]
+
+
+def encode_cursor(kind: str, values: list) -> str:
+    """Курсор из ключа последней записи"""
+    raw = json.dumps({"k": kind, "v": values}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str) -> list:
+    """
+    Ключ последней записи из курсора.
+
+    Raises:
+        HTTPException: 400 если курсор поврежден или от другого списка
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        if data["k"] != kind:
+            raise ValueError(kind)
+        return data["v"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации"
+        )
+
+
+def _created_after(db: AsyncSession, model, created_at: datetime, last_id: int, descending: bool):
+    """Условие "после записи (created_at, id)" в заданном направлении"""
+    column, value = model.created_at, created_at
+    if db.bind.dialect.name == "sqlite":
+        # server_default CURRENT_TIMESTAMP хранится без микросекунд, а параметр
+        # передается с ними - сравниваем в одном формате
+        column, value = func.datetime(column), func.datetime(value)
+
+    if descending:
+        return or_(column < value, and_(column == value, model.id < last_id))
+    return or_(column > value, and_(column == value, model.id > last_id))
+
+
+def _created_order(model, descending: bool) -> tuple:
+    if descending:
+        return model.created_at.desc(), model.id.desc()
+    return model.created_at.asc(), model.id.asc()
+
+
+def _parse_created_key(values: list) -> tuple[datetime, int]:
+    try:
+        return datetime.fromisoformat(values[-2]), int(values[-1])
+    except (ValueError, TypeError, IndexError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор пагинации"
+        )
+
+
+def _page(rows: list, limit: int, cursor_for) -> Page:
+    if len(rows) <= limit:
+        return Page(items=rows, next_cursor=None)
+    items = rows[:limit]
+    return Page(items=items, next_cursor=cursor_for(items[-1]))
+
+
+async def paginate_by_created(
+    db: AsyncSession,
+    query: Select,
+    model: Any,
+    params: PageParams,
+    descending: bool = True
+) -> Page:
+    """
+    Страница списка, упорядоченного по (created_at, id).
+
+    Args:
+        db: Сессия БД
+        query: select(model) с фильтрами, без сортировки
+        model: Модель с колонками created_at и id
+        params: Параметры страницы
+        descending: Новые записи первыми
+    """
+    kind = f"{model.__tablename__}:created:{'desc' if descending else 'asc'}"
+    query = query.order_by(*_created_order(model, descending))
+
+    if params.unbounded:
+        result = await db.execute(query)
+        return Page(items=list(result.scalars().all()), next_cursor=None)
+
+    if params.cursor:
+        created_at, last_id = _parse_created_key(decode_cursor(params.cursor, kind))
+        query = query.where(_created_after(db, model, created_at, last_id, descending))
+
+    result = await db.execute(query.limit(params.limit + 1))
+    return _page(
+        list(result.scalars().all()),
+        params.limit,
+        lambda last: encode_cursor(kind, [last.created_at.isoformat(), last.id])
+    )
+
+
+async def paginate_requests_by_priority(
+    db: AsyncSession,
+    query: Select,
+    params: PageParams,
+    created_descending: bool = True,
+    priorities: tuple[RequestPriority, ...] = PRIORITY_ORDER
+) -> Page:
+    """
+    Страница заявок, упорядоченных по приоритету (high -> low), затем по (created_at, id).
+
+    Args:
+        db: Сессия БД
+        query: select(Request) с фильтрами, без сортировки
+        params: Параметры страницы
+        created_descending: Внутри приоритета новые заявки первыми
+        priorities: Корзины приоритетов по порядку (для фильтра по приоритету - одна)
+    """
+    kind = f"requests:priority:{'desc' if created_descending else 'asc'}"
+    order = _created_order(Request, created_descending)
+
+    start = 0
+    after = None
+    if params.cursor and not params.unbounded:
+        values = decode_cursor(params.cursor, kind)
+        try:
+            start = priorities.index(RequestPriority(values[0]))
+        except (ValueError, IndexError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Некорректный курсор пагинации"
+            )
+        after = _parse_created_key(values)
+
+    rows = []
+    for position in range(start, len(priorities)):
+        bucket_query = query.where(Request.priority == priorities[position]).order_by(*order)
+        if position == start and after is not None:
+            bucket_query = bucket_query.where(_created_after(db, Request, *after, created_descending))
+        if not params.unbounded:
+            bucket_query = bucket_query.limit(params.limit + 1 - len(rows))
+
+        result = await db.execute(bucket_query)
+        rows.extend(result.scalars().all())
+
+        if not params.unbounded and len(rows) > params.limit:
+            break
+
+    if params.unbounded:
+        return Page(items=rows, next_cursor=None)
+
+    return _page(
+        rows,
+        params.limit,
+        lambda last: encode_cursor(kind, [last.priority.value, last.created_at.isoformat(), last.id])
+    )
+
+
+def set_next_cursor(response: Response, page: Page) -> None:
+    """Курсор следующей страницы в заголовке ответа (тело остается списком)"""
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
@@ -0,0 +1,127 @@
+"""
+Кэш аутентифицированных пользователей и сотрудников
+
+Без кэша каждый запрос с токеном выполняет SELECT по users (или
+employees). Кэш хранит только то, что нужно для авторизации, -
+Principal (id, username, роль) - под ключом (вид, id, время выпуска
+токена) с коротким TTL и ограничением LRU. Проверка роли (require_role)
+и эндпоинты, которым нужен только id, к БД не обращаются.
+
+ORM-объект (с password_hash, счетчиками и т.п.) из кэша не собирается:
+эндпоинты, которые читают профиль целиком или меняют его, загружают
+его из БД (get_current_user). Поэтому устаревшая запись кэша не может
+перезаписать более новые значения в БД.
+
+Изменение профиля, пароля, роли и удаление аккаунта сбрасывают все
+записи принципала. Кэш локален для процесса: в других процессах
+понижение роли или удаление вступает в силу не позже чем через
+PRINCIPAL_CACHE_TTL_SECONDS.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Set, Tuple, Type
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.user import UserRole
+
+USER = "user"
+EMPLOYEE = "employee"
+
+PrincipalKey = Tuple[str, int, Optional[int]]
+
+
+class Principal(NamedTuple):
+    """Пользователь или сотрудник токена - данные для авторизации"""
+    id: int
+    username: str
+    role: Optional[UserRole]  # None у сотрудников
+
+
+class PrincipalCache:
+    """LRU+TTL кэш принципалов"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[PrincipalKey, tuple[float, Principal]]" = OrderedDict()
+        # Ключи каждого принципала (по одному на выпущенный токен) для инвалидации
+        self._keys: Dict[Tuple[str, int], Set[PrincipalKey]] = {}
+
+    def get(self, kind: str, principal_id: int, issued_at: Optional[int]) -> Optional[Principal]:
+        key = (kind, principal_id, issued_at)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            metrics.increment(f"principal_cache.misses.{kind}")
+            return None
+        self._entries.move_to_end(key)
+        metrics.increment(f"principal_cache.hits.{kind}")
+        return entry[1]
+
+    def put(self, kind: str, principal_id: int, issued_at: Optional[int], principal: Principal) -> None:
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        key = (kind, principal_id, issued_at)
+        self._entries[key] = (time.monotonic() + self.ttl, principal)
+        self._entries.move_to_end(key)
+        self._keys.setdefault((kind, principal_id), set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, kind: str, principal_id: int) -> None:
+        """Сбросить все записи принципала (все его токены)"""
+        for key in self._keys.pop((kind, principal_id), set()):
+            self._entries.pop(key, None)
+        metrics.increment(f"principal_cache.invalidations.{kind}")
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys.clear()
+
+    def _remove(self, key: PrincipalKey) -> None:
+        self._entries.pop(key, None)
+        keys = self._keys.get(key[:2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys[key[:2]]
+
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_MAX_ENTRIES, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+async def load_principal(
+    db: AsyncSession,
+    model: Type,
+    kind: str,
+    principal_id: int,
+    issued_at: Optional[int]
+) -> Optional[Principal]:
+    """
+    Принципал токена: из кэша или одним SELECT трех колонок по id.
+
+    Args:
+        db: Сессия запроса
+        model: User или Employee
+        kind: USER или EMPLOYEE
+        principal_id: ID из токена
+        issued_at: iat токена
+    """
+    principal = principal_cache.get(kind, principal_id, issued_at)
+    if principal is not None:
+        return principal
+
+    role_column = model.role if kind == USER else None
+    columns = [model.id, model.username] + ([role_column] if role_column is not None else [])
+    row = (await db.execute(select(*columns).where(model.id == principal_id))).one_or_none()
+    if row is None:
+        return None
+
+    principal = Principal(id=row[0], username=row[1], role=row[2] if role_column is not None else None)
+    principal_cache.put(kind, principal_id, issued_at, principal)
+    return principal
@@ -0,0 +1,110 @@
+"""
+Сервис рейтинга сотрудников
+
+Средняя оценка сотрудника поддерживается инкрементально: при новой оценке
+счетчики rating_sum/rating_count увеличиваются одним атомарным UPDATE,
+без пересчета AVG по всем оценкам. Параллельные оценки не теряются -
+каждый UPDATE прибавляет к значению в строке, а не записывает значение,
+прочитанное раньше. При удалении оценки (вместе с заявкой) счетчики
+уменьшаются тем же способом.
+"""
+from typing import Optional
+
+from sqlalchemy import select, update, func, cast, case, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logging import get_logger
+from app.models.employee import Employee
+from app.models.rating import Rating
+
+logger = get_logger()
+
+
+async def add_employee_rating(db: AsyncSession, employee_id: int, value: int) -> None:
+    """
+    Учесть новую оценку в рейтинге сотрудника (до commit, в той же транзакции).
+
+    Args:
+        db: Сессия БД
+        employee_id: ID сотрудника
+        value: Оценка от 1 до 5
+    """
+    await _shift_employee_rating(db, employee_id, value, 1)
+
+
+async def remove_employee_rating(db: AsyncSession, employee_id: int, value: int) -> None:
+    """
+    Исключить удаляемую оценку из рейтинга сотрудника (до commit, в той же транзакции).
+
+    Args:
+        db: Сессия БД
+        employee_id: ID сотрудника
+        value: Оценка от 1 до 5
+    """
+    await _shift_employee_rating(db, employee_id, -value, -1)
+
+
+async def _shift_employee_rating(db: AsyncSession, employee_id: int, value: int, count: int) -> None:
+    # MySQL вычисляет присваивания слева направо и видит уже обновленные
+    # значения, остальные БД - исходные. average_rating идет первым, поэтому
+    # выражение везде считается по значениям до UPDATE.
+    new_count = Employee.rating_count + count
+    await db.execute(
+        update(Employee)
+        .where(Employee.id == employee_id)
+        .ordered_values(
+            (Employee.average_rating, case(
+                (new_count > 0, cast(Employee.rating_sum + value, Float) / new_count),
+                else_=0.0
+            )),
+            (Employee.rating_sum, Employee.rating_sum + value),
+            (Employee.rating_count, new_count),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def backfill_employee_ratings(db: AsyncSession, employee_id: Optional[int] = None) -> int:
+    """
+    Пересчитать rating_sum/rating_count/average_rating из таблицы ratings.
+
+    Args:
+        db: Сессия БД
+        employee_id: Только один сотрудник (по умолчанию все)
+
+    Returns:
+        Количество обновленных сотрудников
+    """
+    rating_sum = select(func.coalesce(func.sum(Rating.rating), 0)).where(
+        Rating.employee_id == Employee.id
+    ).scalar_subquery()
+    rating_count = select(func.count(Rating.id)).where(Rating.employee_id == Employee.id).scalar_subquery()
+    average = select(func.coalesce(func.avg(Rating.rating), 0.0)).where(
+        Rating.employee_id == Employee.id
+    ).scalar_subquery()
+
+    query = update(Employee).values(rating_sum=rating_sum, rating_count=rating_count, average_rating=average)
+    if employee_id is not None:
+        query = query.where(Employee.id == employee_id)
+
+    result = await db.execute(query.execution_options(synchronize_session=False))
+    await db.commit()
+
+    logger.info(f"Пересчитан рейтинг сотрудников: {result.rowcount}")
+    return result.rowcount
+
+
+async def ensure_rating_counters(db: AsyncSession) -> None:
+    """
+    Заполнить счетчики после добавления колонок: есть оценки сотрудника,
+    а rating_count еще нулевой.
+    """
+    result = await db.execute(
+        select(Rating.id)
+        .join(Employee, Employee.id == Rating.employee_id)
+        .where(Employee.rating_count == 0)
+        .limit(1)
+    )
+    if result.first() is not None:
+        logger.info("Счетчики рейтинга сотрудников не заполнены - выполняется пересчет")
+        await backfill_employee_ratings(db)
@@ -0,0 +1,148 @@
+"""
+Refresh-токены
+
+Access-токен живет ACCESS_TOKEN_EXPIRE_MINUTES; вместо повторного входа
+(bcrypt) клиент обменивает refresh-токен на новую пару токенов. Refresh-
+токен - случайная строка, в БД хранится только ее SHA-256 (уникальный
+индекс), поэтому обмен - это поиск по индексу без bcrypt.
+
+Каждый refresh-токен одноразовый: при обмене он помечается отозванным и
+выдается следующий из той же цепочки (family_id). Повторное предъявление
+уже использованного токена означает, что его скопировали, - отзывается
+вся цепочка. Выход отзывает цепочку, смена пароля - все токены
+пользователя.
+"""
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models.refresh_token import RefreshToken
+from app.models.user import User
+
+logger = get_logger()
+
+
+class RefreshTokenError(Exception):
+    """Refresh-токен неизвестен, истек или отозван"""
+
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+async def issue_refresh_token(db: AsyncSession, user_id: int, family_id: Optional[str] = None) -> str:
+    """
+    Выдать refresh-токен (запись добавляется в сессию, commit - за вызывающим).
+
+    Args:
+        db: Сессия БД
+        user_id: ID пользователя
+        family_id: Цепочка обновлений (по умолчанию - новая, для входа)
+
+    Returns:
+        Refresh-токен для клиента
+    """
+    now = datetime.utcnow()
+
+    # Истекшие токены пользователя больше не нужны даже для обнаружения повторов
+    await db.execute(
+        delete(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.expires_at < now)
+        .execution_options(synchronize_session=False)
+    )
+
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        token_hash=hash_refresh_token(token),
+        user_id=user_id,
+        family_id=family_id or uuid.uuid4().hex,
+        expires_at=now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+
+async def rotate_refresh_token(db: AsyncSession, token: str) -> tuple[User, str]:
+    """
+    Обменять refresh-токен на следующий в цепочке.
+
+    Returns:
+        (пользователь, новый refresh-токен)
+
+    Raises:
+        RefreshTokenError: токен неверный, истек или уже использован
+            (в последнем случае цепочка отзывается - нужен commit)
+    """
+    now = datetime.utcnow()
+    result = await db.execute(
+        select(RefreshToken, User)
+        .join(User, User.id == RefreshToken.user_id)
+        .where(RefreshToken.token_hash == hash_refresh_token(token))
+    )
+    row = result.one_or_none()
+    if row is None:
+        raise RefreshTokenError("Неверный refresh-токен")
+
+    refresh_token, user = row
+    if refresh_token.expires_at <= now:
+        raise RefreshTokenError("Срок действия refresh-токена истек")
+
+    if refresh_token.revoked_at is not None:
+        await revoke_refresh_family(db, refresh_token.family_id)
+        logger.warning(f"Повторное использование refresh-токена пользователя {user.username}, цепочка отозвана")
+        raise RefreshTokenError("Refresh-токен отозван")
+
+    # Условие revoked_at IS NULL: из двух одновременных обменов проходит один
+    result = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == refresh_token.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        raise RefreshTokenError("Refresh-токен уже использован")
+
+    return user, await issue_refresh_token(db, user.id, refresh_token.family_id)
+
+
+async def revoke_refresh_family(db: AsyncSession, family_id: str) -> None:
+    """Отозвать все токены цепочки"""
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def revoke_refresh_token(db: AsyncSession, token: str) -> bool:
+    """
+    Отозвать цепочку предъявленного токена (выход).
+
+    Returns:
+        True, если токен найден
+    """
+    result = await db.execute(
+        select(RefreshToken.family_id).where(RefreshToken.token_hash == hash_refresh_token(token))
+    )
+    family_id = result.scalar_one_or_none()
+    if family_id is None:
+        return False
+    await revoke_refresh_family(db, family_id)
+    return True
+
+
+async def revoke_user_refresh_tokens(db: AsyncSession, user_id: int) -> None:
+    """Отозвать все refresh-токены пользователя (смена пароля)"""
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,156 @@
+"""
+События изменения заявок
+
+Эндпоинты, меняющие состояние заявки, фиксируют снимок до изменения
+и вызывают commit_request_change() вместо db.commit(). После успешного
+commit подписчики получают пару (до, после) и обновляют свои
+процессные структуры (индекс загрузки сотрудников и т.п.).
+
+Транзакционные подписчики (subscribe_transactional) вызываются до commit
+в той же сессии - так поддерживаются таблицы агрегатов статистики.
+Асинхронные подписчики (subscribe_after_commit) ожидаются после commit -
+для операций с внешними хранилищами (инвалидация кэша ответов).
+"""
+from datetime import datetime
+from typing import Awaitable, Callable, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logging import get_logger
+from app.models.request import Request, RequestStatus, RequestPriority
+
+logger = get_logger()
+
+
+class RequestState(NamedTuple):
+    """Снимок значимых полей заявки"""
+    id: int
+    status: RequestStatus
+    priority: RequestPriority
+    category_id: int
+    assignee_id: Optional[int]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    created_at: Optional[datetime]
+    completed_at: Optional[datetime]
+
+
+RequestListener = Callable[[Optional[RequestState], Optional[RequestState]], None]
+
+TransactionalListener = Callable[
+    [AsyncSession, Optional[RequestState], Optional[RequestState]], Awaitable[None]
+]
+
+AsyncRequestListener = Callable[[Optional[RequestState], Optional[RequestState]], Awaitable[None]]
+
+_listeners: list[RequestListener] = []
+_transactional_listeners: list[TransactionalListener] = []
+_after_commit_listeners: list[AsyncRequestListener] = []
+
+
+def snapshot(request_obj: Optional[Request]) -> Optional[RequestState]:
+    """
+    Снимок состояния заявки.
+    Читает только загруженные атрибуты, чтобы не вызвать lazy load в async-сессии.
+    """
+    if request_obj is None:
+        return None
+
+    values = inspect(request_obj).dict
+    return RequestState(
+        id=values.get("id"),
+        status=values.get("status"),
+        priority=values.get("priority"),
+        category_id=values.get("category_id"),
+        assignee_id=values.get("assignee_id"),
+        latitude=values.get("latitude"),
+        longitude=values.get("longitude"),
+        created_at=values.get("created_at"),
+        completed_at=values.get("completed_at"),
+    )
+
+
+def subscribe(listener: RequestListener) -> RequestListener:
+    """Подписаться на изменения заявок (можно использовать как декоратор)"""
+    _listeners.append(listener)
+    return listener
+
+
+def subscribe_transactional(listener: TransactionalListener) -> TransactionalListener:
+    """
+    Подписаться на изменения заявок внутри транзакции.
+    Ошибка подписчика прерывает commit изменения.
+    """
+    _transactional_listeners.append(listener)
+    return listener
+
+
+def subscribe_after_commit(listener: AsyncRequestListener) -> AsyncRequestListener:
+    """Подписаться на изменения заявок асинхронным обработчиком (после commit)"""
+    _after_commit_listeners.append(listener)
+    return listener
+
+
+def publish(before: Optional[RequestState], after: Optional[RequestState]) -> None:
+    """Оповестить подписчиков об изменении заявки"""
+    if before == after:
+        return
+
+    for listener in _listeners:
+        try:
+            listener(before, after)
+        except Exception as e:
+            logger.error(f"Ошибка обработчика события заявки {listener.__name__}: {e}")
+
+
+async def commit_request_change(
+    db: AsyncSession,
+    before: Optional[RequestState],
+    request_obj: Optional[Request]
+) -> None:
+    """
+    Зафиксировать изменение заявки и оповестить подписчиков.
+
+    Args:
+        db: Сессия БД
+        before: Снимок до изменения (None для новой заявки)
+        request_obj: Заявка после изменения (None если удалена)
+    """
+    await commit_request_changes(db, [(before, request_obj)])
+
+
+async def commit_request_changes(
+    db: AsyncSession,
+    changes: Sequence[Tuple[Optional[RequestState], Optional[Request]]]
+) -> None:
+    """
+    Зафиксировать изменения нескольких заявок одной транзакцией
+    (например, снятие исполнителя при удалении сотрудника).
+
+    Args:
+        db: Сессия БД
+        changes: Пары (снимок до изменения, заявка после изменения или None)
+    """
+    states = []
+    for before, request_obj in changes:
+        if request_obj is not None and _transactional_listeners and "created_at" not in inspect(request_obj).dict:
+            # Новая заявка: created_at заполняется БД при INSERT
+            await db.flush()
+            await db.refresh(request_obj, attribute_names=["created_at"])
+
+        after = snapshot(request_obj)
+        if before != after:
+            states.append((before, after))
+            for listener in _transactional_listeners:
+                await listener(db, before, after)
+
+    await db.commit()
+
+    for before, after in states:
+        publish(before, after)
+        for listener in _after_commit_listeners:
+            try:
+                await listener(before, after)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика события заявки {listener.__name__}: {e}")
@@ -0,0 +1,247 @@
+"""
+Кэш ответов эндпоинтов статистики с инвалидацией по тегам
+
+Ответ хранится под ключом, в который входят параметры запроса и текущие
+версии его тегов ("global", "employee:<id>", "category:<id>").
+Инвалидация тега увеличивает его версию - старые записи больше не
+находятся и вытесняются по LRU/TTL. Поэтому ответ, построенный во время
+инвалидации, не попадет в выдачу: он сохранен под старыми версиями.
+
+Хранилище по умолчанию - LRU+TTL в памяти процесса. При заданном
+CACHE_REDIS_URL (и установленном пакете redis) используется общий Redis,
+тогда инвалидация видна всем процессам. Без Redis инвалидация доходит
+только до процесса, обработавшего изменение: в остальных воркерах ответ
+может отставать от БД на STATISTICS_CACHE_TTL_SECONDS. Поэтому при
+нескольких воркерах нужен CACHE_REDIS_URL. Для тестов хранилище можно
+заменить через set_cache_backend().
+
+Попадания, промахи и инвалидации считаются в app.core.metrics
+(statistics_cache.hits.<namespace> и т.п.).
+"""
+import functools
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Protocol, Sequence
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.metrics import metrics
+from app.services.request_events import RequestState, subscribe_after_commit
+
+logger = get_logger()
+
+GLOBAL_TAG = "global"
+
+# Параметры эндпоинтов, не входящие в ключ кэша
+UNCACHED_PARAMS = {"db", "current_user"}
+
+
+def employee_tag(employee_id: int) -> str:
+    return f"employee:{employee_id}"
+
+
+def category_tag(category_id: int) -> str:
+    return f"category:{category_id}"
+
+
+class CacheBackend(Protocol):
+    """Хранилище кэша ответов"""
+
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        ...
+
+    async def tag_versions(self, tags: Sequence[str]) -> List[int]:
+        ...
+
+    async def bump_tags(self, tags: Sequence[str]) -> None:
+        ...
+
+
+class MemoryCacheBackend:
+    """LRU+TTL кэш в памяти процесса"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._tag_versions: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def tag_versions(self, tags: Sequence[str]) -> List[int]:
+        return [self._tag_versions.get(tag, 0) for tag in tags]
+
+    async def bump_tags(self, tags: Sequence[str]) -> None:
+        for tag in tags:
+            self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+
+
+class RedisCacheBackend:
+    """Общий кэш в Redis (значения - JSON, версии тегов - счетчики INCR)"""
+
+    def __init__(self, url: str, prefix: str = "ertis:cache:"):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self._client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self._client.set(
+            self.prefix + key,
+            json.dumps(value, ensure_ascii=False, separators=(",", ":")),
+            px=max(1, int(ttl * 1000))
+        )
+
+    async def tag_versions(self, tags: Sequence[str]) -> List[int]:
+        values = await self._client.mget([f"{self.prefix}tag:{tag}" for tag in tags])
+        return [int(value) if value is not None else 0 for value in values]
+
+    async def bump_tags(self, tags: Sequence[str]) -> None:
+        pipeline = self._client.pipeline()
+        for tag in tags:
+            pipeline.incr(f"{self.prefix}tag:{tag}")
+        await pipeline.execute()
+
+
+def _create_backend() -> CacheBackend:
+    if settings.CACHE_REDIS_URL:
+        try:
+            return RedisCacheBackend(settings.CACHE_REDIS_URL)
+        except ImportError:
+            logger.warning("CACHE_REDIS_URL задан, но пакет redis не установлен - используется кэш в памяти")
+    return MemoryCacheBackend(settings.STATISTICS_CACHE_MAX_ENTRIES)
+
+
+_backend: CacheBackend = _create_backend()
+
+
+def set_cache_backend(backend: CacheBackend) -> None:
+    """Заменить хранилище кэша (например, на локальную заглушку в тестах)"""
+    global _backend
+    _backend = backend
+
+
+async def invalidate_tags(*tags: str) -> None:
+    """Инвалидировать все ответы, помеченные любым из тегов"""
+    unique_tags = sorted(set(tags))
+    if not unique_tags:
+        return
+    try:
+        await _backend.bump_tags(unique_tags)
+        metrics.increment("statistics_cache.invalidations", len(unique_tags))
+    except Exception as e:
+        logger.error(f"Ошибка инвалидации кэша ответов {unique_tags}: {e}")
+
+
+async def get_or_build(
+    namespace: str,
+    params: Dict[str, Any],
+    tags: Iterable[str],
+    build: Callable[[], Awaitable[Any]],
+    ttl: Optional[float] = None
+) -> Any:
+    """
+    Ответ из кэша или построенный заново.
+
+    Ошибки хранилища не ломают эндпоинт - ответ строится без кэша.
+
+    Args:
+        namespace: Имя эндпоинта
+        params: Параметры запроса (входят в ключ)
+        tags: Теги, инвалидация которых сбрасывает ответ
+        build: Корутина, возвращающая данные ответа
+        ttl: Время жизни (по умолчанию STATISTICS_CACHE_TTL_SECONDS)
+    """
+    tags = sorted(set(tags))
+    try:
+        versions = await _backend.tag_versions(tags)
+        key = json.dumps(
+            [namespace, jsonable_encoder(params), dict(zip(tags, versions))],
+            ensure_ascii=False, separators=(",", ":"), sort_keys=True
+        )
+        cached = await _backend.get(key)
+    except Exception as e:
+        logger.error(f"Ошибка чтения кэша ответов {namespace}: {e}")
+        metrics.increment(f"statistics_cache.errors.{namespace}")
+        return await build()
+
+    if cached is not None:
+        metrics.increment(f"statistics_cache.hits.{namespace}")
+        return cached
+
+    metrics.increment(f"statistics_cache.misses.{namespace}")
+    value = jsonable_encoder(await build())
+    try:
+        await _backend.set(key, value, settings.STATISTICS_CACHE_TTL_SECONDS if ttl is None else ttl)
+    except Exception as e:
+        logger.error(f"Ошибка записи кэша ответов {namespace}: {e}")
+    return value
+
+
+def cached_response(
+    namespace: str,
+    tags: Callable[..., Iterable[str]],
+    ttl: Optional[float] = None
+):
+    """
+    Декоратор эндпоинта: кэшировать ответ по параметрам запроса.
+
+    Применяется под @router.get(...). Параметры db и current_user в ключ
+    не входят, поэтому проверка прав выполняется до обращения к кэшу.
+
+    Args:
+        namespace: Имя эндпоинта в ключе и метриках
+        tags: Функция от параметров запроса, возвращающая теги ответа
+        ttl: Время жизни (по умолчанию STATISTICS_CACHE_TTL_SECONDS)
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            params = {name: value for name, value in kwargs.items() if name not in UNCACHED_PARAMS}
+            return await get_or_build(
+                namespace, params, tags(**params), lambda: endpoint(*args, **kwargs), ttl
+            )
+        return wrapper
+    return decorator
+
+
+def request_change_tags(before: Optional[RequestState], after: Optional[RequestState]) -> List[str]:
+    """Теги, затронутые изменением заявки"""
+    tags = [GLOBAL_TAG]
+    for state in (before, after):
+        if state is None:
+            continue
+        if state.category_id is not None:
+            tags.append(category_tag(state.category_id))
+        if state.assignee_id is not None:
+            tags.append(employee_tag(state.assignee_id))
+    return tags
+
+
+@subscribe_after_commit
+async def invalidate_request_change(before: Optional[RequestState], after: Optional[RequestState]) -> None:
+    """Инвалидация ответов статистики при изменении заявки"""
+    await invalidate_tags(*request_change_tags(before, after))
@@ -0,0 +1,428 @@
+"""
+Инкрементальные агрегаты статистики
+
+Таблицы request_stats_* (по времени создания), resolution_stats_* (по
+времени завершения, с гистограммой времени выполнения) и rating_stats_daily
+обновляются в той же транзакции, что и изменение заявки (транзакционный
+подписчик request_events) или новая оценка (record_rating). Вклад заявки
+определяется ее текущим состоянием: при изменении статуса, приоритета,
+категории или исполнителя (в том числе при переоткрытии выполненной
+заявки) старый вклад вычитается, новый прибавляется; при удалении -
+только вычитается. Оценка удаляемой заявки вычитается remove_rating.
+
+rebuild_rollups() пересчитывает таблицы из сырых данных, verify_rollups()
+сравнивает их с полным пересчетом (скрипт rebuild_statistics.py, в том
+числе для первичного построения на существующих данных).
+"""
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func, case, and_, delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logging import get_logger
+from app.core.sql import increment_statement, hour_bucket, day_bucket, seconds_between
+from app.models.rating import Rating
+from app.models.request import Request, RequestStatus
+from app.models.statistics_rollup import (
+    RequestStatsHourly,
+    RequestStatsDaily,
+    RatingStatsDaily,
+    ResolutionStatsHourly,
+    ResolutionStatsDaily,
+)
+from app.services.request_events import RequestState, subscribe_transactional
+
+logger = get_logger()
+
+REQUEST_KEY = ("bucket", "category_id", "status", "priority", "employee_id")
+REQUEST_COUNTERS = ("request_count", "resolved_count", "resolution_seconds")
+RATING_KEY = ("bucket", "employee_id", "category_id")
+RATING_COUNTERS = ("rating_count", "rating_sum", "stars_1", "stars_2", "stars_3", "stars_4", "stars_5")
+RESOLUTION_KEY = ("bucket", "category_id", "priority", "employee_id", "duration_bin")
+RESOLUTION_COUNTERS = ("completed_count", "resolution_seconds")
+
+# Таблицы агрегатов: (модель, колонки ключа, счетчики)
+ROLLUP_TABLES = (
+    (RequestStatsHourly, REQUEST_KEY, REQUEST_COUNTERS),
+    (RequestStatsDaily, REQUEST_KEY, REQUEST_COUNTERS),
+    (ResolutionStatsHourly, RESOLUTION_KEY, RESOLUTION_COUNTERS),
+    (ResolutionStatsDaily, RESOLUTION_KEY, RESOLUTION_COUNTERS),
+    (RatingStatsDaily, RATING_KEY, RATING_COUNTERS),
+)
+
+# Верхние границы интервалов гистограммы времени выполнения (секунды).
+# Интервал i: [RESOLUTION_BIN_BOUNDS[i-1], RESOLUTION_BIN_BOUNDS[i]), последний - открытый.
+RESOLUTION_BIN_BOUNDS = tuple(hours * 3600 for hours in (
+    0.25, 0.5, 1, 2, 3, 4, 6, 8, 12, 18, 24, 36, 48, 72, 96, 120, 168, 240, 336, 720
+))
+
+# Допустимое расхождение сумм времени выполнения при проверке (секунды)
+SECONDS_TOLERANCE = 1.0
+
+RollupRows = Dict[Tuple, Dict[str, Any]]
+
+
+def truncate_hour(value: datetime) -> datetime:
+    """Начало часа"""
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def truncate_day(value: datetime) -> datetime:
+    """Начало дня"""
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def duration_bin(seconds: float) -> int:
+    """Номер интервала гистограммы для времени выполнения"""
+    return bisect_right(RESOLUTION_BIN_BOUNDS, seconds)
+
+
+def histogram_percentile(
+    counts: Dict[int, int],
+    seconds: Dict[int, float],
+    quantile: float
+) -> Optional[float]:
+    """
+    Оценка перцентиля времени выполнения по гистограмме (секунды).
+
+    Внутри интервала значение интерполируется линейно; для последнего
+    (открытого) интервала берется среднее время выполнения его заявок.
+
+    Args:
+        counts: Количество заявок по номерам интервалов
+        seconds: Сумма времени выполнения по номерам интервалов
+        quantile: Уровень от 0 до 1 (0.5 - медиана)
+    """
+    total = sum(counts.values())
+    if total <= 0:
+        return None
+
+    rank = quantile * total
+    cumulative = 0
+    for index in sorted(counts):
+        count = counts[index]
+        if count <= 0:
+            continue
+        if cumulative + count >= rank:
+            if index >= len(RESOLUTION_BIN_BOUNDS):
+                return seconds[index] / count
+            lower = RESOLUTION_BIN_BOUNDS[index - 1] if index > 0 else 0.0
+            upper = RESOLUTION_BIN_BOUNDS[index]
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+
+    return None
+
+
+def _request_contribution(state: Optional[RequestState]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Ключ (без периода) и счетчики, которые вносит заявка в агрегаты"""
+    if state is None or state.id is None or state.created_at is None:
+        return None
+
+    resolved = state.status == RequestStatus.COMPLETED and state.completed_at is not None
+    key = {
+        "category_id": state.category_id,
+        "status": state.status,
+        "priority": state.priority,
+        "employee_id": state.assignee_id or 0,
+    }
+    counters = {
+        "request_count": 1,
+        "resolved_count": 1 if resolved else 0,
+        "resolution_seconds": (state.completed_at - state.created_at).total_seconds() if resolved else 0.0,
+    }
+    return key, counters
+
+
+async def _apply_request_contribution(
+    db: AsyncSession,
+    state: Optional[RequestState],
+    sign: int
+) -> None:
+    contribution = _request_contribution(state)
+    if contribution is None:
+        return
+
+    key, counters = contribution
+    deltas = {name: value * sign for name, value in counters.items()}
+    dialect_name = db.bind.dialect.name
+
+    for model, truncate in ((RequestStatsHourly, truncate_hour), (RequestStatsDaily, truncate_day)):
+        await db.execute(increment_statement(
+            dialect_name,
+            model.__table__,
+            {"bucket": truncate(state.created_at), **key},
+            deltas
+        ))
+
+
+def _resolution_contribution(state: Optional[RequestState]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Ключ (без периода) и счетчики выполненной заявки; None если заявка не выполнена"""
+    if (
+        state is None or state.id is None or state.created_at is None
+        or state.status != RequestStatus.COMPLETED or state.completed_at is None
+    ):
+        return None
+
+    seconds = (state.completed_at - state.created_at).total_seconds()
+    key = {
+        "category_id": state.category_id,
+        "priority": state.priority,
+        "employee_id": state.assignee_id or 0,
+        "duration_bin": duration_bin(seconds),
+    }
+    return key, {"completed_count": 1, "resolution_seconds": seconds}
+
+
+async def _apply_resolution_contribution(
+    db: AsyncSession,
+    state: Optional[RequestState],
+    sign: int
+) -> None:
+    contribution = _resolution_contribution(state)
+    if contribution is None:
+        return
+
+    key, counters = contribution
+    deltas = {name: value * sign for name, value in counters.items()}
+    dialect_name = db.bind.dialect.name
+
+    for model, truncate in ((ResolutionStatsHourly, truncate_hour), (ResolutionStatsDaily, truncate_day)):
+        await db.execute(increment_statement(
+            dialect_name,
+            model.__table__,
+            {"bucket": truncate(state.completed_at), **key},
+            deltas
+        ))
+
+
+@subscribe_transactional
+async def update_request_rollups(
+    db: AsyncSession,
+    before: Optional[RequestState],
+    after: Optional[RequestState]
+) -> None:
+    """Перенести вклад заявки из старого состояния в новое"""
+    if _request_contribution(before) != _request_contribution(after):
+        await _apply_request_contribution(db, before, -1)
+        await _apply_request_contribution(db, after, 1)
+
+    if _resolution_contribution(before) != _resolution_contribution(after):
+        await _apply_resolution_contribution(db, before, -1)
+        await _apply_resolution_contribution(db, after, 1)
+
+
+async def record_rating(db: AsyncSession, rating: Rating, category_id: int) -> None:
+    """
+    Учесть новую оценку в агрегатах (до commit, в той же транзакции).
+
+    Args:
+        db: Сессия БД
+        rating: Добавленная в сессию оценка
+        category_id: Категория оцениваемой заявки
+    """
+    await db.flush()
+    await db.refresh(rating, attribute_names=["created_at"])
+    await _apply_rating(db, rating, category_id, 1)
+
+
+async def remove_rating(db: AsyncSession, rating: Rating, category_id: int) -> None:
+    """
+    Вычесть удаляемую оценку из агрегатов (до commit, в той же транзакции).
+
+    Args:
+        db: Сессия БД
+        rating: Загруженная оценка
+        category_id: Категория оцениваемой заявки
+    """
+    await _apply_rating(db, rating, category_id, -1)
+
+
+async def _apply_rating(db: AsyncSession, rating: Rating, category_id: int, sign: int) -> None:
+    deltas = {name: 0 for name in RATING_COUNTERS}
+    deltas.update(rating_count=sign, rating_sum=rating.rating * sign)
+    deltas[f"stars_{rating.rating}"] = sign
+
+    await db.execute(increment_statement(
+        db.bind.dialect.name,
+        RatingStatsDaily.__table__,
+        {"bucket": truncate_day(rating.created_at), "employee_id": rating.employee_id, "category_id": category_id},
+        deltas
+    ))
+
+
+async def compute_rollups_from_source(db: AsyncSession) -> Dict[str, RollupRows]:
+    """
+    Полный пересчет агрегатов из таблиц requests и ratings
+    (по одному GROUP BY запросу на таблицу агрегатов).
+    """
+    resolved = and_(Request.status == RequestStatus.COMPLETED, Request.completed_at.isnot(None))
+    employee_id = func.coalesce(Request.assignee_id, 0)
+    resolution = seconds_between(Request.created_at, Request.completed_at)
+    rows: Dict[str, RollupRows] = {}
+
+    for model, bucket_func in ((RequestStatsHourly, hour_bucket), (RequestStatsDaily, day_bucket)):
+        bucket = bucket_func(Request.created_at)
+        result = await db.execute(
+            select(
+                bucket,
+                Request.category_id,
+                Request.status,
+                Request.priority,
+                employee_id,
+                func.count(Request.id),
+                func.coalesce(func.sum(case((resolved, 1), else_=0)), 0),
+                func.coalesce(func.sum(case((resolved, resolution), else_=0.0)), 0.0),
+            ).group_by(bucket, Request.category_id, Request.status, Request.priority, employee_id)
+        )
+        rows[model.__tablename__] = {
+            tuple(row[:5]): dict(zip(REQUEST_COUNTERS, (int(row[5]), int(row[6]), float(row[7]))))
+            for row in result.all()
+        }
+
+    resolution_bin = case(
+        *((resolution < bound, index) for index, bound in enumerate(RESOLUTION_BIN_BOUNDS)),
+        else_=len(RESOLUTION_BIN_BOUNDS)
+    )
+    for model, bucket_func in ((ResolutionStatsHourly, hour_bucket), (ResolutionStatsDaily, day_bucket)):
+        bucket = bucket_func(Request.completed_at)
+        result = await db.execute(
+            select(
+                bucket,
+                Request.category_id,
+                Request.priority,
+                employee_id,
+                resolution_bin,
+                func.count(Request.id),
+                func.sum(resolution),
+            )
+            .where(resolved)
+            .group_by(bucket, Request.category_id, Request.priority, employee_id, resolution_bin)
+        )
+        rows[model.__tablename__] = {
+            tuple(row[:5]): dict(zip(RESOLUTION_COUNTERS, (int(row[5]), float(row[6]))))
+            for row in result.all()
+        }
+
+    bucket = day_bucket(Rating.created_at)
+    stars = [func.coalesce(func.sum(case((Rating.rating == value, 1), else_=0)), 0) for value in range(1, 6)]
+    result = await db.execute(
+        select(bucket, Rating.employee_id, Request.category_id, func.count(Rating.id), func.sum(Rating.rating), *stars)
+        .join(Request, Request.id == Rating.request_id)
+        .group_by(bucket, Rating.employee_id, Request.category_id)
+    )
+    rows[RatingStatsDaily.__tablename__] = {
+        tuple(row[:3]): dict(zip(RATING_COUNTERS, (int(value) for value in row[3:])))
+        for row in result.all()
+    }
+
+    return rows
+
+
+async def load_rollups(db: AsyncSession) -> Dict[str, RollupRows]:
+    """Текущее содержимое таблиц агрегатов (без нулевых строк)"""
+    rows: Dict[str, RollupRows] = {}
+
+    for model, key, counters in ROLLUP_TABLES:
+        count_column = getattr(model, counters[0])
+        result = await db.execute(
+            select(*(getattr(model, name) for name in key + counters)).where(count_column != 0)
+        )
+        rows[model.__tablename__] = {
+            tuple(row[:len(key)]): dict(zip(counters, row[len(key):]))
+            for row in result.all()
+        }
+
+    return rows
+
+
+async def rebuild_rollups(db: AsyncSession) -> Dict[str, int]:
+    """
+    Перестроить таблицы агрегатов из сырых данных.
+
+    Returns:
+        Количество строк в каждой таблице агрегатов
+    """
+    source = await compute_rollups_from_source(db)
+
+    for model, key, _ in ROLLUP_TABLES:
+        await db.execute(delete(model))
+        values = [
+            {**dict(zip(key, row_key)), **counters}
+            for row_key, counters in source[model.__tablename__].items()
+        ]
+        if values:
+            await db.execute(insert(model), values)
+
+    await db.commit()
+
+    counts = {table: len(rows) for table, rows in source.items()}
+    logger.info(f"Агрегаты статистики перестроены: {counts}")
+    return counts
+
+
+def _counters_differ(expected: Dict[str, Any], actual: Dict[str, Any]) -> bool:
+    for name, value in expected.items():
+        if name == "resolution_seconds":
+            if abs(float(value) - float(actual.get(name, 0.0))) > SECONDS_TOLERANCE:
+                return True
+        elif int(value) != int(actual.get(name, 0)):
+            return True
+    return False
+
+
+async def verify_rollups(db: AsyncSession) -> List[str]:
+    """
+    Сравнить таблицы агрегатов с полным пересчетом.
+
+    Returns:
+        Список описаний расхождений (пустой, если агрегаты верны)
+    """
+    expected = await compute_rollups_from_source(db)
+    actual = await load_rollups(db)
+    differences = []
+
+    for model, _, counters in ROLLUP_TABLES:
+        table = model.__tablename__
+        expected_rows, actual_rows = expected[table], actual.get(table, {})
+        zero = {name: 0 for name in counters}
+
+        for key in expected_rows.keys() | actual_rows.keys():
+            expected_counters = expected_rows.get(key, zero)
+            actual_counters = actual_rows.get(key, zero)
+            if _counters_differ(expected_counters, actual_counters):
+                differences.append(f"{table} {key}: ожидалось {expected_counters}, в агрегате {actual_counters}")
+
+    return differences
+
+
+async def check_rollups_built(db: AsyncSession) -> bool:
+    """
+    Проверка при старте: построены ли агрегаты для уже существующих данных.
+
+    Сами агрегаты при старте не строятся: каждый процесс (gunicorn worker)
+    увидел бы пустые таблицы и перестраивал бы их одновременно с другими
+    и с инкрементами обслуживаемых запросов. Первичное построение -
+    скрипт rebuild_statistics.py.
+
+    Returns:
+        True, если агрегаты построены или данных еще нет
+    """
+    async def exists(query) -> bool:
+        return (await db.execute(query.limit(1))).first() is not None
+
+    missing_requests = not await exists(select(RequestStatsDaily.id)) and await exists(select(Request.id))
+    missing_resolutions = (
+        not await exists(select(ResolutionStatsDaily.id))
+        and await exists(select(Request.id).where(Request.status == RequestStatus.COMPLETED))
+    )
+
+    if missing_requests or missing_resolutions:
+        logger.warning(
+            "Таблицы агрегатов статистики пусты, а заявки уже есть - статистика неполная. "
+            "Постройте агрегаты: python rebuild_statistics.py"
+        )
+        return False
+    return True
@@ -0,0 +1,387 @@
+"""
+Сервис статистики по заявкам и сотрудникам
+
+Эндпоинты читают инкрементальные агрегаты (app/services/statistics_rollup.py).
+compute_overview() считает те же показатели по сырым таблицам
+сгруппированными SQL-агрегатами и служит эталоном для сверки.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import select, func, case, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.sql import seconds_between
+from app.models.category import Category
+from app.models.employee import Employee
+from app.models.request import Request, RequestStatus, RequestPriority
+from app.models.statistics_rollup import (
+    RequestStatsHourly,
+    RequestStatsDaily,
+    RatingStatsDaily,
+    ResolutionStatsHourly,
+    ResolutionStatsDaily,
+)
+from app.schemas.statistics import TimeseriesGranularity, PriorityBreakdown
+from app.services.statistics_rollup import truncate_hour, truncate_day, histogram_percentile
+
+# Период для показателя "недавние заявки"
+RECENT_DAYS = 30
+
+# Максимум интервалов во временном ряду (год по дням помещается)
+MAX_TIMESERIES_POINTS = 800
+
+# Период временного ряда по умолчанию
+DEFAULT_TIMESERIES_SPAN = {
+    TimeseriesGranularity.HOUR: timedelta(hours=48),
+    TimeseriesGranularity.DAY: timedelta(days=30),
+    TimeseriesGranularity.WEEK: timedelta(weeks=26),
+}
+
+TIMESERIES_STEP = {
+    TimeseriesGranularity.HOUR: timedelta(hours=1),
+    TimeseriesGranularity.DAY: timedelta(days=1),
+    TimeseriesGranularity.WEEK: timedelta(weeks=1),
+}
+
+
+def count_where(condition):
+    """Условный COUNT: SUM(CASE WHEN condition THEN 1 ELSE 0 END)"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+async def compute_overview(db: AsyncSession) -> Dict[str, Any]:
+    """
+    Общая статистика по сырым таблицам (4 запроса при любом объеме данных).
+    Эталон для сверки с get_overview().
+    """
+    recent_since = datetime.utcnow() - timedelta(days=RECENT_DAYS)
+    completed = and_(Request.status == RequestStatus.COMPLETED, Request.completed_at.isnot(None))
+
+    # Заявки: всего, недавние, по статусам и среднее время выполнения - один проход
+    status_columns = [count_where(Request.status == status).label(status.value) for status in RequestStatus]
+    result = await db.execute(
+        select(
+            func.count(Request.id).label("total"),
+            count_where(Request.created_at >= recent_since).label("recent"),
+            func.avg(case((completed, seconds_between(Request.created_at, Request.completed_at)))).label(
+                "avg_completion_seconds"
+            ),
+            *status_columns
+        )
+    )
+    requests_row = result.one()._mapping
+
+    # Распределение заявок по категориям
+    categories_result = await db.execute(
+        select(Category.name, func.count(Request.id))
+        .join(Request, Request.category_id == Category.id)
+        .group_by(Category.name)
+    )
+
+    avg_completion_seconds = requests_row["avg_completion_seconds"]
+
+    return {
+        "total_requests": requests_row["total"],
+        "recent_requests_30_days": int(requests_row["recent"]),
+        "status_distribution": {status.value: int(requests_row[status.value]) for status in RequestStatus},
+        "average_completion_time_hours": round(float(avg_completion_seconds) / 3600, 2)
+        if avg_completion_seconds is not None else 0.0,
+        "requests_by_category": {name: count for name, count in categories_result.all()},
+        **await _employee_overview(db)
+    }
+
+
+async def _employee_overview(db: AsyncSession) -> Dict[str, Any]:
+    """Количество сотрудников, средний рейтинг и топ-5 (2 запроса)"""
+    result = await db.execute(select(func.count(Employee.id), func.avg(Employee.average_rating)))
+    total_employees, avg_rating = result.one()
+
+    # Топ-5 лучших сотрудников по рейтингу
+    top_result = await db.execute(
+        select(Employee.id, Employee.first_name, Employee.last_name, Employee.average_rating)
+        .order_by(Employee.average_rating.desc())
+        .limit(5)
+    )
+
+    return {
+        "total_employees": total_employees,
+        "average_employee_rating": round(float(avg_rating or 0.0), 2),
+        "top_employees": [
+            {
+                "id": emp_id,
+                "name": f"{first_name} {last_name}",
+                "rating": rating
+            }
+            for emp_id, first_name, last_name, rating in top_result.all()
+        ]
+    }
+
+
+async def get_overview(db: AsyncSession) -> Dict[str, Any]:
+    """
+    Общая статистика по таблицам агрегатов (5 запросов при любом объеме данных).
+
+    "Недавние" заявки: полные часы из почасовых агрегатов плюс точный
+    подсчет по requests за неполный первый час периода.
+    """
+    recent_since = datetime.utcnow() - timedelta(days=RECENT_DAYS)
+    first_full_hour = truncate_hour(recent_since)
+    if first_full_hour < recent_since:
+        first_full_hour += timedelta(hours=1)
+
+    # Статусы, итоги и время выполнения - из дневных агрегатов
+    result = await db.execute(
+        select(
+            RequestStatsDaily.status,
+            func.sum(RequestStatsDaily.request_count),
+            func.sum(RequestStatsDaily.resolved_count),
+            func.sum(RequestStatsDaily.resolution_seconds),
+        ).group_by(RequestStatsDaily.status)
+    )
+    status_distribution = {status.value: 0 for status in RequestStatus}
+    resolved_count, resolution_seconds = 0, 0.0
+    for status, count, resolved, seconds in result.all():
+        status_distribution[status.value] = int(count or 0)
+        resolved_count += int(resolved or 0)
+        resolution_seconds += float(seconds or 0.0)
+
+    recent_hours = (
+        select(func.coalesce(func.sum(RequestStatsHourly.request_count), 0))
+        .where(RequestStatsHourly.bucket >= first_full_hour)
+        .scalar_subquery()
+    )
+    recent_edge = (
+        select(func.count(Request.id))
+        .where(and_(Request.created_at >= recent_since, Request.created_at < first_full_hour))
+        .scalar_subquery()
+    )
+    recent_hours_count, recent_edge_count = (await db.execute(select(recent_hours, recent_edge))).one()
+
+    categories_result = await db.execute(
+        select(Category.name, func.sum(RequestStatsDaily.request_count))
+        .join(RequestStatsDaily, RequestStatsDaily.category_id == Category.id)
+        .group_by(Category.name)
+        .having(func.sum(RequestStatsDaily.request_count) > 0)
+    )
+
+    return {
+        "total_requests": sum(status_distribution.values()),
+        "recent_requests_30_days": int(recent_hours_count) + int(recent_edge_count),
+        "status_distribution": status_distribution,
+        "average_completion_time_hours": round(resolution_seconds / resolved_count / 3600, 2)
+        if resolved_count else 0.0,
+        "requests_by_category": {name: int(count) for name, count in categories_result.all()},
+        **await _employee_overview(db)
+    }
+
+
+async def get_employees_statistics(db: AsyncSession, employees: Sequence[Employee]) -> List[Dict[str, Any]]:
+    """
+    Статистика сотрудников по таблицам агрегатов.
+
+    Два сгруппированных запроса (заявки по статусам и гистограмма оценок)
+    при любом количестве сотрудников.
+    """
+    if not employees:
+        return []
+
+    employee_ids = [employee.id for employee in employees]
+
+    result = await db.execute(
+        select(RequestStatsDaily.employee_id, RequestStatsDaily.status, func.sum(RequestStatsDaily.request_count))
+        .where(RequestStatsDaily.employee_id.in_(employee_ids))
+        .group_by(RequestStatsDaily.employee_id, RequestStatsDaily.status)
+    )
+    by_status = defaultdict(dict)
+    for employee_id, status, count in result.all():
+        by_status[employee_id][status] = int(count or 0)
+
+    stars = [getattr(RatingStatsDaily, f"stars_{value}") for value in range(1, 6)]
+    result = await db.execute(
+        select(
+            RatingStatsDaily.employee_id,
+            func.sum(RatingStatsDaily.rating_count),
+            *(func.sum(column) for column in stars)
+        )
+        .where(RatingStatsDaily.employee_id.in_(employee_ids))
+        .group_by(RatingStatsDaily.employee_id)
+    )
+    ratings = {employee_id: (total, distribution) for employee_id, total, *distribution in result.all()}
+
+    statistics = []
+    for employee in employees:
+        counts = by_status.get(employee.id, {})
+        total_ratings, distribution = ratings.get(employee.id, (0, [0] * 5))
+
+        total_count = sum(counts.values())
+        completed_count = counts.get(RequestStatus.COMPLETED, 0)
+        active_count = counts.get(RequestStatus.ASSIGNED, 0) + counts.get(RequestStatus.IN_PROGRESS, 0)
+
+        statistics.append({
+            "employee_id": employee.id,
+            "name": f"{employee.first_name} {employee.last_name}",
+            "average_rating": employee.average_rating,
+            "total_requests": total_count,
+            "completed_requests": completed_count,
+            "active_requests": active_count,
+            "completion_rate": round((completed_count / total_count * 100) if total_count > 0 else 0, 2),
+            "rating_distribution": {value: int(count or 0) for value, count in zip(range(1, 6), distribution)},
+            "total_ratings": int(total_ratings or 0)
+        })
+
+    return statistics
+
+
+async def get_priority_distribution(
+    db: AsyncSession,
+    breakdown: Optional[PriorityBreakdown] = None
+) -> Dict[str, Any]:
+    """
+    Распределение заявок по приоритетам из дневных агрегатов (1 запрос).
+
+    Args:
+        db: Сессия БД
+        breakdown: Дополнительный разрез по статусу или категории
+    """
+    if breakdown == PriorityBreakdown.CATEGORY:
+        dimension = Category.name
+        query = select(RequestStatsDaily.priority, dimension, func.sum(RequestStatsDaily.request_count)).join(
+            Category, Category.id == RequestStatsDaily.category_id
+        )
+    else:
+        # Без разреза группировка по статусу тоже дешевая: строк не больше 3 x 5
+        dimension = RequestStatsDaily.status
+        query = select(RequestStatsDaily.priority, dimension, func.sum(RequestStatsDaily.request_count))
+
+    result = await db.execute(query.group_by(RequestStatsDaily.priority, dimension))
+
+    totals = {priority.value: 0 for priority in RequestPriority}
+    cells = {priority.value: {} for priority in RequestPriority}
+    for priority, value, count in result.all():
+        count = int(count or 0)
+        if not count:
+            continue
+        key = value.value if isinstance(value, RequestStatus) else value
+        totals[priority.value] += count
+        cells[priority.value][key] = count
+
+    distribution: Dict[str, Any] = {"total": totals}
+    if breakdown is not None:
+        distribution[f"by_{breakdown.value}"] = cells
+    return distribution
+
+
+def truncate_to_granularity(value: datetime, granularity: TimeseriesGranularity) -> datetime:
+    """Начало интервала временного ряда (неделя начинается с понедельника)"""
+    if granularity == TimeseriesGranularity.HOUR:
+        return truncate_hour(value)
+    day = truncate_day(value)
+    if granularity == TimeseriesGranularity.WEEK:
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+async def compute_timeseries(
+    db: AsyncSession,
+    granularity: TimeseriesGranularity,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    category_id: Optional[int] = None,
+    priority: Optional[RequestPriority] = None,
+    organization_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Временной ряд по таблицам агрегатов (2 запроса).
+
+    Поступление заявок считается по времени создания, выполнение и
+    медиана/p90 времени выполнения - по времени завершения. Почасовой ряд
+    читает почасовые агрегаты, дневной и недельный - дневные, поэтому
+    число прочитанных строк зависит от длины периода, а не от числа заявок.
+    Фильтр по организации учитывает только заявки, назначенные на ее сотрудников.
+
+    Raises:
+        ValueError: Некорректный период или слишком много интервалов
+    """
+    date_to = date_to or datetime.utcnow()
+    date_from = date_from or date_to - DEFAULT_TIMESERIES_SPAN[granularity]
+    if date_from >= date_to:
+        raise ValueError("Начало периода должно быть раньше конца")
+
+    step = TIMESERIES_STEP[granularity]
+    start = truncate_to_granularity(date_from, granularity)
+    points_count = -(-(date_to - start) // step)
+    if points_count > MAX_TIMESERIES_POINTS:
+        raise ValueError(
+            f"Слишком много интервалов ({points_count}), максимум {MAX_TIMESERIES_POINTS} - "
+            f"сократите период или увеличьте интервал"
+        )
+    end = start + step * points_count
+
+    if granularity == TimeseriesGranularity.HOUR:
+        request_model, resolution_model = RequestStatsHourly, ResolutionStatsHourly
+    else:
+        request_model, resolution_model = RequestStatsDaily, ResolutionStatsDaily
+
+    def filters(model):
+        conditions = [model.bucket >= start, model.bucket < end]
+        if category_id is not None:
+            conditions.append(model.category_id == category_id)
+        if priority is not None:
+            conditions.append(model.priority == priority)
+        if organization_id is not None:
+            conditions.append(model.employee_id.in_(
+                select(Employee.id).where(Employee.organization_id == organization_id)
+            ))
+        return and_(*conditions)
+
+    inflow_result = await db.execute(
+        select(request_model.bucket, func.sum(request_model.request_count))
+        .where(filters(request_model))
+        .group_by(request_model.bucket)
+    )
+    resolution_result = await db.execute(
+        select(
+            resolution_model.bucket,
+            resolution_model.duration_bin,
+            func.sum(resolution_model.completed_count),
+            func.sum(resolution_model.resolution_seconds),
+        )
+        .where(filters(resolution_model))
+        .group_by(resolution_model.bucket, resolution_model.duration_bin)
+    )
+
+    inflow = defaultdict(int)
+    for bucket, count in inflow_result.all():
+        inflow[truncate_to_granularity(bucket, granularity)] += int(count or 0)
+
+    bin_counts = defaultdict(lambda: defaultdict(int))
+    bin_seconds = defaultdict(lambda: defaultdict(float))
+    for bucket, bin_index, count, seconds in resolution_result.all():
+        point = truncate_to_granularity(bucket, granularity)
+        bin_counts[point][bin_index] += int(count or 0)
+        bin_seconds[point][bin_index] += float(seconds or 0.0)
+
+    def hours(seconds: Optional[float]) -> Optional[float]:
+        return round(seconds / 3600, 2) if seconds is not None else None
+
+    points = []
+    for index in range(points_count):
+        bucket = start + step * index
+        counts = bin_counts.get(bucket, {})
+        seconds = bin_seconds.get(bucket, {})
+        points.append({
+            "bucket": bucket,
+            "inflow": inflow.get(bucket, 0),
+            "completed": sum(counts.values()),
+            "median_resolution_hours": hours(histogram_percentile(counts, seconds, 0.5)),
+            "p90_resolution_hours": hours(histogram_percentile(counts, seconds, 0.9)),
+        })
+
+    return {
+        "granularity": granularity,
+        "date_from": start,
+        "date_to": end,
+        "points": points,
+    }
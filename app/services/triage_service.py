@@ -0,0 +1,519 @@
+"""
+Фоновая AI-обработка заявок (triage)
+
+Заявка сохраняется в HTTP-запросе сразу, а анализ описания, оценка фото,
+рекомендация и автоназначение выполняются воркером по очереди задач
+в таблице triage_jobs. Задачи переживают перезапуск процесса и
+повторяются с экспоненциальной задержкой.
+
+Ошибка любого этапа (в том числе недоступность OpenAI) на неполной
+попытке завершает ее ошибкой, и задача повторяется. Fallback этапов
+(средний приоритет, стандартная рекомендация, наименее загруженный
+сотрудник) применяются только на последней попытке.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple, Optional
+
+from sqlalchemy import select, update, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import ColumnElement
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logging import get_logger
+from app.models.category import Category
+from app.models.request import Request, RequestStatus, RequestPriority
+from app.models.triage_job import TriageJob, TriageJobStatus
+from app.services.openai_service import (
+    analyze_problem_description,
+    analyze_image_priority,
+    generate_user_recommendation,
+    default_user_recommendation
+)
+from app.services.assignment_engine import AssignmentContext, get_assignment_engine
+from app.services.request_events import snapshot, commit_request_change
+from app.services.workload_index import workload_index
+from app.services.workload_service import get_workload_snapshot
+
+logger = get_logger()
+
+# Событие для пробуждения воркера сразу после постановки задачи
+_wakeup = asyncio.Event()
+
+
+async def enqueue_triage(db: AsyncSession, request_id: int) -> TriageJob:
+    """
+    Поставить заявку в очередь AI-обработки.
+    Задача фиксируется в той же транзакции, что и заявка.
+    """
+    job = TriageJob(
+        request_id=request_id,
+        status=TriageJobStatus.PENDING,
+        attempts=0,
+        next_run_at=datetime.utcnow()
+    )
+    db.add(job)
+    return job
+
+
+def wake_triage_worker() -> None:
+    """Разбудить воркер (вызывать после commit)"""
+    _wakeup.set()
+
+
+class TriageStageError(Exception):
+    """Этап AI-обработки не выполнен, а fallback не разрешены (попытка будет повторена)"""
+
+    def __init__(self, stage: str, reason: str):
+        super().__init__(f"Этап AI-обработки '{stage}' не выполнен: {reason}")
+        self.stage = stage
+
+
+class TriageStage:
+    """
+    Этап AI-обработки в графе зависимостей.
+
+    func получает результаты этапов из deps именованными аргументами.
+    При ошибке или превышении timeout вместо результата используется
+    fallback(**deps) - обработка продолжается с частичным результатом.
+    Если fallback не разрешены, ошибка этапа прерывает весь граф.
+    """
+
+    def __init__(self, name: str, func, deps: tuple = (), timeout: Optional[float] = None, fallback=None):
+        self.name = name
+        self.func = func
+        self.deps = deps
+        self.timeout = timeout
+        self.fallback = fallback
+
+
+async def run_stage_graph(
+    stages: list[TriageStage],
+    use_fallbacks: bool = True
+) -> tuple[dict[str, Any], set[str]]:
+    """
+    Выполнить граф этапов: независимые этапы идут параллельно,
+    каждый этап ждет только свои зависимости. Общее время
+    ограничено критическим путем, а не суммой всех этапов.
+
+    Этапы должны быть перечислены в топологическом порядке.
+
+    Args:
+        stages: Этапы графа
+        use_fallbacks: False - первая ошибка этапа отменяет остальные
+            и поднимает TriageStageError
+
+    Returns:
+        (результаты этапов по имени, имена этапов, завершившихся fallback)
+    """
+    tasks: dict[str, asyncio.Task] = {}
+    degraded: set[str] = set()
+
+    async def run(stage: TriageStage) -> Any:
+        dep_values = await asyncio.gather(*(tasks[dep] for dep in stage.deps))
+        kwargs = dict(zip(stage.deps, dep_values))
+        try:
+            return await asyncio.wait_for(stage.func(**kwargs), timeout=stage.timeout)
+        except Exception as e:
+            reason = "таймаут" if isinstance(e, asyncio.TimeoutError) else str(e)
+            if not use_fallbacks:
+                raise TriageStageError(stage.name, reason) from e
+            logger.warning(f"Этап AI-обработки '{stage.name}' не выполнен ({reason}), используем fallback")
+            degraded.add(stage.name)
+            return stage.fallback(**kwargs) if stage.fallback else None
+
+    for stage in stages:
+        tasks[stage.name] = asyncio.create_task(run(stage))
+
+    try:
+        values = await asyncio.gather(*tasks.values())
+    except BaseException:
+        # Остальные этапы не нужны: попытка все равно будет повторена
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    return dict(zip(tasks.keys(), values)), degraded
+
+
+def _least_loaded(candidates: list[dict]) -> Optional[int]:
+    """Сотрудник с наименьшей загрузкой и наибольшим рейтингом"""
+    if not candidates:
+        return None
+    return min(candidates, key=lambda x: (x["active_requests"], -x["rating"]))["id"]
+
+
+class TriageInput(NamedTuple):
+    """Данные заявки для AI-обработки (снимок до этапов OpenAI)"""
+    request_id: int
+    description: str
+    category_id: int
+    category_name: str
+    photo_url: str
+    problem_type: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
+    priority: RequestPriority
+    needs_assignment: bool
+
+
+class TriageResult(NamedTuple):
+    """Результат AI-обработки для записи в заявку"""
+    ai_analysis: str
+    ai_category: str
+    priority: RequestPriority
+    ai_recommendation: str
+    assignee_id: Optional[int]
+    degraded: tuple[str, ...] = ()  # Этапы, результат которых заменен fallback
+
+
+async def load_triage_input(db: AsyncSession, request_id: int) -> Optional[TriageInput]:
+    """Данные заявки для AI-обработки (None, если заявка удалена)"""
+    result = await db.execute(
+        select(Request, Category.name)
+        .join(Category, Category.id == Request.category_id)
+        .where(Request.id == request_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        return None
+
+    request_obj, category_name = row
+    return TriageInput(
+        request_id=request_obj.id,
+        description=request_obj.description,
+        category_id=request_obj.category_id,
+        category_name=category_name,
+        photo_url=request_obj.photo_url,
+        problem_type=request_obj.problem_type,
+        latitude=request_obj.latitude,
+        longitude=request_obj.longitude,
+        priority=request_obj.priority,
+        needs_assignment=request_obj.status == RequestStatus.PENDING and not request_obj.assignee_id
+    )
+
+
+async def triage_request(triage_input: TriageInput, use_fallbacks: bool = True) -> TriageResult:
+    """
+    AI-обработка заявки: анализ описания, приоритет по фото,
+    рекомендация пользователю и выбор сотрудника для назначения.
+
+    Граф этапов:
+        describe ──> priority ──┬──> recommendation
+        candidates ─────────────┴──> assign
+
+    Этапы идут без открытой сессии БД (OpenAI отвечает до десятков
+    секунд); результат записывается в заявку apply_triage_result().
+
+    Args:
+        triage_input: Данные заявки
+        use_fallbacks: False - ошибка этапа поднимает TriageStageError
+            (неполная попытка задачи), True - этап заменяется fallback
+    """
+    description = triage_input.description
+    category_name = triage_input.category_name
+    category_id = triage_input.category_id
+    full_photo_path = os.path.join(settings.UPLOAD_DIR, triage_input.photo_url)
+
+    async def describe():
+        return await analyze_problem_description(description=description, category_name=category_name, strict=True)
+
+    async def priority(describe):
+        return await analyze_image_priority(
+            image_path=full_photo_path,
+            structured_description=describe,
+            category_name=category_name,
+            strict=True
+        )
+
+    async def recommendation(priority):
+        return await generate_user_recommendation(
+            description=description,
+            category_name=category_name,
+            priority=priority,
+            strict=True
+        )
+
+    async def candidates():
+        if not triage_input.needs_assignment:
+            return []
+        # Индекс загрузки процесса избавляет от запроса к БД
+        if workload_index.ready:
+            return workload_index.candidates(category_id)
+        async with AsyncSessionLocal() as session:
+            return await get_workload_snapshot(session, category_id=category_id)
+
+    async def assign(priority, candidates):
+        if not candidates:
+            return None
+        context = AssignmentContext(
+            description=description,
+            category_name=category_name,
+            priority=priority,
+            problem_type=triage_input.problem_type,
+            latitude=triage_input.latitude,
+            longitude=triage_input.longitude
+        )
+        return await get_assignment_engine().select(context, candidates)
+
+    stage_timeout = settings.TRIAGE_STAGE_TIMEOUT_SECONDS
+    results, degraded = await run_stage_graph([
+        TriageStage("describe", describe, timeout=stage_timeout,
+                    fallback=lambda: description),
+        TriageStage("candidates", candidates, timeout=stage_timeout,
+                    fallback=lambda: []),
+        TriageStage("priority", priority, deps=("describe",), timeout=settings.TRIAGE_VISION_TIMEOUT_SECONDS,
+                    fallback=lambda describe: "medium"),
+        TriageStage("recommendation", recommendation, deps=("priority",), timeout=stage_timeout,
+                    fallback=lambda priority: default_user_recommendation(priority)),
+        TriageStage("assign", assign, deps=("priority", "candidates"), timeout=stage_timeout,
+                    fallback=lambda priority, candidates: _least_loaded(candidates)),
+    ], use_fallbacks=use_fallbacks)
+
+    # Преобразуем строку приоритета в enum
+    priority_mapping = {
+        "low": RequestPriority.LOW,
+        "medium": RequestPriority.MEDIUM,
+        "high": RequestPriority.HIGH
+    }
+    return TriageResult(
+        ai_analysis=results["describe"],
+        ai_category=category_name,
+        priority=priority_mapping.get(results["priority"].lower(), RequestPriority.MEDIUM),
+        ai_recommendation=results["recommendation"],
+        assignee_id=results["assign"] if triage_input.needs_assignment else None,
+        degraded=tuple(sorted(degraded))
+    )
+
+
+async def apply_triage_result(db: AsyncSession, triage_input: TriageInput, triage_result: TriageResult) -> None:
+    """
+    Записать результат AI-обработки в заявку и зафиксировать транзакцию.
+
+    Заявка перечитывается с блокировкой строки: пока шли этапы OpenAI,
+    админ мог назначить, закрыть заявку или изменить приоритет - такие
+    изменения не перетираются.
+    """
+    result = await db.execute(select(Request).where(Request.id == triage_input.request_id).with_for_update())
+    request_obj = result.scalar_one_or_none()
+    if request_obj is None:
+        await db.commit()
+        return
+
+    before = snapshot(request_obj)
+
+    # Сохраняем AI анализ (внутреннее поле, не показывается пользователю напрямую)
+    request_obj.ai_analysis = triage_result.ai_analysis
+    request_obj.ai_category = triage_result.ai_category
+    request_obj.ai_recommendation = triage_result.ai_recommendation
+
+    if request_obj.priority == triage_input.priority:
+        request_obj.priority = triage_result.priority
+
+    selected_employee_id = triage_result.assignee_id
+    if selected_employee_id:
+        if request_obj.status == RequestStatus.PENDING and not request_obj.assignee_id:
+            request_obj.assignee_id = selected_employee_id
+            request_obj.status = RequestStatus.ASSIGNED
+            logger.info(f"Заявка {request_obj.id} автоматически назначена на сотрудника {selected_employee_id}")
+        else:
+            logger.info(f"Заявка {request_obj.id} изменена во время AI-обработки, автоназначение пропущено")
+
+    await commit_request_change(db, before, request_obj)
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    """Экспоненциальная задержка перед повтором"""
+    return timedelta(seconds=settings.TRIAGE_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)))
+
+
+def _owned_by(job_id: int, attempt: int) -> ColumnElement:
+    """Задача все еще принадлежит захватившему ее воркеру (номер попытки - метка захвата)"""
+    return and_(
+        TriageJob.id == job_id,
+        TriageJob.status == TriageJobStatus.RUNNING,
+        TriageJob.attempts == attempt
+    )
+
+
+async def _claim_due_jobs(limit: int) -> list[tuple[int, int]]:
+    """
+    Забрать готовые к выполнению задачи.
+    Задача захватывается условным UPDATE, поэтому несколько воркеров
+    (например, gunicorn workers) не возьмут одну и ту же задачу.
+    Задачи в статусе running с истекшей блокировкой считаются брошенными
+    упавшим воркером и забираются повторно, пока не исчерпаны попытки.
+
+    Returns:
+        Пары (ID задачи, номер попытки)
+    """
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=settings.TRIAGE_LOCK_TIMEOUT_SECONDS)
+    stale = and_(TriageJob.status == TriageJobStatus.RUNNING, TriageJob.locked_at < stale_before)
+
+    async with AsyncSessionLocal() as session:
+        # Задача, на которой процесс каждый раз падает, не повторяется бесконечно
+        exhausted = await session.execute(
+            update(TriageJob)
+            .where(stale, TriageJob.attempts >= settings.TRIAGE_MAX_ATTEMPTS)
+            .values(status=TriageJobStatus.FAILED, locked_at=None, last_error="Воркер не завершил обработку")
+            .execution_options(synchronize_session=False)
+        )
+        if exhausted.rowcount:
+            logger.error(f"AI-обработка {exhausted.rowcount} брошенных задач окончательно не удалась")
+
+        result = await session.execute(
+            select(TriageJob.id, TriageJob.status, TriageJob.attempts)
+            .where(
+                or_(
+                    and_(TriageJob.status == TriageJobStatus.PENDING, TriageJob.next_run_at <= now),
+                    and_(stale, TriageJob.attempts < settings.TRIAGE_MAX_ATTEMPTS)
+                )
+            )
+            .order_by(TriageJob.next_run_at)
+            .limit(limit)
+        )
+        candidates = result.all()
+
+        claimed = []
+        for job_id, job_status, attempts in candidates:
+            claim = await session.execute(
+                update(TriageJob)
+                .where(
+                    and_(
+                        TriageJob.id == job_id,
+                        TriageJob.status == job_status,
+                        TriageJob.attempts == attempts
+                    )
+                )
+                .values(
+                    status=TriageJobStatus.RUNNING,
+                    locked_at=now,
+                    attempts=attempts + 1
+                )
+            )
+            if claim.rowcount == 1:
+                claimed.append((job_id, attempts + 1))
+
+        await session.commit()
+
+    return claimed
+
+
+async def process_triage_job(job_id: int, attempt: int) -> None:
+    """
+    Выполнить одну задачу AI-обработки.
+
+    Соединение с БД берется только на чтение заявки и на запись
+    результата; этапы OpenAI идут без открытой транзакции.
+
+    Args:
+        job_id: ID задачи
+        attempt: Номер попытки, под которым задача захвачена
+    """
+    try:
+        async with AsyncSessionLocal() as session:
+            job = (await session.execute(select(TriageJob).where(TriageJob.id == job_id))).scalar_one_or_none()
+            if job is None:
+                return
+            request_id = job.request_id
+            triage_input = await load_triage_input(session, request_id)
+
+        # Fallback этапов - только на последней попытке, до нее ошибка OpenAI ведет к повтору
+        final_attempt = attempt >= settings.TRIAGE_MAX_ATTEMPTS
+        triage_result = await triage_request(triage_input, use_fallbacks=final_attempt) \
+            if triage_input is not None else None
+
+        degraded = triage_result.degraded if triage_result is not None else ()
+
+        async with AsyncSessionLocal() as session:
+            # Частичный результат (fallback этапов) виден операторам в triage_jobs.degraded_stages
+            done = await session.execute(
+                update(TriageJob)
+                .where(_owned_by(job_id, attempt))
+                .values(
+                    status=TriageJobStatus.DONE,
+                    locked_at=None,
+                    last_error=None,
+                    degraded_stages=",".join(degraded) or None
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if done.rowcount != 1:
+                # Задачу забрал другой воркер как брошенную - результат запишет он
+                await session.rollback()
+                logger.warning(f"AI-обработка заявки #{request_id}: задача больше не принадлежит воркеру, результат отброшен")
+                return
+
+            if triage_result is not None:
+                await apply_triage_result(session, triage_input, triage_result)
+            else:
+                await session.commit()
+
+        if degraded:
+            logger.warning(f"AI-обработка заявки #{request_id} завершена частично, fallback для этапов: {list(degraded)}")
+        else:
+            logger.info(f"AI-обработка заявки #{request_id} завершена")
+
+    except Exception as e:
+        await _record_failure(job_id, attempt, e)
+
+
+async def _record_failure(job_id: int, attempt: int, error: Exception) -> None:
+    """Зафиксировать ошибку задачи и запланировать повтор с задержкой"""
+    async with AsyncSessionLocal() as session:
+        job = (await session.execute(
+            select(TriageJob).where(_owned_by(job_id, attempt))
+        )).scalar_one_or_none()
+        if job is None:
+            return
+
+        job.last_error = str(error)[:2000]
+        job.locked_at = None
+
+        if job.attempts >= settings.TRIAGE_MAX_ATTEMPTS:
+            job.status = TriageJobStatus.FAILED
+            logger.error(f"AI-обработка заявки #{job.request_id} окончательно не удалась: {error}")
+        else:
+            job.status = TriageJobStatus.PENDING
+            job.next_run_at = datetime.utcnow() + _retry_delay(job.attempts)
+            logger.warning(
+                f"Ошибка AI-обработки заявки #{job.request_id} (попытка {job.attempts}), "
+                f"повтор в {job.next_run_at}: {error}"
+            )
+
+        await session.commit()
+
+
+async def run_triage_worker(stop_event: Optional[asyncio.Event] = None) -> None:
+    """
+    Цикл воркера AI-обработки.
+    Опрашивает очередь с интервалом TRIAGE_POLL_INTERVAL_SECONDS
+    либо сразу после wake_triage_worker().
+    """
+    stop_event = stop_event or asyncio.Event()
+    logger.info("Воркер AI-обработки заявок запущен")
+
+    while not stop_event.is_set():
+        _wakeup.clear()
+        try:
+            job_ids = await _claim_due_jobs(settings.TRIAGE_BATCH_SIZE)
+            # Задачи пачки выполняются одновременно: каждая начинается сразу
+            # после захвата и укладывается в TRIAGE_LOCK_TIMEOUT_SECONDS
+            await asyncio.gather(*(process_triage_job(job_id, attempt) for job_id, attempt in job_ids))
+        except Exception as e:
+            logger.error(f"Ошибка воркера AI-обработки: {e}")
+            job_ids = []
+
+        # Если очередь не пуста - сразу берем следующую пачку
+        if len(job_ids) >= settings.TRIAGE_BATCH_SIZE:
+            continue
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=settings.TRIAGE_POLL_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    logger.info("Воркер AI-обработки заявок остановлен")
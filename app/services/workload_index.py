@@ -0,0 +1,129 @@
+"""
+Процессный индекс загрузки сотрудников
+
+Хранит для каждой категории employee_id -> сотрудник с количеством
+активных заявок, поэтому кандидаты на назначение берутся из памяти за
+O(размер категории), а не запросом к таблице requests. Движок назначения
+оценивает всех кандидатов категории, так что упорядоченная структура
+(куча) ему не нужна; изменение счетчика - O(1).
+
+Индекс обновляется из событий изменения заявок (request_events) и
+периодически сверяется с БД (run_workload_reconciler). В режиме проверки
+(reconcile(..., fix=False)) расхождения только возвращаются, индекс
+не меняется.
+"""
+import asyncio
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.logging import get_logger
+from app.services.request_events import RequestState, subscribe
+from app.services.workload_service import ACTIVE_STATUSES, get_workload_snapshot
+
+logger = get_logger()
+
+
+class WorkloadIndex:
+    """Индекс активных заявок сотрудников по категориям"""
+
+    def __init__(self):
+        self._employees: dict[int, dict] = {}
+        self._by_category: dict[int, dict[int, dict]] = {}
+        self.ready = False
+
+    def load(self, workload: list[dict]) -> None:
+        """Перестроить индекс по снимку из get_workload_snapshot()"""
+        self._employees = {emp["id"]: dict(emp) for emp in workload}
+        self._by_category = {}
+        for emp in self._employees.values():
+            self._by_category.setdefault(emp["category_id"], {})[emp["id"]] = emp
+        self.ready = True
+
+    def mark_stale(self) -> None:
+        """
+        Состав сотрудников изменился (создание/удаление/смена специальности).
+        До следующей сверки индекс не используется.
+        """
+        self.ready = False
+
+    def adjust(self, employee_id: int, delta: int) -> None:
+        """Изменить количество активных заявок сотрудника"""
+        emp = self._employees.get(employee_id)
+        if emp is None:
+            return
+        emp["active_requests"] = max(emp["active_requests"] + delta, 0)
+
+    def candidates(self, category_id: int) -> list[dict]:
+        """Сотрудники категории в формате get_workload_snapshot()"""
+        return [dict(emp) for emp in self._by_category.get(category_id, {}).values()]
+
+    def drift(self, workload: list[dict]) -> dict[int, dict]:
+        """
+        Расхождения индекса с БД.
+
+        Returns:
+            {employee_id: {"index": int | None, "db": int | None}, ...}
+        """
+        report = {}
+        db_counts = {emp["id"]: emp["active_requests"] for emp in workload}
+        index_counts = {emp_id: emp["active_requests"] for emp_id, emp in self._employees.items()}
+        for employee_id in db_counts.keys() | index_counts.keys():
+            index_value = index_counts.get(employee_id)
+            db_value = db_counts.get(employee_id)
+            if index_value != db_value:
+                report[employee_id] = {"index": index_value, "db": db_value}
+        return report
+
+    def apply_change(self, before: Optional[RequestState], after: Optional[RequestState]) -> None:
+        """Обработчик события изменения заявки"""
+        if before is not None and before.assignee_id and before.status in ACTIVE_STATUSES:
+            self.adjust(before.assignee_id, -1)
+        if after is not None and after.assignee_id and after.status in ACTIVE_STATUSES:
+            self.adjust(after.assignee_id, +1)
+
+
+# Глобальный экземпляр индекса процесса
+workload_index = WorkloadIndex()
+subscribe(workload_index.apply_change)
+
+
+async def reconcile(db: AsyncSession, fix: bool = True) -> dict[int, dict]:
+    """
+    Сверить индекс с БД.
+
+    Args:
+        db: Сессия БД
+        fix: Перестроить индекс по БД (False - только отчет о расхождениях)
+
+    Returns:
+        Расхождения до сверки
+    """
+    workload = await get_workload_snapshot(db)
+    report = workload_index.drift(workload) if workload_index.ready else {}
+
+    if fix:
+        workload_index.load(workload)
+
+    return report
+
+
+async def run_workload_reconciler(stop_event: Optional[asyncio.Event] = None) -> None:
+    """Периодическая сверка индекса загрузки с БД"""
+    stop_event = stop_event or asyncio.Event()
+
+    while not stop_event.is_set():
+        try:
+            async with AsyncSessionLocal() as session:
+                report = await reconcile(session)
+            if report:
+                logger.warning(f"Индекс загрузки сотрудников расходился с БД: {report}")
+        except Exception as e:
+            logger.error(f"Ошибка сверки индекса загрузки: {e}")
+
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=settings.WORKLOAD_RECONCILE_SECONDS)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,87 @@
+"""
+Сервис загрузки сотрудников (для распределения заявок)
+"""
+from typing import Optional
+
+from sqlalchemy import select, and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.employee import Employee
+from app.models.request import Request, RequestStatus
+from app.models.specialty import Specialty
+
+# Статусы, в которых заявка считается текущей нагрузкой сотрудника
+ACTIVE_STATUSES = (RequestStatus.ASSIGNED, RequestStatus.IN_PROGRESS)
+
+
+async def get_workload_snapshot(
+    db: AsyncSession,
+    category_id: Optional[int] = None
+) -> list[dict]:
+    """
+    Сотрудники с названием специальности и количеством активных заявок
+    одним сгруппированным запросом (без N+1 COUNT на каждого сотрудника).
+
+    Args:
+        db: Сессия БД
+        category_id: Только сотрудники, чья специальность относится к категории
+
+    Returns:
+        [{"id": int, "name": str, "specialty": str, "category_id": int,
+          "rating": float, "active_requests": int,
+          "latitude": float | None, "longitude": float | None}, ...]
+
+        Координаты - центр активных заявок сотрудника (где он сейчас работает),
+        None если активных заявок с координатами нет.
+    """
+    query = (
+        select(
+            Employee.id,
+            Employee.first_name,
+            Employee.last_name,
+            Employee.average_rating,
+            Specialty.name,
+            Specialty.category_id,
+            func.count(Request.id),
+            func.avg(Request.latitude),
+            func.avg(Request.longitude)
+        )
+        .join(Specialty, Specialty.id == Employee.specialty_id)
+        .outerjoin(
+            Request,
+            and_(
+                Request.assignee_id == Employee.id,
+                Request.status.in_(ACTIVE_STATUSES)
+            )
+        )
+        .group_by(
+            Employee.id,
+            Employee.first_name,
+            Employee.last_name,
+            Employee.average_rating,
+            Specialty.name,
+            Specialty.category_id
+        )
+    )
+
+    if category_id is not None:
+        query = query.where(Specialty.category_id == category_id)
+
+    result = await db.execute(query)
+
+    return [
+        {
+            "id": emp_id,
+            "name": f"{first_name} {last_name}",
+            "specialty": specialty_name,
+            "category_id": emp_category_id,
+            "rating": rating or 0.0,
+            "active_requests": active_requests,
+            "latitude": latitude,
+            "longitude": longitude
+        }
+        for (
+            emp_id, first_name, last_name, rating, specialty_name, emp_category_id,
+            active_requests, latitude, longitude
+        ) in result.all()
+    ]
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Пересчет рейтинга сотрудников из таблицы оценок
+
+Заполняет employees.rating_sum, rating_count и average_rating по таблице
+ratings. Нужен один раз после добавления колонок счетчиков (при старте
+приложения выполняется автоматически) и после ручных правок оценок.
+
+Использование:
+    python backfill_employee_ratings.py                  # все сотрудники
+    python backfill_employee_ratings.py --employee-id 5  # один сотрудник
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import AsyncSessionLocal, engine, init_db
+from app.core.logging import get_logger
+from app.services.column_migration import migrate_add_columns
+from app.services.rating_service import backfill_employee_ratings
+
+logger = get_logger()
+
+
+async def run(employee_id):
+    await init_db()
+
+    async with AsyncSessionLocal() as session:
+        try:
+            await migrate_add_columns(session)
+        except Exception as e:
+            logger.warning(f"Миграция колонок пропущена: {e}")
+
+    async with AsyncSessionLocal() as session:
+        updated = await backfill_employee_ratings(session, employee_id)
+
+    await engine.dispose()
+    logger.info(f"Рейтинг пересчитан для {updated} сотрудников")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пересчет рейтинга сотрудников из таблицы оценок")
+    parser.add_argument("--employee-id", type=int, help="Пересчитать только одного сотрудника")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.employee_id))
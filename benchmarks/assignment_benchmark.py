@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк движков автоматического назначения заявок
+
+Сравнивает задержку и качество назначения на синтетической нагрузке:
+- least_loaded  - прежний fallback (минимум активных заявок)
+- llm_every     - прежнее поведение: LLM на каждую заявку (задержка LLM моделируется)
+- local         - LocalScoringEngine
+- hybrid        - HybridAssignmentEngine (LLM только для близких оценок)
+
+LLM не вызывается: его ответ моделируется случайным выбором среди
+переданных кандидатов, а задержка - параметром --llm-latency-ms.
+
+Запуск:
+    python benchmarks/assignment_benchmark.py --employees 200 --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from loguru import logger  # noqa: E402
+
+from app.services import assignment_engine  # noqa: E402
+from app.services.assignment_engine import (  # noqa: E402
+    AssignmentContext,
+    LocalScoringEngine,
+    HybridAssignmentEngine,
+    distance_km,
+)
+
+# Границы города (Павлодар)
+LAT_RANGE = (52.23, 52.33)
+LON_RANGE = (76.88, 77.05)
+PRIORITIES = ["low", "medium", "high"]
+
+
+def make_employees(count: int, rng: random.Random) -> list[dict]:
+    return [
+        {
+            "id": i + 1,
+            "name": f"Сотрудник {i + 1}",
+            "specialty": "Сантехник",
+            "category_id": 1,
+            "rating": round(rng.uniform(3.0, 5.0), 2),
+            "active_requests": rng.randint(0, 5),
+            "latitude": rng.uniform(*LAT_RANGE),
+            "longitude": rng.uniform(*LON_RANGE),
+        }
+        for i in range(count)
+    ]
+
+
+def make_requests(count: int, rng: random.Random) -> list[AssignmentContext]:
+    return [
+        AssignmentContext(
+            description="Течет труба",
+            category_name="Водоснабжение",
+            priority=rng.choice(PRIORITIES),
+            problem_type="Сантехник" if rng.random() < 0.3 else None,
+            latitude=rng.uniform(*LAT_RANGE),
+            longitude=rng.uniform(*LON_RANGE),
+        )
+        for _ in range(count)
+    ]
+
+
+class LeastLoaded:
+    name = "least_loaded"
+
+    async def select(self, context, candidates):
+        return min(candidates, key=lambda x: (x["active_requests"], -x["rating"]))["id"]
+
+
+class LLMEvery:
+    """Прежнее поведение: весь список кандидатов отправляется в LLM"""
+    name = "llm_every"
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    async def select(self, context, candidates):
+        return self.rng.choice(candidates)["id"]
+
+
+async def run(engine, employees, requests, rng, llm_latency_ms, llm_calls):
+    employees = [dict(emp) for emp in employees]
+    by_id = {emp["id"]: emp for emp in employees}
+    timings, distances, high_ratings = [], [], []
+    llm_calls.clear()
+
+    for index, context in enumerate(requests):
+        started = time.perf_counter()
+        selected = await engine.select(context, employees)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+
+        emp = by_id[selected]
+        distances.append(distance_km(context.latitude, context.longitude, emp["latitude"], emp["longitude"]))
+        if context.priority == "high":
+            high_ratings.append(emp["rating"])
+        emp["active_requests"] += 1
+
+        # Завершение работ, чтобы нагрузка оставалась стабильной
+        if index % 2 == 0:
+            busy = [e for e in employees if e["active_requests"] > 0]
+            rng.choice(busy)["active_requests"] -= 1
+
+    loads = [emp["active_requests"] for emp in employees]
+    llm_count = len(requests) if isinstance(engine, LLMEvery) else len(llm_calls)
+    timings.sort()
+    return {
+        "engine": engine.name,
+        "p50_us": timings[len(timings) // 2],
+        "p99_us": timings[int(len(timings) * 0.99) - 1],
+        "llm_calls": llm_count,
+        "modeled_total_s": sum(timings) / 1_000_000 + llm_count * llm_latency_ms / 1000,
+        "mean_distance_km": statistics.mean(distances),
+        "load_stdev": statistics.pstdev(loads),
+        "max_load": max(loads),
+        "high_priority_rating": statistics.mean(high_ratings) if high_ratings else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк движков назначения")
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--margin", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logger.remove()  # Логи движка не нужны в выводе бенчмарка
+
+    rng = random.Random(args.seed)
+    employees = make_employees(args.employees, rng)
+    requests = make_requests(args.requests, rng)
+
+    # Подменяем LLM: случайный выбор среди переданных кандидатов
+    llm_calls = []
+    llm_rng = random.Random(args.seed)
+
+    async def fake_llm(request_description, category_name, priority, available_employees):
+        llm_calls.append(len(available_employees))
+        return llm_rng.choice(available_employees)["id"]
+
+    assignment_engine.assign_employee_ai = fake_llm
+
+    engines = [
+        LeastLoaded(),
+        LLMEvery(llm_rng),
+        LocalScoringEngine(),
+        HybridAssignmentEngine(llm_enabled=True, llm_margin=args.margin),
+    ]
+
+    print(f"Сотрудников: {args.employees}, заявок: {args.requests}, задержка LLM: {args.llm_latency_ms} мс\n")
+    header = (
+        f"{'engine':<14}{'p50 мкс':>10}{'p99 мкс':>10}{'LLM':>7}{'время, с':>11}"
+        f"{'ср. км':>9}{'σ нагр.':>9}{'max':>6}{'рейт. high':>12}"
+    )
+    print(header)
+    print("-" * len(header))
+    for engine in engines:
+        r = await run(engine, employees, requests, random.Random(args.seed), args.llm_latency_ms, llm_calls)
+        print(
+            f"{r['engine']:<14}{r['p50_us']:>10.1f}{r['p99_us']:>10.1f}{r['llm_calls']:>7}"
+            f"{r['modeled_total_s']:>11.2f}{r['mean_distance_km']:>9.2f}{r['load_stdev']:>9.2f}"
+            f"{r['max_load']:>6}{r['high_priority_rating']:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность проверки JWT
+
+Каждый доступный бэкенд (hmac, jose, pyjwt - если установлен) проверяет
+один и тот же набор токенов без кэша, затем тот же набор проверяется
+через TokenVerifier с кэшем проверенных токенов (как в запросах, где
+клиент повторно присылает свой токен).
+
+Запуск:
+    python benchmarks/jwt_decode.py --iterations 50000 --tokens 100
+
+Код выхода 1, если бэкенды расходятся в payload.
+"""
+import argparse
+import os
+import sys
+import time
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Проверка JWT по бэкендам")
+    parser.add_argument("--iterations", type=int, default=50000, help="Проверок на бэкенд")
+    parser.add_argument("--tokens", type=int, default=100, help="Разных токенов (пользователей)")
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.core.config import settings  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.core.token_verifier import (  # noqa: E402
+    TokenVerifier, VerifiedTokenCache, create_token_backend
+)
+
+BACKENDS = ("hmac", "jose", "pyjwt")
+
+
+def rate(iterations: int, elapsed: float) -> str:
+    return f"{iterations / elapsed:>10.0f} проверок/с, {elapsed / iterations * 1e6:6.1f} мкс/проверка"
+
+
+def main() -> int:
+    tokens = [
+        create_access_token({"sub": f"user{i}", "user_id": i, "role": "citizen"})
+        for i in range(args.tokens)
+    ]
+
+    backends = []
+    for name in BACKENDS:
+        backend = create_token_backend(name, settings.SECRET_KEY, settings.ALGORITHM)
+        if backend.name != name:
+            print(f"{name}: не установлен, пропущен")
+            continue
+        backends.append(backend)
+
+    print(f"Алгоритм: {settings.ALGORITHM}, токенов: {args.tokens}, проверок: {args.iterations}")
+
+    reference = [backends[0].decode(token) for token in tokens]
+    consistent = True
+    for backend in backends:
+        if [backend.decode(token) for token in tokens] != reference:
+            print(f"РАСХОЖДЕНИЕ: {backend.name} возвращает другой payload")
+            consistent = False
+
+    for backend in backends:
+        started = time.perf_counter()
+        for i in range(args.iterations):
+            backend.decode(tokens[i % len(tokens)])
+        print(f"{backend.name + ' без кэша':<18} {rate(args.iterations, time.perf_counter() - started)}")
+
+    for backend in backends:
+        verifier = TokenVerifier(backend, VerifiedTokenCache(settings.JWT_CACHE_MAX_ENTRIES))
+        started = time.perf_counter()
+        for i in range(args.iterations):
+            verifier.decode(tokens[i % len(tokens)])
+        print(f"{backend.name + ' с кэшем':<18} {rate(args.iterations, time.perf_counter() - started)}")
+
+    return 0 if consistent else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Задержка event loop во время всплеска входов
+
+Одновременно выполняется много POST /auth/login (bcrypt), а параллельно
+с ними - короткие запросы GET /health и проба event loop (sleep с
+измерением опоздания). Приложение работает в том же event loop, что и
+клиент (httpx ASGITransport), поэтому блокировка loop сразу видна в
+задержке пробы и /health.
+
+Режим --legacy выполняет bcrypt прямо в обработчике, как было до
+вынесения в пул потоков, для сравнения.
+
+Запуск:
+    python benchmarks/login_storm.py --logins 200 --concurrency 50
+    python benchmarks/login_storm.py --logins 200 --concurrency 50 --legacy
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Задержка event loop при всплеске входов")
+    parser.add_argument("--logins", type=int, default=200, help="Количество входов")
+    parser.add_argument("--concurrency", type=int, default=50, help="Одновременных входов")
+    parser.add_argument("--workers", type=int, help="Потоков пула bcrypt (по умолчанию PASSWORD_HASH_WORKERS)")
+    parser.add_argument("--rounds", type=int, default=12, help="Стоимость bcrypt")
+    parser.add_argument("--legacy", action="store_true", help="bcrypt в event loop, как раньше")
+    return parser.parse_args()
+
+
+args = parse_args()
+workdir = tempfile.mkdtemp(prefix="ertis-logins-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir}/logins.db"
+os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+if args.workers:
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+import httpx  # noqa: E402
+
+from app.core.database import AsyncSessionLocal, engine, init_db  # noqa: E402
+from app.core.security import get_password_hash, password_hasher, pwd_context  # noqa: E402
+from app.models.user import User, UserRole  # noqa: E402
+from app.main import app  # noqa: E402
+
+PASSWORD = "storm123"
+PROBE_INTERVAL = 0.005
+
+
+def percentile(values: list[float], quantile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+
+def summary(name: str, values_ms: list[float]) -> str:
+    return (
+        f"{name}: p50={percentile(values_ms, 0.5):.1f} мс, p99={percentile(values_ms, 0.99):.1f} мс, "
+        f"max={max(values_ms):.1f} мс (n={len(values_ms)})"
+    )
+
+
+async def seed() -> None:
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        session.add(User(first_name="Вход", last_name="Тестовый", username="storm",
+                         password_hash=get_password_hash(PASSWORD), role=UserRole.CITIZEN))
+        await session.commit()
+
+
+def use_inline_bcrypt() -> None:
+    """Прежнее поведение: bcrypt синхронно в обработчике"""
+    async def inline_verify_and_update(plain_password, hashed_password):
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+
+    password_hasher.verify_and_update = inline_verify_and_update
+
+
+async def main() -> int:
+    await seed()
+    if args.legacy:
+        use_inline_bcrypt()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        done = asyncio.Event()
+        probe_lag_ms: list[float] = []
+        health_ms: list[float] = []
+        login_ms: list[float] = []
+        failures = 0
+
+        async def probe() -> None:
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(PROBE_INTERVAL)
+                probe_lag_ms.append((time.perf_counter() - started - PROBE_INTERVAL) * 1000)
+
+        async def health() -> None:
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/api/v1/health")
+                health_ms.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.01)
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def login() -> None:
+            nonlocal failures
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/api/v1/auth/login", json={"username": "storm", "password": PASSWORD})
+                login_ms.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    failures += 1
+
+        background = [asyncio.create_task(probe()), asyncio.create_task(health())]
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(args.logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*background)
+
+    password_hasher.shutdown()
+    await engine.dispose()
+
+    mode = "legacy (bcrypt в event loop)" if args.legacy else f"пул потоков ({password_hasher.workers})"
+    print(f"Режим: {mode}, входов: {args.logins}, параллельно: {args.concurrency}, rounds={args.rounds}")
+    print(f"Время: {elapsed:.2f} с ({args.logins / elapsed:.1f} входов/с), ошибок: {failures}")
+    print(summary("Вход", login_ms))
+    print(summary("GET /health", health_ms))
+    print(summary("Опоздание event loop", probe_lag_ms))
+    print(f"Среднее опоздание event loop: {statistics.mean(probe_lag_ms):.1f} мс")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
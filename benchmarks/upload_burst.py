@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Загрузка фото и задержка остальных запросов
+
+Одновременно создается много заявок с фото (POST /requests, multipart),
+а параллельно с ними выполняются короткие запросы GET /health и проба
+event loop (sleep с измерением опоздания). Приложение работает в том же
+event loop, что и клиент (httpx ASGITransport), поэтому обработка фото
+в event loop сразу видна в задержке пробы и /health.
+
+Режим --legacy обрабатывает изображения Pillow прямо в обработчике, как
+было до вынесения в пул процессов, для сравнения.
+
+Запуск:
+    python benchmarks/upload_burst.py --uploads 40 --concurrency 10
+    python benchmarks/upload_burst.py --uploads 40 --concurrency 10 --legacy
+
+Настройка окружения и импорт приложения выполняются в main(): процессы
+пула запускаются через spawn и импортируют этот модуль заново.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+PASSWORD = "upload123"
+CATEGORY = "Тестовая категория"
+PROBE_INTERVAL = 0.005
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Задержка запросов во время загрузки фото")
+    parser.add_argument("--uploads", type=int, default=40, help="Количество загрузок")
+    parser.add_argument("--concurrency", type=int, default=10, help="Одновременных загрузок")
+    parser.add_argument("--workers", type=int, help="Процессов обработки (по умолчанию IMAGE_PROCESS_WORKERS)")
+    parser.add_argument("--width", type=int, default=4000, help="Ширина фото")
+    parser.add_argument("--height", type=int, default=3000, help="Высота фото")
+    parser.add_argument("--legacy", action="store_true", help="Pillow в event loop, как раньше")
+    return parser.parse_args()
+
+
+def percentile(values: list[float], quantile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+
+def summary(name: str, values_ms: list[float]) -> str:
+    return (
+        f"{name}: p50={percentile(values_ms, 0.5):.1f} мс, p99={percentile(values_ms, 0.99):.1f} мс, "
+        f"max={max(values_ms):.1f} мс (n={len(values_ms)})"
+    )
+
+
+def make_photo(width: int, height: int) -> bytes:
+    """JPEG, похожий на фото с телефона (шум не сжимается)"""
+    from PIL import Image
+
+    image = Image.effect_noise((width, height), 64).convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+async def main(args) -> int:
+    import httpx
+
+    from app.core.database import AsyncSessionLocal, engine, init_db
+    from app.core.security import create_access_token, get_password_hash
+    from app.models.category import Category
+    from app.models.user import User, UserRole
+    from app.main import app
+    from app.services import file_service
+    from app.services.image_processing import optimize_image
+
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        citizen = User(first_name="Житель", last_name="Тестовый", username="uploader",
+                       password_hash=get_password_hash(PASSWORD), role=UserRole.CITIZEN)
+        session.add_all([citizen, Category(name=CATEGORY)])
+        await session.commit()
+        token = create_access_token({"sub": citizen.username, "user_id": citizen.id, "role": citizen.role.value})
+
+    if args.legacy:
+        async def inline_optimize(source_path, target_path):
+            return optimize_image(source_path, target_path)
+
+        file_service.image_processor.optimize = inline_optimize
+
+    photo = make_photo(args.width, args.height)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        done = asyncio.Event()
+        probe_lag_ms: list[float] = []
+        health_ms: list[float] = []
+        upload_ms: list[float] = []
+        failures = 0
+
+        # Прогрев: запуск процессов пула не входит в замер
+        await client.post("/api/v1/requests", headers=headers,
+                          data={"description": "Прогрев", "address": "Тестовый адрес", "category": CATEGORY},
+                          files={"photo": ("warmup.jpg", photo, "image/jpeg")})
+
+        async def probe() -> None:
+            while not done.is_set():
+                started = time.perf_counter()
+                await asyncio.sleep(PROBE_INTERVAL)
+                probe_lag_ms.append((time.perf_counter() - started - PROBE_INTERVAL) * 1000)
+
+        async def health() -> None:
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/api/v1/health")
+                health_ms.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.01)
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def upload(index: int) -> None:
+            nonlocal failures
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/v1/requests",
+                    headers=headers,
+                    data={"description": f"Заявка с фото {index}", "address": "Тестовый адрес", "category": CATEGORY},
+                    files={"photo": (f"photo{index}.jpg", photo, "image/jpeg")}
+                )
+                upload_ms.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 201 or not response.json().get("photo_url"):
+                    failures += 1
+
+        background = [asyncio.create_task(probe()), asyncio.create_task(health())]
+        started = time.perf_counter()
+        await asyncio.gather(*(upload(i) for i in range(args.uploads)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*background)
+
+    file_service.image_processor.shutdown()
+    await engine.dispose()
+
+    mode = "legacy (Pillow в event loop)" if args.legacy else f"пул процессов ({file_service.image_processor.workers})"
+    print(f"Режим: {mode}, загрузок: {args.uploads}, параллельно: {args.concurrency}")
+    print(f"Фото: {args.width}x{args.height}, {len(photo) / 1024 / 1024:.1f} МБ")
+    print(f"Время: {elapsed:.2f} с ({args.uploads / elapsed:.1f} загрузок/с), ошибок: {failures}")
+    print(summary("Загрузка", upload_ms))
+    print(summary("GET /health", health_ms))
+    print(summary("Опоздание event loop", probe_lag_ms))
+    print(f"Среднее опоздание event loop: {statistics.mean(probe_lag_ms):.1f} мс")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="ertis-uploads-")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir}/uploads.db"
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["TRIAGE_WORKER_ENABLED"] = "false"
+    os.environ["NOTIFICATION_OUTBOX_RELAY_ENABLED"] = "false"
+    if args.workers:
+        os.environ["IMAGE_PROCESS_WORKERS"] = str(args.workers)
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Миграция индексов существующей БД
+
+Создает индексы, объявленные в моделях, которых нет в таблицах
+(create_all добавляет индексы только новым таблицам), затем удаляет
+избыточные индексы, убранные из моделей (ix_<таблица>_id, дублирующие
+первичный ключ, и OBSOLETE_INDEXES в app/services/column_migration.py).
+
+Создание индекса на большой таблице читает ее целиком, поэтому
+выполняется этим скриптом в окно обслуживания, а не при старте
+приложения: при старте индексы только сверяются с моделями.
+
+Использование:
+    python migrate_indexes.py           # создать и удалить индексы
+    python migrate_indexes.py --check   # только сверить, код 1 при расхождениях
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import AsyncSessionLocal, engine, init_db
+from app.core.logging import get_logger
+from app.services.column_migration import check_indexes, migrate_add_indexes, migrate_drop_indexes
+
+logger = get_logger()
+
+
+async def run(check_only: bool) -> int:
+    await init_db()
+
+    try:
+        if not check_only:
+            async with AsyncSessionLocal() as session:
+                created = await migrate_add_indexes(session)
+            async with AsyncSessionLocal() as session:
+                dropped = await migrate_drop_indexes(session)
+            logger.info(f"Создано индексов: {len(created)}, удалено: {len(dropped)}")
+
+        async with AsyncSessionLocal() as session:
+            in_sync = await check_indexes(session)
+    except Exception as e:
+        logger.error(f"Миграция индексов не выполнена: {e}")
+        return 1
+    finally:
+        await engine.dispose()
+
+    if not in_sync:
+        return 1
+
+    logger.info("Индексы БД совпадают с моделями")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Миграция индексов существующей БД")
+    parser.add_argument("--check", action="store_true", help="Только сверить индексы с моделями")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args.check)))
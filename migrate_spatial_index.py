@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Геоиндексы карты заявок
+
+Заполняет geohash у заявок, созданных до появления колонки (пачками,
+на любой БД): без него старые заявки не попадают на карту по bbox.
+
+На MySQL добавляет в requests вычисляемую колонку location POINT SRID 0 и SPATIAL
+индекс по ней. Добавление STORED колонки перестраивает всю таблицу
+requests и держит metadata lock, поэтому выполняется этим скриптом в окно
+обслуживания, а не при старте приложения. Колонка без SRID, созданная
+прежней версией, пересоздается.
+
+После миграции перезапустите приложение: при старте оно проверяет через
+EXPLAIN, что индекс используется, и переключает /requests/map на него.
+
+Использование:
+    python migrate_spatial_index.py
+
+Код выхода 1, если индекс не используется оптимизатором.
+"""
+import asyncio
+import os
+import sys
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import AsyncSessionLocal, engine, init_db
+from app.core.logging import get_logger
+from app.services.geo_service import backfill_geohash, create_spatial_index
+
+logger = get_logger()
+
+
+async def run() -> int:
+    await init_db()
+
+    async with AsyncSessionLocal() as session:
+        updated = await backfill_geohash(session)
+    logger.info(f"✓ Заполнен geohash для {updated} заявок")
+
+    async with AsyncSessionLocal() as session:
+        if session.bind.dialect.name != "mysql":
+            logger.info("SPATIAL индекс нужен только на MySQL, на этой БД карта использует geohash")
+            await engine.dispose()
+            return 0
+        usable = await create_spatial_index(session)
+
+    await engine.dispose()
+
+    if not usable:
+        logger.error("SPATIAL индекс requests.location создан, но оптимизатор его не использует")
+        return 1
+
+    logger.info("SPATIAL индекс requests.location используется оптимизатором")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))
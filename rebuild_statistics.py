@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Перестроение и проверка агрегатов статистики
+
+Таблицы request_stats_hourly, request_stats_daily и rating_stats_daily
+поддерживаются инкрементально. Скрипт пересчитывает их из сырых таблиц
+(первичное построение на существующих данных, ручные правки данных,
+удаление сотрудников и т.п.) или сверяет с полным пересчетом.
+
+Перестроение заменяет содержимое таблиц целиком: инкременты запросов,
+обслуженных во время пересчета, были бы потеряны или учтены дважды.
+Запускайте его при остановленном приложении.
+
+Использование:
+    python rebuild_statistics.py           # перестроить агрегаты
+    python rebuild_statistics.py --verify  # только сверить, код 1 при расхождениях
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import AsyncSessionLocal, engine, init_db
+from app.core.logging import get_logger
+from app.services.statistics_rollup import rebuild_rollups, verify_rollups
+
+logger = get_logger()
+
+# Сколько расхождений выводить
+MAX_REPORTED_DIFFERENCES = 50
+
+
+async def run(verify_only: bool) -> int:
+    await init_db()
+
+    async with AsyncSessionLocal() as session:
+        if not verify_only:
+            await rebuild_rollups(session)
+
+        differences = await verify_rollups(session)
+
+    await engine.dispose()
+
+    if differences:
+        logger.error(f"Агрегаты расходятся с пересчетом: {len(differences)} строк")
+        for line in differences[:MAX_REPORTED_DIFFERENCES]:
+            logger.error(f"  {line}")
+        return 1
+
+    logger.info("Агрегаты статистики совпадают с полным пересчетом")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Перестроение и проверка агрегатов статистики")
+    parser.add_argument("--verify", action="store_true", help="Только сверить агрегаты с пересчетом")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args.verify)))
@@ -0,0 +1,12 @@
+"""
+Общие настройки тестов
+"""
+import os
+import sys
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Клиент OpenAI создается при импорте сервисов, но тесты к нему не обращаются
+os.environ.setdefault("OPENAI_API_KEY", "not-used")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
@@ -0,0 +1,151 @@
+"""
+Паритет бэкендов проверки JWT (app/core/token_verifier.py)
+
+Один и тот же набор токенов - верные, истекшие, поврежденные, подписанные
+другим ключом или алгоритмом - проверяется каждым бэкендом. Результат
+должен совпадать с python-jose: тот же payload или InvalidTokenError.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+from app.core.token_verifier import (
+    InvalidTokenError,
+    JoseTokenBackend,
+    TokenVerifier,
+    VerifiedTokenCache,
+    create_token_backend,
+)
+
+SECRET = "test-secret-key"
+ALGORITHM = "HS256"
+BACKENDS = ["jose", "hmac", "pyjwt"]
+
+
+def b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def segment(value) -> str:
+    return b64(json.dumps(value).encode("utf-8"))
+
+
+def sign(header: dict, payload, key: str = SECRET, digest=hashlib.sha256) -> str:
+    signing_input = f"{segment(header)}.{segment(payload)}"
+    signature = hmac.new(key.encode("utf-8"), signing_input.encode("ascii"), digest).digest()
+    return f"{signing_input}.{b64(signature)}"
+
+
+def claims(**overrides) -> dict:
+    now = int(time.time())
+    payload = {"sub": "user", "user_id": 7, "role": "citizen", "iat": now, "exp": now + 600}
+    payload.update(overrides)
+    return {key: value for key, value in payload.items() if value is not None}
+
+
+HEADER = {"alg": ALGORITHM, "typ": "JWT"}
+VALID = sign(HEADER, claims())
+
+
+def tampered_payload() -> str:
+    header, _, signature = VALID.split(".")
+    return f"{header}.{segment(claims(user_id=1, role='admin'))}.{signature}"
+
+
+def tampered_signature() -> str:
+    signature = VALID.rsplit(".", 1)[1]
+    replacement = "A" if signature[0] != "A" else "B"
+    return VALID[:-len(signature)] + replacement + signature[1:]
+
+
+TOKEN_CORPUS = {
+    "valid": VALID,
+    "valid_without_exp": sign(HEADER, claims(exp=None)),
+    "expired": sign(HEADER, claims(exp=int(time.time()) - 60)),
+    "not_yet_valid": sign(HEADER, claims(nbf=int(time.time()) + 600)),
+    "exp_string": sign(HEADER, claims(exp="never")),
+    "nbf_string": sign(HEADER, claims(nbf="now")),
+    "wrong_key": sign(HEADER, claims(), key="other-secret"),
+    "tampered_payload": tampered_payload(),
+    "tampered_signature": tampered_signature(),
+    "alg_none": f"{segment({'alg': 'none', 'typ': 'JWT'})}.{segment(claims())}.",
+    "alg_none_signed": sign({"alg": "none", "typ": "JWT"}, claims()),
+    "alg_hs512": sign({"alg": "HS512", "typ": "JWT"}, claims(), digest=hashlib.sha512),
+    "alg_rs256": sign({"alg": "RS256", "typ": "JWT"}, claims()),
+    "header_without_alg": sign({"typ": "JWT"}, claims()),
+    "payload_list": sign(HEADER, [1, 2, 3]),
+    "empty": "",
+    "one_segment": "abc",
+    "two_segments": VALID.rsplit(".", 1)[0],
+    "four_segments": VALID + ".abc",
+    "garbage_segments": "!!!.@@@.###",
+    "non_json_payload": f"{segment(HEADER)}.{b64(b'not json')}.{VALID.rsplit('.', 1)[1]}",
+    "non_ascii": VALID + "ж",
+    "whitespace": f" {VALID} ",
+}
+
+
+def make_backend(name: str):
+    if name == "pyjwt":
+        pytest.importorskip("jwt")
+    return create_token_backend(name, SECRET, ALGORITHM)
+
+
+def outcome(backend, token: str):
+    try:
+        return backend.decode(token)
+    except InvalidTokenError:
+        return InvalidTokenError
+
+
+@pytest.mark.parametrize("backend_name", BACKENDS)
+@pytest.mark.parametrize("case", sorted(TOKEN_CORPUS))
+def test_backend_matches_jose(backend_name, case):
+    token = TOKEN_CORPUS[case]
+    expected = outcome(JoseTokenBackend(SECRET, ALGORITHM), token)
+    assert outcome(make_backend(backend_name), token) == expected
+
+
+def test_corpus_has_accepted_and_rejected_tokens():
+    reference = JoseTokenBackend(SECRET, ALGORITHM)
+    results = {case: outcome(reference, token) for case, token in TOKEN_CORPUS.items()}
+    assert results["valid"] != InvalidTokenError
+    assert results["expired"] == InvalidTokenError
+    assert results["tampered_payload"] == InvalidTokenError
+    assert results["alg_none"] == InvalidTokenError
+
+
+def test_default_backend_is_jose():
+    from app.core.config import Settings
+
+    assert Settings.model_fields["JWT_BACKEND"].default == "jose"
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        create_token_backend("auto", SECRET, ALGORITHM)
+
+
+@pytest.mark.parametrize("payload", [
+    claims(role="superuser"),
+    claims(user_id="not-a-number"),
+    claims(user_id={"id": 1}),
+    claims(employee_id=[1]),
+    claims(role=["admin"]),
+    claims(sub=123),
+])
+def test_unexpected_claims_are_rejected_not_raised(payload):
+    verifier = TokenVerifier(JoseTokenBackend(SECRET, ALGORITHM), VerifiedTokenCache(10))
+    assert verifier.decode(sign(HEADER, payload)) is None
+
+
+def test_verifier_caches_valid_tokens():
+    verifier = TokenVerifier(JoseTokenBackend(SECRET, ALGORITHM), VerifiedTokenCache(10))
+    first = verifier.decode(VALID)
+    assert first is not None and first.user_id == 7
+    assert verifier.decode(VALID) == first
+    assert len(verifier.cache) == 1